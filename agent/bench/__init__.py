@@ -0,0 +1 @@
+# bench/ — harnais de mesure de l'agent (hub de substitution, pilotes factices, scénarios)
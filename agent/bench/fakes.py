@@ -0,0 +1,110 @@
+# bench/fakes.py
+"""
+Faux `pactl` / `playerctl` pour le bench: scripts exécutables posés dans un dossier
+à préfixer au PATH de l'agent. L'état (volume, status) vit dans un fichier JSON partagé,
+la latence de chaque appel est réglable (AURA_FAKE_LATENCY_MS, ou par outil).
+Un sink nommé (pactl … <sink>) ou un player (playerctl --player=<nom>) autre que celui par
+défaut a son propre fichier `sink-<nom>.json` (agent multi-device).
+`pactl subscribe` signale "Event 'change' on sink #N" à chaque écriture d'un de ces fichiers
+(le faux surveille leur mtime ; le vrai est poussé par Pulse) ; AURA_FAKE_SUBSCRIBE=0 le fait
+échouer comme sans serveur Pulse.
+"""
+from __future__ import annotations
+import json
+import os
+import stat
+import sys
+from typing import Dict, Optional
+
+_PACTL = r'''#!{python} -S
+import json, os, sys, time
+STATE = {state!r}
+time.sleep(float(os.environ.get("AURA_FAKE_PACTL_MS", os.environ.get("AURA_FAKE_LATENCY_MS", "{latency}"))) / 1000.0)
+def load():
+    try:
+        with open(STATE) as f: return json.load(f)
+    except Exception: return {{"volume": 40, "status": "pause"}}
+def save(d):
+    tmp = STATE + ".tmp"
+    with open(tmp, "w") as f: json.dump(d, f)
+    os.replace(tmp, STATE)
+a = sys.argv[1:]
+if len(a) >= 2 and a[1] not in ("bench_sink", "@DEFAULT_SINK@"):
+    STATE = os.path.join(os.path.dirname(STATE), f"sink-{{a[1]}}.json")
+if a[:1] == ["subscribe"]:
+    if os.environ.get("AURA_FAKE_SUBSCRIBE") == "0":
+        sys.exit(1)   # serveur Pulse injoignable: l'agent doit se rabattre sur le polling
+    seen = {{}}
+    while True:
+        cur = {{}}
+        for n in os.listdir(os.path.dirname(STATE)):
+            if n.startswith("sink") and n.endswith(".json"):
+                try: cur[n] = os.stat(os.path.join(os.path.dirname(STATE), n)).st_mtime_ns
+                except OSError: pass
+        for i, (n, m) in enumerate(sorted(cur.items())):
+            if seen and seen.get(n) != m:
+                print(f"Event 'change' on sink #{{i}}", flush=True)
+        seen = cur
+        time.sleep(0.1)
+if a[:1] == ["get-default-sink"]:
+    print("bench_sink"); sys.exit(0)
+if a[:1] == ["get-sink-volume"]:
+    v = load().get("volume", 40)
+    print(f"Volume: front-left: {{int(v * 655.36)}} / {{v}}% / 0.00 dB,   front-right: {{int(v * 655.36)}} / {{v}}% / 0.00 dB")
+    sys.exit(0)
+if a[:1] == ["set-sink-volume"] and len(a) >= 3:
+    d = load(); d["volume"] = max(0, min(100, int(a[2].rstrip("%")))); save(d); sys.exit(0)
+sys.exit(1)
+'''
+
+_PLAYERCTL = r'''#!{python} -S
+import json, os, sys, time
+STATE = {state!r}
+time.sleep(float(os.environ.get("AURA_FAKE_PLAYERCTL_MS", os.environ.get("AURA_FAKE_LATENCY_MS", "{latency}"))) / 1000.0)
+a = sys.argv[1:]
+if a[:1] and a[0].startswith("--player="):
+    STATE = os.path.join(os.path.dirname(STATE), f"sink-{{a.pop(0)[len('--player='):]}}.json")
+try:
+    with open(STATE) as f: d = json.load(f)
+except Exception:
+    d = {{"volume": 40, "status": "pause"}}
+cmd = (a or [""])[0]
+if cmd in ("play", "pause"):
+    d["status"] = cmd
+elif cmd in ("next", "previous"):
+    d["track"] = int(d.get("track") or 0) + (1 if cmd == "next" else -1)
+elif cmd == "status":
+    print("Playing" if d.get("status") == "play" else "Paused"); sys.exit(0)
+else:
+    sys.exit(1)
+tmp = STATE + ".tmp"
+with open(tmp, "w") as f: json.dump(d, f)
+os.replace(tmp, STATE)
+'''
+
+def install(dirpath: str, latency_ms: float = 0.0, initial: Optional[Dict] = None) -> Dict[str, str]:
+    """
+    Écrit les faux binaires dans `dirpath/bin` + l'état initial.
+    Retourne les variables d'environnement à passer à l'agent.
+    """
+    bindir = os.path.join(dirpath, "bin")
+    os.makedirs(bindir, exist_ok=True)
+    state = os.path.join(dirpath, "sink.json")
+    with open(state, "w") as f:
+        json.dump(initial or {"volume": 40, "status": "pause"}, f)
+    for name, tpl in (("pactl", _PACTL), ("playerctl", _PLAYERCTL)):
+        p = os.path.join(bindir, name)
+        with open(p, "w") as f:
+            f.write(tpl.format(python=sys.executable, state=state, latency=latency_ms))
+        os.chmod(p, os.stat(p).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return {
+        "PATH": bindir + os.pathsep + os.environ.get("PATH", ""),
+        "AURA_AUDIO_USER": "",
+        "AURA_LEDS_MOCK": "1",
+        "AURA_FAKE_LATENCY_MS": str(latency_ms),
+    }
+
+def read_state(dirpath: str, sink: Optional[str] = None) -> Dict:
+    name = f"sink-{sink}.json" if sink else "sink.json"
+    with open(os.path.join(dirpath, name)) as f:
+        return json.load(f)
@@ -0,0 +1,449 @@
+# bench/fleet.py
+"""
+Générateur de charge « flotte »: N devices servis par de vrais agents (main.py multi-device,
+_MockStrip + faux pactl/playerctl, comme bench.run) contre un seul hub.
+
+    python -m bench.fleet -n 500                              # hub de substitution local
+    python -m bench.fleet -n 2000 --per-proc 20 --ramp 250 --ramp-interval 10
+    python -m bench.fleet --hub http://api:3000 --devices devices.json --cmd-rate 20
+
+Chaque processus agent porte --per-proc devices (config `devices:`, une socket chacun) et fait
+tout ce que fait un Pi: agent:register, heartbeat (résumé métriques joint), poll /state,
+réconciliation delta à la reconnexion, écritures DB des actions locales, /weather si le device
+affiche la météo — aux cadences de la config.yaml livrée (shipped_cadence). Les commandes sont
+injectées via POST /__debug/emit (route DEV de l'api).
+
+Mesures, par palier de montée en charge:
+- REST (débit, erreurs, latence par route): /metrics de chaque agent, relevé aux bornes du palier
+  (latences = borne haute du bucket de l'histogramme) ;
+- commandes (latence hub→agent) et connexions par device: trace des événements entrants (trace_path).
+Le premier palier dégradé indique la limite du hub — sauf raison "agents": REST rapide mais tâches
+périodiques de l'agent en retard (p90 au-delà du seuil), c'est alors le bench qui sature (le faux
+pactl est un script Python, bien plus coûteux que le vrai: baisser --per-proc ou répartir).
+
+Tempête de reconnexion (hub de substitution seulement): le hub est coupé à --storm-at puis
+relancé après --storm-down ; toute la flotte perd sa socket au même instant et se reconnecte
+avec le Backoff de l'agent (--reconnect-min/--reconnect-max).
+
+    python -m bench.fleet -n 500 --duration 40 --storm-at 10 --storm-down 3
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from bench.run import AgentProc, _free_port, _scrape, dist, shipped_cadence
+from utils import metrics, trace
+
+# événements socket portant une commande (payload avec _benchTs si injectée par le bench)
+_COMMANDS = ("leds:update", "leds:state", "leds:style", "music:volume", "music:cmd", "music:update",
+             "control:volume", "state:apply")
+
+_REQ = re.compile(r'^aura_http_requests_total\{code="([^"]*)",route="([^"]*)"\}$')
+# préfixes relevés: REST de l'agent, et retard de ses schedulers (agents saturés ≠ hub saturé)
+_SCRAPED = ("aura_http_requests_total", "aura_http_seconds", "aura_sched_lateness_seconds")
+# tâches périodiques du thread aura-io: en retard, c'est l'agent qui ne suit plus
+_IO_PERIODIC = r'task="(heartbeat|music_poll):.*"'
+
+# ---------- agents ----------
+class Shard:
+    """Un processus agent (main.py) et les devices qu'il porte."""
+
+    def __init__(self, url: str, devices: List[Tuple[str, str]], step: int, args):
+        self.devices = devices
+        self.step = step
+        self.port = _free_port()
+        specs = [{"name": f"f{i}", "device_id": did, "api_key": key, "sink": f"f{i}", "player": f"f{i}"}
+                 for i, (did, key) in enumerate(devices)]
+        cfg = {"devices": specs, "metrics_port": self.port,
+               "trace_path": "trace.jsonl", "trace_keep": 50,
+               "reconnect_min_sec": args.reconnect_min, "reconnect_max_sec": args.reconnect_max}
+        self.proc = AgentProc(None, devices[0][0], devices[0][1], latency_ms=args.driver_latency_ms, cfg=cfg, url=url)
+        self.started_at: Optional[float] = None
+        self.usage: Dict[str, Any] = {}
+
+    async def start_at(self, at: float) -> None:
+        await asyncio.sleep(max(0.0, at - time.time()))
+        self.started_at = time.time()
+        await self.proc.start()
+
+    async def stop(self) -> List[Dict[str, Any]]:
+        """Arrête l'agent (SIGINT: la trace est vidée) et renvoie ses enregistrements."""
+        if self.started_at is None:
+            return []
+        try:
+            cpu = self.proc.cpu_seconds()
+            self.usage = {"rssKb": self.proc.rss_kb(),
+                          "cpuPct": round(cpu / max(1e-9, time.time() - self.started_at) * 100, 2)}
+        except (FileNotFoundError, ProcessLookupError):
+            self.usage = {"exited": self.proc.proc.returncode}
+        await self.proc.stop(keep=True)
+        recs = list(trace.read(trace.files(os.path.join(self.proc.dir, "trace.jsonl"))))
+        return recs
+
+    def cleanup(self, keep: bool) -> None:
+        if not keep:
+            shutil.rmtree(self.proc.dir, ignore_errors=True)
+
+# ---------- /metrics ----------
+async def _sample(shards: List[Shard], t0: float, marks: List[float], snaps: Dict[float, Dict[int, Dict[str, float]]]) -> None:
+    """Relève /metrics de chaque agent démarré aux instants `marks` (s depuis t0)."""
+    for m in marks:
+        await asyncio.sleep(max(0.0, t0 + m - time.time()))
+        live = [(i, s) for i, s in enumerate(shards) if s.started_at is not None]
+        got = await asyncio.gather(*(_scrape(s.port, timeout=1.0) for _, s in live))
+        snaps[m] = {i: r for (i, _), r in zip(live, got) if r}
+
+def _delta(a: Dict[int, Dict[str, float]], b: Dict[int, Dict[str, float]]) -> Tuple[Counter, Dict[int, Counter]]:
+    """Compteurs cumulés b - a, au total et par processus (processus absent de a: depuis 0)."""
+    total: Counter = Counter()
+    per: Dict[int, Counter] = {}
+    for i, mb in b.items():
+        ma = a.get(i, {})
+        c = per[i] = Counter({k: v - ma.get(k, 0.0) for k, v in mb.items()
+                              if k.startswith(_SCRAPED)})
+        total.update(c)
+    return total, per
+
+def _requests(m: Counter) -> Tuple[Counter, Counter]:
+    """(requêtes, erreurs) par route ; erreur = pas de réponse ou code >= 400."""
+    n: Counter = Counter()
+    err: Counter = Counter()
+    for k, v in m.items():
+        g = _REQ.match(k)
+        if not g:
+            continue
+        code, route = g.groups()
+        n[route] += v
+        if not code.isdigit() or int(code) >= 400:
+            err[route] += v
+    return n, err
+
+def hist_dist(m: Counter, name: str = "aura_http_seconds", labels: Optional[str] = None) -> Dict[str, Any]:
+    """Quantiles (ms) depuis les buckets d'un histogramme de l'agent (séries dont les labels matchent `labels`)."""
+    prefix = name + "_bucket{"
+    cum: Counter = Counter()
+    for k, v in m.items():
+        if k.startswith(prefix):
+            lab, _, le = k[len(prefix):-1].rpartition(",le=")
+            if labels is None or re.fullmatch(labels, lab):
+                cum[le.strip('"')] += v
+    bounds = [(b, cum[repr(b)]) for b in metrics.DEFAULT_BUCKETS]
+    n = cum["+Inf"]
+
+    def q(x: float) -> Optional[float]:
+        if n <= 0:
+            return None
+        for b, c in bounds:
+            if c >= x * n:
+                return round(b * 1000, 3)
+        return None    # au-delà du dernier bucket (> 10 s)
+    return {"n": int(n), "p50": q(0.50), "p90": q(0.90), "p99": q(0.99)}
+
+# ---------- rapport ----------
+def _step_windows(n: int, ramp: int, interval: float, duration: float) -> List[Tuple[int, float, float]]:
+    steps = max(1, -(-n // ramp))
+    out = []
+    for s in range(steps):
+        lo = s * interval
+        hi = (s + 1) * interval if s < steps - 1 else duration
+        out.append((min(n, (s + 1) * ramp), lo, hi))
+    return out
+
+def _marks(windows: List[Tuple[int, float, float]], settle: float) -> List[float]:
+    # on ignore le début du palier (démarrage des agents, connexions et synchro en cours)
+    return sorted({min(hi, lo + settle) for _, lo, hi in windows} | {hi for _, lo, hi in windows})
+
+def _per_device(records: List[List[Dict[str, Any]]], t0: float) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[float, float]]]:
+    """Connexions (welcome) et commandes reçues par device, depuis les traces des agents."""
+    devs: Dict[str, Dict[str, Any]] = {}
+    cmds: List[Tuple[float, float]] = []      # (t_rel, ms hub→agent)
+    for recs in records:
+        for r in recs:
+            if r["kind"] != "ev" or not isinstance(r["payload"], dict):
+                continue
+            did = r["payload"].get("deviceId")
+            d = devs.setdefault(str(did), {"welcomes": [], "cmds": 0, "cmdMs": []})
+            if r["name"] == "welcome":
+                d["welcomes"].append(r["ts"] - t0)
+            elif r["name"] in _COMMANDS:
+                d["cmds"] += 1
+                sent = r["payload"].get("_benchTs")
+                if isinstance(sent, (int, float)):
+                    ms = (r["ts"] - sent) * 1000
+                    d["cmdMs"].append(ms)
+                    cmds.append((r["ts"] - t0, ms))
+    return devs, cmds
+
+def build_report(args, shards: List[Shard], records: List[List[Dict[str, Any]]], t0: float,
+                 snaps: Dict[float, Dict[int, Dict[str, float]]], hub_stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    windows = _step_windows(args.n, args.ramp, args.ramp_interval, args.duration)
+    devs, cmds = _per_device(records, t0)
+
+    steps = []
+    for agents, lo, hi in windows:
+        lo2 = min(hi, lo + args.settle)
+        m, _ = _delta(snaps.get(lo2, {}), snaps.get(hi, {}))
+        n, err = _requests(m)
+        span = max(1e-9, hi - lo2)
+        total = sum(n.values())
+        steps.append({
+            "agents": agents, "fromSec": lo, "toSec": round(hi, 2),
+            "restPerSec": round(total / span, 1),
+            "restErrPct": round(sum(err.values()) / total * 100, 2) if total else None,
+            "restMs": hist_dist(m),
+            "agentLagMs": hist_dist(m, "aura_sched_lateness_seconds", _IO_PERIODIC),
+            "cmdMs": dist([c[1] for c in cmds if lo2 <= c[0] < hi]),
+        })
+
+    def over(h: Dict[str, Any], q: str = "p99") -> bool:
+        # quantile None avec des mesures: au-delà du dernier bucket
+        return bool(h["n"]) and (h[q] is None or h[q] > args.max_p99_ms)
+
+    limit = None
+    for st in steps:
+        if (st["restErrPct"] or 0) > args.max_err_pct:
+            reason = "errors"
+        elif over(st["restMs"]):
+            reason = "p99"
+        elif over(st["agentLagMs"], "p90"):
+            # REST rapide mais thread aura-io en retard: c'est le bench qui sature (baisser --per-proc)
+            reason = "agents"
+        else:
+            continue
+        limit = {"agents": st["agents"], "restPerSec": st["restPerSec"], "reason": reason}
+        break
+
+    # tout le run: dernier relevé (compteurs depuis le démarrage de chaque agent)
+    m, per = _delta({}, snaps.get(args.duration, {}))
+    n, err = _requests(m)
+    ids = [did for s in shards for did, _ in s.devices]
+    per_dev = [devs.get(did, {"welcomes": [], "cmds": 0, "cmdMs": []}) for did in ids]
+    start_of = {did: s.started_at - t0 for s in shards if s.started_at is not None for did, _ in s.devices}
+    return {
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "devices")},
+        "cadence": shipped_cadence(),
+        "agents": len(ids),
+        "processes": sum(1 for s in shards if s.started_at is not None),
+        "connected": sum(1 for d in per_dev if d["welcomes"]),
+        # lancement du processus → welcome (import + boot de l'agent compris)
+        "connectMs": dist([(devs[did]["welcomes"][0] - start_of[did]) * 1000 if devs.get(did, {}).get("welcomes") else None
+                           for did in ids if did in start_of]),
+        "restMs": {route: hist_dist(m, labels=f'route="{re.escape(route)}"') for route in sorted(n)},
+        "rest": {route: int(v) for route, v in sorted(n.items())},
+        "cmdMs": dist([c[1] for c in cmds]),
+        "errors": {f"rest_{route}": int(v) for route, v in sorted(err.items()) if v},
+        "perDevice": {
+            "reconnectsMax": max((max(0, len(d["welcomes"]) - 1) for d in per_dev), default=0),
+            "cmds": dist([float(d["cmds"]) for d in per_dev]),
+            "cmdMsP99": dist([dist(d["cmdMs"])["p99"] for d in per_dev if d["cmdMs"]]),
+        },
+        # erreurs REST: les métriques de l'agent sont par processus, pas par device
+        "perProcess": {
+            "devices": args.per_proc,
+            "restErr": dist([float(sum(_requests(c)[1].values())) for c in per.values()]),
+            "rssKb": dist([s.usage.get("rssKb") for s in shards if s.started_at is not None]),
+            "cpuPct": dist([s.usage.get("cpuPct") for s in shards if s.started_at is not None]),
+        },
+        "steps": steps,
+        "limit": limit,
+        "hub": hub_stats,
+    }
+
+def _peak(ts: List[float], width: float) -> float:
+    """Pic de débit (/s) sur des fenêtres de `width` secondes."""
+    c = Counter(int(t // width) for t in ts)
+    return round(max(c.values()) / width, 1) if c else 0.0
+
+def storm_report(records: List[List[Dict[str, Any]]], t0: float, down_rel: float, up_rel: float, n: int) -> Dict[str, Any]:
+    devs, _ = _per_device(records, t0)
+    back: List[float] = []
+    welcomes: List[float] = []
+    for d in devs.values():
+        at = next((t for t in d["welcomes"] if t >= down_rel), None)
+        if at is not None:
+            back.append(max(0.0, at - up_rel) * 1000)
+            welcomes.append(at - up_rel)
+    pulls = [r["ts"] - t0 for recs in records for r in recs
+             if r["kind"] == "rest" and r["name"] == "pull" and r["ts"] - t0 >= up_rel]
+    return {
+        "downAtSec": round(down_rel, 2), "upAtSec": round(up_rel, 2),
+        "reconnected": len(back), "reconnectedPct": round(len(back) / max(1, n) * 100, 1),
+        "reconnectMs": dist(back),
+        "spreadMs": round((max(back) - min(back)), 3) if back else None,
+        "welcomePeakPerSec": {"100ms": _peak(welcomes, 0.1), "1s": _peak(welcomes, 1.0)},
+        "stateGetPeakPerSec": {"100ms": _peak(pulls, 0.1), "1s": _peak(pulls, 1.0)},
+    }
+
+async def _storm(hub, at: float, down: float) -> Tuple[float, float]:
+    await asyncio.sleep(max(0.0, at - time.time()))
+    t_down = time.time()
+    await hub.restart(down)
+    return t_down, time.time()
+
+# ---------- orchestration ----------
+async def _drive_commands(url: str, ids: List[str], rate: float, until: float, sent: Counter, hub=None) -> None:
+    """
+    Injecte des commandes via /__debug/emit à `rate`/s (réparties sur la flotte). Avec le hub de
+    substitution, la DB est mise à jour avant l'émission comme le fait la route REST de l'api:
+    sinon le poll /state de l'agent annulerait chaque commande.
+    """
+    if rate <= 0 or not ids:
+        return
+    import aiohttp
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as http:
+        period = 1.0 / rate
+        i = 0
+        while time.time() < until:
+            did = random.choice(ids)
+            if i % 2:
+                v = random.randint(0, 100)
+                event, payload = "music:volume", {"value": v}
+                if hub is not None:
+                    hub.devices[did].music["volume"] = v
+            else:
+                v = random.randint(1, 100)
+                event, payload = "leds:update", {"leds": {"brightness": v}}
+                if hub is not None:
+                    hub.devices[did].leds["brightness"] = v
+            payload.update(deviceId=did, _benchTs=time.time())
+            i += 1
+            try:
+                async with http.post(f"{url.rstrip('/')}/__debug/emit",
+                                     json={"deviceId": did, "event": event, "payload": payload}) as r:
+                    sent["ok" if r.status < 400 else f"http_{r.status}"] += 1
+            except Exception as e:
+                sent[type(e).__name__] += 1
+            await asyncio.sleep(period)
+
+def _load_devices(args) -> List[Tuple[str, str]]:
+    if args.devices:
+        with open(args.devices) as f:
+            items = json.load(f)
+        return [(str(d["id"]), str(d["key"])) for d in items][: args.n or None]
+    return [(f"sim-{i:06d}", f"sim-key-{i:06d}") for i in range(args.n)]
+
+def _shards(url: str, devices: List[Tuple[str, str]], args) -> List[Shard]:
+    """Un palier = ses devices, découpés en processus de --per-proc devices au plus."""
+    out = []
+    for lo in range(0, len(devices), args.ramp):
+        step = devices[lo: lo + args.ramp]
+        for k in range(0, len(step), args.per_proc):
+            out.append(Shard(url, step[k: k + args.per_proc], lo // args.ramp, args))
+    return out
+
+async def amain(args) -> Dict[str, Any]:
+    devices = _load_devices(args)
+    args.n = len(devices)
+    hub = None
+    url = args.hub
+    if url == "stand-in":
+        from bench.hub import StandInHub
+        hub = StandInHub(rest_latency_ms=args.rest_latency_ms)
+        for i, (did, key) in enumerate(devices):
+            dev = hub.add_device(did, key)
+            if args.weather_cities:
+                dev.widgets = [{"key": "weather", "enabled": True, "orderIndex": 0,
+                                "config": {"city": f"city-{i % args.weather_cities}"}}]
+        await hub.start()
+        url = hub.url
+
+    shards = _shards(url, devices, args)
+    t0 = time.time() + 1.0
+    until = t0 + args.duration
+    snaps: Dict[float, Dict[int, Dict[str, float]]] = {}
+    sent: Counter = Counter()
+    storm = asyncio.ensure_future(_storm(hub, t0 + args.storm_at, args.storm_down)) if (hub and args.storm_at) else None
+    records: List[List[Dict[str, Any]]] = []
+    hub_stats = None
+    try:
+        starts = [asyncio.ensure_future(s.start_at(t0 + s.step * args.ramp_interval)) for s in shards]
+        sampler = asyncio.ensure_future(_sample(shards, t0, _marks(_step_windows(args.n, args.ramp, args.ramp_interval, args.duration), args.settle), snaps))
+        await _drive_commands(url, [d for d, _ in devices], args.cmd_rate, until, sent, hub)
+        await sampler
+        await asyncio.gather(*starts)
+        if hub is not None:
+            dt = max(1e-9, time.time() - t0)
+            hub_stats = {"http": dict(hub.http), "events": dict(hub.events),
+                         "httpPerSec": round(sum(hub.http.values()) / dt, 1)}
+        records = list(await asyncio.gather(*(s.stop() for s in shards)))
+    finally:
+        for s in shards:
+            if s.started_at is not None:
+                await s.proc.stop(keep=True)
+            s.cleanup(args.keep)
+        if hub is not None:
+            await hub.stop()
+    rep = build_report(args, shards, records, t0, snaps, hub_stats)
+    rep["commandsSent"] = dict(sent)
+    if storm is not None:
+        t_down, t_up = await storm
+        rep["storm"] = storm_report(records, t0, t_down - t0, t_up - t0, args.n)
+    return rep
+
+def _raise_nofile() -> None:
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except Exception:
+        pass
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Charge « flotte » d'agents réels (main.py, pilotes factices) contre un hub")
+    ap.add_argument("-n", type=int, default=100, help="nombre de devices (ignoré si --devices plus court)")
+    ap.add_argument("--hub", default="stand-in", help="URL de l'aura-api, ou 'stand-in' (hub local du bench)")
+    ap.add_argument("--devices", help="JSON [{id, key}, …] (obligatoire contre une vraie api)")
+    ap.add_argument("--per-proc", type=int, default=20,
+                    help="devices par processus agent (un évènement sink est vu par tous les devices du processus)")
+    ap.add_argument("--duration", type=float, default=60.0, help="durée totale (s)")
+    ap.add_argument("--ramp", type=int, default=0, help="devices ajoutés par palier (0 = tous d'un coup)")
+    ap.add_argument("--ramp-interval", type=float, default=10.0, help="durée d'un palier (s)")
+    ap.add_argument("--settle", type=float, default=5.0, help="début de palier ignoré (s): boot et synchro des agents")
+    ap.add_argument("--driver-latency-ms", type=float, default=5.0, help="latence des faux pactl/playerctl")
+    ap.add_argument("--rest-latency-ms", type=float, default=0.0, help="stand-in: latence REST simulée")
+    ap.add_argument("--weather-cities", type=int, default=0,
+                    help="stand-in: widget météo sur chaque device, réparti sur N villes (0 = pas de /weather)")
+    ap.add_argument("--cmd-rate", type=float, default=5.0, help="commandes/s injectées via /__debug/emit")
+    ap.add_argument("--max-p99-ms", type=float, default=500.0, help="seuil de palier dégradé")
+    ap.add_argument("--max-err-pct", type=float, default=1.0, help="seuil de palier dégradé")
+    ap.add_argument("--storm-at", type=float, default=0.0, help="stand-in: coupe le hub à t (s) (0 = pas de tempête)")
+    ap.add_argument("--storm-down", type=float, default=3.0, help="stand-in: durée de la coupure (s)")
+    ap.add_argument("--reconnect-min", type=float, default=1.0, help="backoff de reconnexion de l'agent (s)")
+    ap.add_argument("--reconnect-max", type=float, default=30.0)
+    ap.add_argument("--keep", action="store_true", help="garde les dossiers des agents (config, logs, traces)")
+    ap.add_argument("--out", help="écrit le rapport JSON dans ce fichier")
+    args = ap.parse_args(argv)
+    if args.hub != "stand-in" and not args.devices:
+        ap.error("--devices est requis contre une vraie api")
+    if args.hub != "stand-in" and args.weather_cities:
+        ap.error("--weather-cities n'est possible qu'avec le hub de substitution")
+    if args.storm_at and args.hub != "stand-in":
+        ap.error("--storm-at n'est possible qu'avec le hub de substitution")
+    if args.ramp <= 0:
+        args.ramp = max(1, args.n)
+    args.per_proc = max(1, args.per_proc)
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    _raise_nofile()
+    rep = asyncio.run(amain(args))
+    text = json.dumps(rep, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
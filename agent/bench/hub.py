@@ -0,0 +1,330 @@
+# bench/hub.py
+"""
+Hub de substitution pour le bench: reproduit la surface de l'aura-api vue par l'agent
+(namespace socket.io /agent + REST /api/v1/devices/:id/state|heartbeat|leds/*|music/*),
+sans base de données.
+Horodate tout ce qui arrive de l'agent pour mesurer ack / applied côté hub.
+wire=True: accepte l'encodage msgpack proposé à agent:register (l'aura-api actuelle: non).
+"""
+from __future__ import annotations
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import socketio
+from aiohttp import web
+
+from utils import wire
+
+NS = "/agent"
+
+Pred = Callable[[str, str, Dict[str, Any]], bool]
+
+class HubDevice:
+    def __init__(self, device_id: str, api_key: str):
+        self.id = device_id
+        self.api_key = api_key
+        self.leds: Dict[str, Any] = {"on": False, "color": "#FFFFFF", "brightness": 50, "preset": None}
+        self.music: Dict[str, Any] = {"status": "pause", "volume": 50, "track": None}
+        self.widgets: List[Dict[str, Any]] = []
+        self.reported: Optional[Dict[str, Any]] = None
+        self.sids: set = set()
+        self.wire = False          # l'agent a négocié msgpack (commandes encodées)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"leds": dict(self.leds), "music": dict(self.music), "widgets": list(self.widgets)}
+
+class StandInHub:
+    def __init__(self, rest_latency_ms: float = 0.0, wire: bool = False):
+        self.rest_latency = rest_latency_ms / 1000.0
+        self.wire = wire
+        self.rx_bytes: Counter = Counter()    # taille des payloads reçus par événement
+        self.rx_count: Counter = Counter()
+        self.devices: Dict[str, HubDevice] = {}
+        self.http: Counter = Counter()
+        self.events: Counter = Counter()
+        self.registers: List[Tuple[float, str]] = []      # (perf_counter, deviceId)
+        self.weather_latency = 0.0      # /weather: latence (s), panne (503), température servie
+        self.weather_down = False
+        self.weather_temp = 12.5
+        self._waiters: List[Tuple[Pred, bool, asyncio.Future]] = []
+        self._runner: Optional[web.AppRunner] = None
+        self.host = "127.0.0.1"
+        self.port = 0
+        self._build()
+
+    # ---------- construction ----------
+    def _build(self) -> None:
+        self.sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*", logger=False, engineio_logger=False)
+        self.app = web.Application()
+        self.sio.attach(self.app, socketio_path="socket.io")
+        self.app.router.add_get("/api/v1/devices/{id}/state", self._rest_state)
+        self.app.router.add_post("/api/v1/devices/{id}/heartbeat", self._rest_heartbeat)
+        for route in ("leds/state", "leds/style", "music/volume", "music/cmd"):
+            self.app.router.add_post(f"/api/v1/devices/{{id}}/{route}", self._rest_control(route))
+        self.app.router.add_get("/api/v1/weather", self._rest_weather)
+        self.app.router.add_post("/__debug/emit", self._debug_emit)
+
+        sio = self.sio
+
+        @sio.on("connect", namespace=NS)
+        async def _connect(sid, environ, auth=None):
+            did = environ.get("HTTP_X_DEVICE_ID")
+            authz = environ.get("HTTP_AUTHORIZATION", "")
+            dev = self.devices.get(did or "")
+            if dev is None or authz != f"ApiKey {dev.api_key}":
+                return False
+            await sio.save_session(sid, {"deviceId": did}, namespace=NS)
+            await sio.enter_room(sid, did, namespace=NS)
+            dev.sids.add(sid)
+            self._notify("connect", did, {})
+            await sio.emit("welcome", {"ok": True, "deviceId": did}, to=sid, namespace=NS)
+
+        @sio.on("disconnect", namespace=NS)
+        async def _disconnect(sid, *_):
+            for dev in self.devices.values():
+                dev.sids.discard(sid)
+                dev.wire = False
+
+        @sio.on("agent:register", namespace=NS)
+        async def _register(sid, p):
+            p = self._rx("agent:register", p)
+            did = (p or {}).get("deviceId")
+            if did in self.devices:
+                await sio.enter_room(sid, did, namespace=NS)
+                self.registers.append((time.perf_counter(), did))
+                if self.wire and wire.MSGPACK in (p.get("wire") or []):
+                    self.devices[did].wire = True
+                    await sio.emit("welcome", {"ok": True, "deviceId": did, "wire": wire.MSGPACK}, to=sid, namespace=NS)
+                self._notify("register", did, p or {})
+
+        @sio.on("ack", namespace=NS)
+        async def _ack(sid, p):
+            p = self._rx("ack", p)
+            if ((p or {}).get("data") or {}).get("echo"):
+                self.events["ack:echo"] += 1     # renvoi d'une action locale, acquitté sans réapplication
+            self._notify("ack", (p or {}).get("deviceId", ""), p or {})
+
+        @sio.on("nack", namespace=NS)
+        async def _nack(sid, p):
+            p = self._rx("nack", p)
+            self._notify("nack", (p or {}).get("deviceId", ""), p or {})
+
+        @sio.on("state:report", namespace=NS)
+        async def _report(sid, p):
+            p = self._rx("state:report", p)
+            did = (p or {}).get("deviceId", "")
+            dev = self.devices.get(did)
+            if dev is not None:
+                dev.reported = p
+            self._notify("report", did, p or {})
+
+        @sio.on("*", namespace=NS)
+        async def _any(event, sid, p=None):
+            p = self._rx(event, p)
+            self._notify(event, (p or {}).get("deviceId", "") if isinstance(p, dict) else "", p if isinstance(p, dict) else {})
+
+    def _rx(self, event: str, p: Any) -> Any:
+        """Décode un payload msgpack et compte les octets reçus (JSON compact sinon)."""
+        if isinstance(p, (bytes, bytearray)):
+            self.rx_bytes[event] += len(p)
+            self.rx_count[event] += 1
+            return wire.decode(p)
+        if p is not None:
+            self.rx_bytes[event] += len(json.dumps(p, separators=(",", ":")))
+            self.rx_count[event] += 1
+        return p
+
+    async def emit_to(self, did: str, event: str, payload: Dict[str, Any]) -> None:
+        """Émet vers la room du device, encodé si l'agent a négocié msgpack."""
+        body: Any = {**payload, "deviceId": did}
+        dev = self.devices.get(did)
+        if dev is not None and dev.wire:
+            body = wire.encode(body)
+        await self.sio.emit(event, body, room=did, namespace=NS)
+
+    def add_device(self, device_id: str, api_key: str) -> HubDevice:
+        dev = self.devices[device_id] = HubDevice(device_id, api_key)
+        return dev
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # ---------- cycle de vie ----------
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self._runner = web.AppRunner(self.app, handle_signals=False, shutdown_timeout=0.5)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port or self.port, reuse_address=True)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def restart(self, down_sec: float = 0.5, *, stall: bool = False) -> float:
+        """
+        Coupe le hub (connexions comprises) puis le relance sur le même port. Retourne t_up.
+        stall=True: pendant la coupure le port accepte le TCP sans jamais répondre (api figée,
+        LB devant une api absente) ; les tentatives de connexion vont jusqu'à leur timeout.
+        """
+        await self.stop()
+        for dev in self.devices.values():
+            dev.sids.clear()
+        if not stall:
+            await asyncio.sleep(down_sec)
+        else:
+            held: List[asyncio.StreamWriter] = []
+            async def _hold(_r: asyncio.StreamReader, w: asyncio.StreamWriter) -> None:
+                held.append(w)
+            srv = await asyncio.start_server(_hold, self.host, self.port, reuse_address=True)
+            await asyncio.sleep(down_sec)
+            srv.close()
+            for w in held:
+                w.close()
+            await srv.wait_closed()
+        self._build()
+        await self.start(self.host, self.port)
+        return time.perf_counter()
+
+    # ---------- REST ----------
+    def _auth(self, req: web.Request) -> Optional[HubDevice]:
+        dev = self.devices.get(req.match_info.get("id", ""))
+        if dev is None:
+            return None
+        if req.headers.get("Authorization") != f"ApiKey {dev.api_key}":
+            return None
+        return dev
+
+    async def _rest_state(self, req: web.Request) -> web.Response:
+        self.http["state"] += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        dev = self._auth(req)
+        if dev is None:
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return web.json_response(dev.snapshot())
+
+    async def _rest_heartbeat(self, req: web.Request) -> web.Response:
+        self.http["heartbeat"] += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        if self._auth(req) is None:
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return web.Response(status=204)
+
+    def _rest_control(self, route: str):
+        """Routes de contrôle (appel agent, ApiKey): écrit la « DB » puis renvoie la commande à l'agent."""
+        async def handler(req: web.Request) -> web.Response:
+            self.http[route] += 1
+            if self.rest_latency:
+                await asyncio.sleep(self.rest_latency)
+            dev = self._auth(req)
+            if dev is None:
+                return web.json_response({"error": "unauthorized"}, status=401)
+            body = await req.json()
+            if route == "leds/state":
+                dev.leds["on"] = bool(body["on"])
+                event, payload = "leds:state", {"on": dev.leds["on"]}
+            elif route == "leds/style":
+                dev.leds.update({k: body[k] for k in ("color", "brightness", "preset") if k in body}, on=True)
+                event, payload = "leds:style", dict(body)
+            elif route == "music/volume":
+                dev.music["volume"] = int(body["value"])
+                event, payload = "music:volume", {"music": {"volume": dev.music["volume"]}}
+            else:
+                if body.get("action") in ("play", "pause"):
+                    dev.music["status"] = body["action"]
+                event, payload = "music:cmd", {"music": {"action": body.get("action")}}
+            self._notify("db", dev.id, {"route": route, **body})
+            await self.emit_to(dev.id, event, payload)
+            return web.json_response({"accepted": True}, status=202)
+        return handler
+
+    async def _rest_weather(self, req: web.Request) -> web.Response:
+        self.http["weather"] += 1
+        if self.weather_latency:
+            await asyncio.sleep(self.weather_latency)
+        if self.weather_down:
+            return web.json_response({"error": "upstream"}, status=503)
+        city = req.query.get("city", "paris")
+        units = req.query.get("units", "metric")
+        return web.json_response({"city": city, "units": units, "temp": self.weather_temp, "desc": "cloudy", "icon": "cloud",
+                                  "updatedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "ttlSec": 300})
+
+    async def _debug_emit(self, req: web.Request) -> web.Response:
+        """Même contrat que /__debug/emit de l'aura-api (DEV)."""
+        self.http["debug_emit"] += 1
+        body = await req.json()
+        did = body.get("deviceId")
+        await self.emit_to(did, body.get("event"), body.get("payload") or {})
+        return web.json_response({"ok": True})
+
+    # ---------- attente d'événements ----------
+    def _notify(self, kind: str, did: str, payload: Dict[str, Any]) -> None:
+        t = time.perf_counter()
+        self.events[kind] += 1
+        for w in list(self._waiters):
+            pred, consume, fut = w
+            if fut.done() or not pred(kind, did, payload):
+                continue
+            fut.set_result(t)
+            if consume:       # un ack ne satisfait qu'une commande (FIFO)
+                break
+
+    async def wait_for(self, pred: Pred, timeout: float = 5.0, *, consume: bool = False) -> Optional[float]:
+        fut = asyncio.get_running_loop().create_future()
+        w = (pred, consume, fut)
+        self._waiters.append(w)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiters.remove(w)
+
+    def waiter(self, pred: Pred, timeout: float = 5.0, *, consume: bool = False) -> "asyncio.Task[Optional[float]]":
+        """Comme wait_for, mais armé tout de suite (à créer AVANT l'emit)."""
+        fut = asyncio.get_running_loop().create_future()
+        w = (pred, consume, fut)
+        self._waiters.append(w)
+
+        async def _wait() -> Optional[float]:
+            try:
+                return await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._waiters.remove(w)
+        return asyncio.ensure_future(_wait())
+
+    # ---------- commandes ----------
+    async def command(self, did: str, event: str, payload: Dict[str, Any], *,
+                      ack_type: str, applied: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                      db: Optional[Dict[str, Any]] = None, timeout: float = 5.0) -> Dict[str, Any]:
+        """
+        Comme l'API: met à jour la « DB » puis pousse l'événement à la room du device.
+        Retourne les latences event→ack et event→applied (state:report conforme), en ms.
+        """
+        dev = self.devices[did]
+        if db:
+            if "leds" in db: dev.leds.update(db["leds"])
+            if "music" in db: dev.music.update(db["music"])
+        ack_w = self.waiter(lambda k, d, p: k in ("ack", "nack") and d == did and p.get("type") == ack_type
+                            and not (p.get("data") or {}).get("echo"), timeout, consume=True)
+        app_w = None
+        if applied is not None:
+            app_w = self.waiter(lambda k, d, p: k == "report" and d == did and applied(p), timeout)
+        t0 = time.perf_counter()
+        await self.emit_to(did, event, payload)
+        t_ack = await ack_w
+        t_app = await app_w if app_w is not None else None
+        return {
+            "ackMs": None if t_ack is None else (t_ack - t0) * 1000,
+            "appliedMs": None if t_app is None else (t_app - t0) * 1000,
+        }
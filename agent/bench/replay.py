@@ -0,0 +1,163 @@
+# bench/replay.py
+"""
+Rejoue une trace d'entrées (trace_path de l'agent) dans les handlers de main.py,
+contre les faux pilotes du bench, sans réseau.
+
+    python -m bench.replay /var/lib/aura/trace.jsonl               # temps réel
+    python -m bench.replay trace.jsonl --speed 20                  # 20× plus vite
+    python -m bench.replay trace.jsonl --speed 0 --out replay.json # au plus vite
+
+Les rotations (trace.jsonl.1, .2 …) sont relues dans l'ordre. Chaque événement est
+dispatché au handler socket enregistré ; les réponses REST tracées sont servies à
+_fetch_api_state dans l'ordre où l'agent les avait reçues (celles du poll périodique
+déclenchent _poll_music_from_db). Les émissions vers le hub sont comptées, pas envoyées.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+from bench import fakes
+from bench.run import AGENT_DIR, dist
+from utils import trace
+
+def _load_agent(workdir: str, latency_ms: float, cfg: Dict[str, Any]):
+    """Importe main.py dans un dossier de travail isolé (config + faux pilotes)."""
+    c = {"api_url": "http://127.0.0.1:9", "device_id": "replay-device", "api_key": "replay",
+         "log_level": "warn", "metrics_port": 0, "trace_path": "", "state_path": ""}
+    c.update(cfg)
+    with open(os.path.join(workdir, "config.yaml"), "w") as f:
+        for k, v in c.items():
+            f.write(f"{k}: {json.dumps(v)}\n")
+    os.environ.update(fakes.install(workdir, latency_ms))
+    os.chdir(workdir)
+    if AGENT_DIR not in sys.path:
+        sys.path.insert(0, AGENT_DIR)
+    import main
+    return main
+
+def replay(records: List[Dict[str, Any]], *, speed: float, latency_ms: float, device_id: Optional[str]) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="aura-replay-")
+    cwd = os.getcwd()
+    try:
+        cfg = {"device_id": device_id} if device_id else {}
+        main = _load_agent(workdir, latency_ms, cfg)
+        ns = main.NS
+        client = main.LINKS[0].client()    # la trace est mono-device: premier device de la config
+        handlers = client.handlers.get(ns, {})
+
+        emitted: Counter = Counter()
+        def _sink(event, data=None, namespace=None, **_):
+            emitted[event] += 1
+        client.emit = _sink
+        main.post_heartbeat = lambda *a, **k: None
+
+        consumed = set()
+        cursor = {"i": 0}
+        def _fetch(d, source: str = "poll"):
+            # prochaine réponse REST non consommée après la position courante
+            for j in range(cursor["i"], len(records)):
+                r = records[j]
+                if r["kind"] == "rest" and j not in consumed:
+                    consumed.add(j)
+                    return r["payload"]
+            return None
+        main._fetch_api_state = _fetch
+
+        lat: Dict[str, List[float]] = defaultdict(list)
+        unknown: Counter = Counter()
+        t_first = records[0]["ts"] if records else 0.0
+        wall0 = time.perf_counter()
+        ru0 = resource.getrusage(resource.RUSAGE_SELF)
+        ruc0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        busy = 0.0
+        lag: List[float] = []
+
+        for i, r in enumerate(records):
+            cursor["i"] = i + 1
+            if r["kind"] == "rest" and (i in consumed or r["name"] != "poll"):
+                continue
+            if speed > 0:
+                due = wall0 + (r["ts"] - t_first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    lag.append(-delay * 1000)
+            t0 = time.perf_counter()
+            if r["kind"] == "rest":
+                cursor["i"] = i   # _poll_music_from_db consomme ce record
+                main._poll_music_from_db(main.DEVICES[0])
+                name = "rest:poll"
+            else:
+                name = r["name"]
+                fn = handlers.get(name)
+                if fn is None:
+                    unknown[name] += 1
+                    continue
+                try:
+                    if name in ("connect", "disconnect"):
+                        fn()
+                    else:
+                        fn(r["payload"] if r["payload"] is not None else {})
+                except Exception as e:
+                    unknown[f"error:{name}:{type(e).__name__}"] += 1
+            dt = time.perf_counter() - t0
+            busy += dt
+            lat[name].append(dt * 1000)
+
+        wall = time.perf_counter() - wall0
+        ru1 = resource.getrusage(resource.RUSAGE_SELF)
+        ruc1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (ru1.ru_utime + ru1.ru_stime - ru0.ru_utime - ru0.ru_stime
+               + ruc1.ru_utime + ruc1.ru_stime - ruc0.ru_utime - ruc0.ru_stime)
+        span = (records[-1]["ts"] - t_first) if records else 0.0
+        return {
+            "records": len(records),
+            "traceSpanSec": round(span, 3),
+            "speed": speed,
+            "wallSec": round(wall, 3),
+            "busySec": round(busy, 3),
+            "cpuSec": round(cpu, 3),
+            "eventMs": dist([v for vs in lat.values() for v in vs]),
+            "perEventMs": {k: dist(v) for k, v in sorted(lat.items())},
+            "scheduleLagMs": dist(lag) if speed > 0 else None,
+            "emitted": dict(emitted),
+            "skipped": dict(unknown),
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Rejoue une trace d'entrées de l'agent Aura")
+    ap.add_argument("trace", help="fichier trace (ses rotations .1, .2 … sont incluses)")
+    ap.add_argument("--speed", type=float, default=1.0, help="1 = temps réel, N = N× plus vite, 0 = au plus vite")
+    ap.add_argument("--driver-latency-ms", type=float, default=5.0)
+    ap.add_argument("--device-id", help="deviceId à simuler (défaut: celui des payloads)")
+    ap.add_argument("--out", help="écrit le rapport JSON dans ce fichier")
+    args = ap.parse_args(argv)
+
+    records = list(trace.read(trace.files(args.trace)))
+    did = args.device_id
+    if did is None:
+        did = next((r["payload"].get("deviceId") for r in records
+                    if r["kind"] == "ev" and isinstance(r["payload"], dict) and r["payload"].get("deviceId")), None)
+    rep = replay(records, speed=args.speed, latency_ms=args.driver_latency_ms, device_id=did)
+    text = json.dumps(rep, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
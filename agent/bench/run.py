@@ -0,0 +1,890 @@
+# bench/run.py
+"""
+Bench de bout en bout de l'agent: hub de substitution + faux pactl/playerctl + _MockStrip.
+
+    python -m bench.run                       # tous les scénarios, JSON sur stdout
+    python -m bench.run -s single burst --out bench.json
+    python -m bench.run --baseline old.json   # exit 1 si régression > tolérance
+
+À lancer depuis agent/ (l'agent est démarré en sous-processus, un dossier temporaire par scénario).
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from bench import fakes
+from bench.hub import StandInHub
+from utils import lan, wire
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(AGENT_DIR, "main.py")
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+# ---------- stats ----------
+def pct(values: List[float], q: float) -> Optional[float]:
+    vs = sorted(v for v in values if v is not None)
+    if not vs:
+        return None
+    i = min(len(vs) - 1, max(0, int(round(q * (len(vs) - 1)))))
+    return round(vs[i], 3)
+
+def dist(values: List[Optional[float]]) -> Dict[str, Any]:
+    ok = [v for v in values if v is not None]
+    return {
+        "n": len(values), "missing": len(values) - len(ok),
+        "p50": pct(ok, 0.50), "p90": pct(ok, 0.90), "p99": pct(ok, 0.99),
+        "max": round(max(ok), 3) if ok else None,
+    }
+
+# ---------- agent sous-processus ----------
+_CADENCE = ("heartbeat_sec", "music_poll_sec", "sink_watch_sec")
+
+def shipped_cadence() -> Dict[str, float]:
+    """Périodes de la config.yaml livrée: le bench mesure ce qui est déployé."""
+    out: Dict[str, float] = {}
+    with open(os.path.join(AGENT_DIR, "config.yaml")) as f:
+        for line in f:
+            k, _, v = line.partition(":")
+            if k.strip() in _CADENCE:
+                out[k.strip()] = float(v.split("#")[0])
+    return out
+
+class AgentProc:
+    def __init__(self, hub: Optional[StandInHub], device_id: str, api_key: str, *,
+                 latency_ms: float, cfg: Optional[Dict[str, Any]] = None, url: Optional[str] = None):
+        self.hub = hub
+        self.url = url or hub.url      # url: vraie api (bench.fleet), sans hub de substitution
+        self.device_id = device_id
+        self.api_key = api_key
+        self.latency_ms = latency_ms
+        self.cfg = cfg or {}
+        self.dir = tempfile.mkdtemp(prefix="aura-bench-")
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self._log = None
+
+    def _write_config(self) -> None:
+        c = {
+            "api_url": self.url, "ws_path": "/socket.io", "namespace": "/agent",
+            "device_id": self.device_id, "api_key": self.api_key,
+            **shipped_cadence(),
+            "log_level": "warn", "metrics_port": 0,
+        }
+        c.update(self.cfg)
+        with open(os.path.join(self.dir, "config.yaml"), "w") as f:
+            for k, v in c.items():
+                f.write(f"{k}: {json.dumps(v)}\n")
+
+    async def start(self) -> None:
+        self._write_config()
+        env = dict(os.environ)
+        env.update(fakes.install(self.dir, self.latency_ms))
+        env["PYTHONUNBUFFERED"] = "1"
+        self._log = open(os.path.join(self.dir, "agent.log"), "w")
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, MAIN, cwd=self.dir, env=env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+
+    # /proc: CPU (utime+stime, enfants pactl/playerctl compris) et changements de contexte
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.proc.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return sum(int(x) for x in fields[11:15]) / CLK_TCK
+
+    def wakeups(self) -> int:
+        total = 0
+        base = f"/proc/{self.proc.pid}/task"
+        for tid in os.listdir(base):
+            try:
+                with open(f"{base}/{tid}/status") as f:
+                    for line in f:
+                        if line.startswith(("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches")):
+                            total += int(line.split()[1])
+            except FileNotFoundError:
+                pass
+        return total
+
+    def rss_kb(self) -> int:
+        with open(f"/proc/{self.proc.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+        return 0
+
+    def sample(self) -> Dict[str, float]:
+        return {"t": time.perf_counter(), "cpu": self.cpu_seconds(), "wake": self.wakeups(), "http": sum(self.hub.http.values()) if self.hub else 0}
+
+    async def stop(self, keep: bool = False) -> None:
+        if self.proc and self.proc.returncode is None:
+            self.proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(self.proc.wait(), 5)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+                await self.proc.wait()
+        if self._log:
+            self._log.close()
+        if not keep:
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+def usage(a: Dict[str, float], b: Dict[str, float]) -> Dict[str, Any]:
+    dt = max(1e-9, b["t"] - a["t"])
+    return {
+        "wallSec": round(dt, 3),
+        "cpuSec": round(b["cpu"] - a["cpu"], 3),
+        "cpuPct": round((b["cpu"] - a["cpu"]) / dt * 100, 2),
+        "wakeupsPerSec": round((b["wake"] - a["wake"]) / dt, 2),
+        "httpPerMin": round((b["http"] - a["http"]) / dt * 60, 2),
+    }
+
+# ---------- scénarios ----------
+DEVICE = "bench-device-0001"
+KEY = "bench-key"
+
+async def _boot(args, hub: StandInHub, cfg: Optional[Dict[str, Any]] = None) -> AgentProc:
+    ag = AgentProc(hub, DEVICE, KEY, latency_ms=args.driver_latency_ms, cfg=cfg)
+    reg = hub.waiter(lambda k, d, p: k == "register" and d == DEVICE, 30)
+    await ag.start()
+    if await reg is None:
+        raise RuntimeError(f"agent non connecté (voir {ag.dir}/agent.log)")
+    await asyncio.sleep(args.settle)
+    return ag
+
+def _vol_is(v: int):
+    return lambda p: (p.get("music") or {}).get("volume") == v
+
+def _color_is(c: str):
+    return lambda p: (p.get("leds") or {}).get("color") == c
+
+async def scenario_single(args, hub: StandInHub) -> Dict[str, Any]:
+    """Commandes unitaires espacées (> throttle d'emit), alternance LEDs / volume."""
+    ag = await _boot(args, hub)
+    try:
+        u0 = ag.sample()
+        acks: Dict[str, List] = {"leds": [], "music": []}
+        apps: Dict[str, List] = {"leds": [], "music": []}
+        for i in range(args.count):
+            if i % 2 == 0:
+                color = "#%02X%02X%02X" % ((i * 37) % 256, (i * 91) % 256, (i * 13) % 256)
+                r = await hub.command(DEVICE, "leds:update", {"leds": {"on": True, "color": color}},
+                                      ack_type="leds", applied=_color_is(color), db={"leds": {"on": True, "color": color}})
+                kind = "leds"
+            else:
+                vol = 10 + (i * 7) % 80
+                r = await hub.command(DEVICE, "music:volume", {"value": vol},
+                                      ack_type="music:volume", applied=_vol_is(vol), db={"music": {"volume": vol}})
+                kind = "music"
+            acks[kind].append(r["ackMs"])
+            apps[kind].append(r["appliedMs"])
+            await asyncio.sleep(args.gap)
+        u1 = ag.sample()
+        return {
+            "ackMs": {k: dist(v) for k, v in acks.items()},
+            "appliedMs": {k: dist(v) for k, v in apps.items()},
+            "usage": usage(u0, u1),
+        }
+    finally:
+        await ag.stop(args.keep)
+
+async def scenario_burst(args, hub: StandInHub) -> Dict[str, Any]:
+    """Glissement de slider: rafale de music:volume rapprochés, puis convergence sur la dernière valeur."""
+    ag = await _boot(args, hub)
+    try:
+        u0 = ag.sample()
+        vals = [20 + (i * 3) % 60 for i in range(args.burst)]
+        final = vals[-1] if vals[-1] != vals[-2] else vals[-1] + 1
+        vals[-1] = final
+        acks = [hub.waiter(lambda k, d, p: k in ("ack", "nack") and d == DEVICE and p.get("type") == "music:volume",
+                           30, consume=True) for _ in vals]
+        conv = hub.waiter(lambda k, d, p: k == "report" and d == DEVICE and _vol_is(final)(p), 30)
+        t_sent: List[float] = []
+        for v in vals:
+            hub.devices[DEVICE].music["volume"] = v
+            t_sent.append(time.perf_counter())
+            await hub.sio.emit("music:volume", {"value": v, "deviceId": DEVICE}, room=DEVICE, namespace="/agent")
+            await asyncio.sleep(args.burst_interval)
+        t_last = t_sent[-1]
+        t_acks = [await a for a in acks]
+        t_conv = await conv
+        await asyncio.sleep(1.0)
+        u1 = ag.sample()
+        sink = fakes.read_state(ag.dir).get("volume")
+        return {
+            "events": len(vals),
+            "intervalMs": args.burst_interval * 1000,
+            "ackMs": dist([None if t is None else (t - s) * 1000 for t, s in zip(t_acks, t_sent)]),
+            "convergeMs": None if t_conv is None else round((t_conv - t_last) * 1000, 3),
+            "finalSinkOk": sink == final,
+            "usage": usage(u0, u1),
+        }
+    finally:
+        await ag.stop(args.keep)
+
+async def scenario_reconnect(args, hub: StandInHub) -> Dict[str, Any]:
+    """Redémarrages du hub: délai de reconnexion (register) et de premier state:report après remontée."""
+    ag = await _boot(args, hub)
+    try:
+        u0 = ag.sample()
+        to_reg: List[Optional[float]] = []
+        to_report: List[Optional[float]] = []
+        for _ in range(args.cycles):
+            t_up = await hub.restart(args.down)
+            reg = hub.waiter(lambda k, d, p: k == "register" and d == DEVICE, 60)
+            rep = hub.waiter(lambda k, d, p: k == "report" and d == DEVICE, 60)
+            tr, tp = await reg, await rep
+            to_reg.append(None if tr is None else (tr - t_up) * 1000)
+            to_report.append(None if tp is None else (tp - t_up) * 1000)
+            await asyncio.sleep(args.settle)
+        u1 = ag.sample()
+        return {
+            "cycles": args.cycles, "downSec": args.down,
+            "reconnectMs": dist(to_reg), "firstReportMs": dist(to_report),
+            "usage": usage(u0, u1),
+        }
+    finally:
+        await ag.stop(args.keep)
+
+async def scenario_idle(args, hub: StandInHub) -> Dict[str, Any]:
+    """Agent au repos (cadences de la config.yaml livrée): échantillon de `idle` secondes extrapolé à une heure."""
+    ag = await _boot(args, hub)
+    try:
+        u0 = ag.sample()
+        await asyncio.sleep(args.idle)
+        u1 = ag.sample()
+        u = usage(u0, u1)
+        return {
+            "cadence": shipped_cadence(),
+            "usage": u,
+            "perHour": {
+                "cpuSec": round(u["cpuSec"] / u["wallSec"] * 3600, 1),
+                "wakeups": int(u["wakeupsPerSec"] * 3600),
+                "httpRequests": int(u["httpPerMin"] * 60),
+            },
+        }
+    finally:
+        await ag.stop(args.keep)
+
+def _free_port(kind: int = socket.SOCK_STREAM) -> int:
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _scrape(port: int, timeout: float = 10.0) -> Dict[str, float]:
+    """/metrics de l'agent → {nom{labels}: valeur} (réessaie tant que le serveur n'écoute pas)."""
+    import aiohttp
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as http:
+        while True:
+            try:
+                async with http.get(f"http://127.0.0.1:{port}/metrics") as r:
+                    text = await r.text()
+                break
+            except aiohttp.ClientError:
+                if time.perf_counter() > deadline:
+                    return {}
+                await asyncio.sleep(0.05)
+    out: Dict[str, float] = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            k, _, v = line.rpartition(" ")
+            try:
+                out[k] = float(v)
+            except ValueError:
+                pass
+    return out
+
+def _boot_mark(m: Dict[str, float], name: str) -> Optional[float]:
+    v = m.get(f'aura_boot_seconds{{milestone="{name}"}}')
+    return None if v is None else v * 1000
+
+BOOT_STATE = {"leds": {"on": True, "color": "#FF8800", "brightness": 60, "preset": None},
+              "music": {"status": "pause", "volume": 30, "track": None}, "widgets": None}
+
+async def scenario_boot(args, hub: StandInHub) -> Dict[str, Any]:
+    """
+    Démarrage à froid avec un état persisté: premier photon (jalon agent, depuis le lancement
+    du processus), premier ack d'une commande envoyée dès le register, hub joignable ou non.
+    """
+    out: Dict[str, Any] = {}
+    for variant in ("online", "offline"):
+        photon: List[Optional[float]] = []
+        connected: List[Optional[float]] = []
+        first_ack: List[Optional[float]] = []
+        spawn_to_ack: List[Optional[float]] = []
+        writes: List[Optional[float]] = []
+        for i in range(args.boots):
+            port = _free_port()
+            cfg: Dict[str, Any] = {"metrics_port": port, "state_persist_sec": 0.5}
+            if variant == "offline":
+                cfg["api_url"] = "http://127.0.0.1:9"
+            ag = AgentProc(hub, DEVICE, KEY, latency_ms=args.driver_latency_ms, cfg=cfg)
+            with open(os.path.join(ag.dir, "state.json"), "w") as f:
+                json.dump(BOOT_STATE, f)
+            try:
+                reg = hub.waiter(lambda k, d, p: k == "register" and d == DEVICE, 30) if variant == "online" else None
+                t0 = time.perf_counter()
+                await ag.start()
+                if reg is not None:
+                    if await reg is None:
+                        raise RuntimeError(f"agent non connecté (voir {ag.dir}/agent.log)")
+                    color = "#%02X00FF" % (i * 40 % 256)
+                    t_send = time.perf_counter()
+                    r = await hub.command(DEVICE, "leds:update", {"leds": {"on": True, "color": color}},
+                                          ack_type="leds", db={"leds": {"on": True, "color": color}})
+                    spawn_to_ack.append(None if r["ackMs"] is None else (t_send - t0) * 1000 + r["ackMs"])
+                    # rafale: l'écriture disque doit être regroupée
+                    for j in range(10):
+                        await hub.sio.emit("leds:update", {"leds": {"brightness": 10 + j}, "deviceId": DEVICE},
+                                           room=DEVICE, namespace="/agent")
+                    await asyncio.sleep(1.5)
+                m = await _scrape(port)
+                while variant == "offline" and _boot_mark(m, "first_photon") is None and time.perf_counter() - t0 < 10:
+                    await asyncio.sleep(0.1)
+                    m = await _scrape(port)
+                photon.append(_boot_mark(m, "first_photon"))
+                connected.append(_boot_mark(m, "connected"))
+                first_ack.append(_boot_mark(m, "first_ack"))
+                writes.append(m.get("aura_persist_writes_total"))
+            finally:
+                await ag.stop(args.keep)
+        out[variant] = {
+            "boots": args.boots,
+            "firstPhotonMs": dist(photon),
+            "connectedMs": dist(connected),
+            "firstAckMs": dist(first_ack),
+        }
+        if variant == "online":
+            out[variant]["spawnToAckMs"] = dist(spawn_to_ack)
+            out[variant]["persistWrites"] = dist(writes)
+    return out
+
+async def scenario_multi(args, hub: StandInHub) -> Dict[str, Any]:
+    """
+    N devices (ruban + sink propres): un processus par device, un processus avec une socket
+    par device, un processus multiplexé. Mémoire (VmRSS), CPU et réveils au repos, ack par device.
+    """
+    n = args.devices
+    ids = [f"bench-multi-{i:04d}" for i in range(n)]
+    for did in ids:
+        if did not in hub.devices:
+            hub.add_device(did, f"{KEY}-{did}")
+    specs = [{"name": f"d{i}", "device_id": did, "api_key": f"{KEY}-{did}", "led_channel": i % 2,
+              "sink": f"d{i}", "player": f"d{i}"} for i, did in enumerate(ids)]
+    out: Dict[str, Any] = {"devices": n}
+    for variant in ("procs", "sockets", "multiplex"):
+        if variant == "procs":
+            agents = [AgentProc(hub, did, f"{KEY}-{did}", latency_ms=args.driver_latency_ms) for did in ids]
+        else:
+            agents = [AgentProc(hub, ids[0], f"{KEY}-{ids[0]}", latency_ms=args.driver_latency_ms,
+                                cfg={"devices": specs, "multiplex_socket": variant == "multiplex"})]
+        regs = [hub.waiter(lambda k, d, p, did=did: k == "register" and d == did, 30) for did in ids]
+        try:
+            for ag in agents:
+                await ag.start()
+            if None in [await r for r in regs]:
+                raise RuntimeError(f"{variant}: devices non connectés (voir {agents[0].dir}/agent.log)")
+            await asyncio.sleep(args.settle)
+            s0 = [ag.sample() for ag in agents]
+            await asyncio.sleep(args.multi_idle)
+            s1 = [ag.sample() for ag in agents]
+            rss = sum(ag.rss_kb() for ag in agents)
+            us = [usage(a, b) for a, b in zip(s0, s1)]
+            acks: List[Optional[float]] = []
+            sinks_ok = True
+            for i, did in enumerate(ids):
+                color = "#%02X40C0" % (i * 50 % 256)
+                r = await hub.command(did, "leds:update", {"leds": {"on": True, "color": color}},
+                                      ack_type="leds", db={"leds": {"on": True, "color": color}})
+                acks.append(r["ackMs"])
+                vol = 20 + i
+                r = await hub.command(did, "music:volume", {"value": vol}, ack_type="music:volume",
+                                      applied=_vol_is(vol), db={"music": {"volume": vol}})
+                acks.append(r["ackMs"])
+                # chaque device pilote son propre sink
+                ag = agents[i] if variant == "procs" else agents[0]
+                sinks_ok &= fakes.read_state(ag.dir, None if variant == "procs" else f"d{i}").get("volume") == vol
+            out[variant] = {
+                "processes": len(agents),
+                "sockets": 1 if variant == "multiplex" else n,
+                "rssKb": rss, "rssKbPerDevice": round(rss / n),
+                "cpuPct": round(sum(u["cpuPct"] for u in us), 2),
+                "cpuPctPerDevice": round(sum(u["cpuPct"] for u in us) / n, 2),
+                "wakeupsPerSec": round(sum(u["wakeupsPerSec"] for u in us), 2),
+                "httpPerMin": us[0]["httpPerMin"],   # compteur global du hub
+                "ackMs": dist(acks),
+                "sinksOk": sinks_ok,
+            }
+        finally:
+            for ag in agents:
+                await ag.stop(args.keep)
+    return out
+
+class LanClient(asyncio.DatagramProtocol):
+    """Client UDP du contrôle LAN (comme l'app sur le même Wi-Fi): requêtes signées, réponses par id."""
+
+    def __init__(self, device_id: str, key: str):
+        self.device_id = device_id
+        self.key = key
+        self.transport = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._seq = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            msg = lan.verify(self.key, data)
+        except Exception:
+            return
+        fut = self._pending.pop(str(msg.get("id")), None)
+        if fut is not None and not fut.done():
+            fut.set_result((time.perf_counter(), msg))
+
+    def frame(self, event: str, payload: Dict[str, Any]) -> Tuple[str, bytes]:
+        self._seq += 1
+        rid = f"bench-{os.getpid()}-{self._seq}"
+        msg = {"deviceId": self.device_id, "event": event, "payload": payload, "ts": int(time.time() * 1000), "id": rid}
+        return rid, lan.pack(self.key, msg)
+
+    async def send(self, rid: str, data: bytes, timeout: float = 2.0):
+        """(t_réponse, réponse) ou None."""
+        fut = self._pending[rid] = asyncio.get_running_loop().create_future()
+        self.transport.sendto(data)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(rid, None)
+            return None
+
+async def scenario_lan(args, hub: StandInHub) -> Dict[str, Any]:
+    """
+    Contrôle LAN direct (UDP signé) vs commande routée par le hub, mêmes commandes alternées.
+    lan: réponse au client, state:report au hub, écriture DB ; hub: ack et state:report.
+    """
+    port = _free_port(socket.SOCK_DGRAM)
+    ag = await _boot(args, hub, {"lan_port": port, "lan_host": "127.0.0.1"})
+    loop = asyncio.get_running_loop()
+    transport, cli = await loop.create_datagram_endpoint(lambda: LanClient(DEVICE, KEY), remote_addr=("127.0.0.1", port))
+    try:
+        u0 = ag.sample()
+        keys = ("replyMs", "appliedMs", "dbMs")
+        lan_ms: Dict[str, Dict[str, List]] = {k: {"leds": [], "music": []} for k in keys}
+        hub_ms: Dict[str, Dict[str, List]] = {k: {"leds": [], "music": []} for k in ("ackMs", "appliedMs")}
+        acks0, echo0 = hub.events["ack"], hub.events["ack:echo"]
+        lan_acks = 0
+        for i in range(args.count):
+            kind = "leds" if i % 2 == 0 else "music"
+            # 1) LAN
+            if kind == "leds":
+                color = "#%02X%02X%02X" % ((i * 53) % 256, (i * 29) % 256, 200)
+                event, payload, applied = "leds:update", {"leds": {"on": True, "color": color}}, _color_is(color)
+                db = lambda k, d, p, c=color: k == "db" and d == DEVICE and p.get("route") == "leds/style" and p.get("color") == c
+            else:
+                vol = 15 + (i * 11) % 70
+                event, payload, applied = "music:volume", {"value": vol}, _vol_is(vol)
+                db = lambda k, d, p, v=vol: k == "db" and d == DEVICE and p.get("route") == "music/volume" and p.get("value") == v
+            app_w = hub.waiter(lambda k, d, p: k == "report" and d == DEVICE and applied(p), 5)
+            db_w = hub.waiter(db, 5)
+            a0 = hub.events["ack"]
+            rid, data = cli.frame(event, payload)
+            t0 = time.perf_counter()
+            r = await cli.send(rid, data)
+            t_app, t_db = await app_w, await db_w
+            ok = r is not None and r[1].get("ok")
+            lan_ms["replyMs"][kind].append((r[0] - t0) * 1000 if ok else None)
+            lan_ms["appliedMs"][kind].append(None if t_app is None else (t_app - t0) * 1000)
+            lan_ms["dbMs"][kind].append(None if t_db is None else (t_db - t0) * 1000)
+            await asyncio.sleep(args.gap)
+            lan_acks += hub.events["ack"] - a0     # échos de l'api: acquittés (echo), jamais réappliqués
+            # 2) même type de commande via le hub
+            if kind == "leds":
+                color = "#%02X%02X%02X" % (200, (i * 53) % 256, (i * 29) % 256)
+                h = await hub.command(DEVICE, "leds:update", {"leds": {"on": True, "color": color}},
+                                      ack_type="leds", applied=_color_is(color), db={"leds": {"on": True, "color": color}})
+            else:
+                vol = 16 + (i * 11) % 70
+                h = await hub.command(DEVICE, "music:volume", {"value": vol},
+                                      ack_type="music:volume", applied=_vol_is(vol), db={"music": {"volume": vol}})
+            hub_ms["ackMs"][kind].append(h["ackMs"])
+            hub_ms["appliedMs"][kind].append(h["appliedMs"])
+            await asyncio.sleep(args.gap)
+        u1 = ag.sample()
+        echo_acks = hub.events["ack:echo"] - echo0
+        hub_acks = hub.events["ack"] - acks0 - lan_acks
+        # sécurité: rejeu du même datagramme, signature invalide
+        rid, data = cli.frame("leds:state", {"on": False})
+        first = await cli.send(rid, data)
+        replay = await cli.send(rid, data)
+        rid2, data2 = cli.frame("leds:state", {"on": False})
+        forged = await cli.send(rid2, data2[:-4] + b"0000", timeout=0.5)
+        return {
+            "lan": {k: {kk: dist(vv) for kk, vv in v.items()} for k, v in lan_ms.items()},
+            "hub": {k: {kk: dist(vv) for kk, vv in v.items()} for k, v in hub_ms.items()},
+            "echoAcks": echo_acks,
+            "echoReapplied": lan_acks - echo_acks,     # acks « normaux » reçus après une commande LAN: 0 attendu
+            "hubAcksOk": hub_acks == args.count,       # une commande routée par le hub ⇒ un ack
+            "replayRejected": bool(first and first[1].get("ok")) and replay is not None and not replay[1].get("ok"),
+            "forgedIgnored": forged is None,
+            "usage": usage(u0, u1),
+        }
+    finally:
+        transport.close()
+        await ag.stop(args.keep)
+
+async def scenario_wire(args, hub: StandInHub) -> Dict[str, Any]:
+    """
+    Compatibilité de l'encodage négocié: agent JSON / agent msgpack face à un hub JSON seul
+    (comme l'aura-api actuelle) ou msgpack. Codec retenu, acks et reports, octets reçus par message.
+    """
+    out: Dict[str, Any] = {}
+    variants = (("agentJson-hubMsgpack", wire.JSON, True), ("agentMsgpack-hubJson", wire.MSGPACK, False),
+                ("agentMsgpack-hubMsgpack", wire.MSGPACK, True))
+    for name, agent_codec, hub_wire in variants:
+        hub.wire = hub_wire
+        hub.rx_bytes.clear()
+        hub.rx_count.clear()
+        ag = await _boot(args, hub, {"wire_encoding": agent_codec})
+        try:
+            acks: List[Optional[float]] = []
+            apps: List[Optional[float]] = []
+            for i in range(args.count):
+                if i % 2 == 0:
+                    color = "#%02X%02X%02X" % (90, (i * 37) % 256, (i * 17) % 256)
+                    r = await hub.command(DEVICE, "leds:update", {"leds": {"on": True, "color": color}},
+                                          ack_type="leds", applied=_color_is(color), db={"leds": {"on": True, "color": color}})
+                else:
+                    vol = 12 + (i * 9) % 80
+                    r = await hub.command(DEVICE, "music:volume", {"value": vol},
+                                          ack_type="music:volume", applied=_vol_is(vol), db={"music": {"volume": vol}})
+                acks.append(r["ackMs"])
+                apps.append(r["appliedMs"])
+                await asyncio.sleep(args.gap)
+            out[name] = {
+                "negotiated": wire.MSGPACK if hub.devices[DEVICE].wire else wire.JSON,
+                "ackMs": dist(acks), "appliedMs": dist(apps),
+                "bytesPerMsg": {ev: round(hub.rx_bytes[ev] / hub.rx_count[ev], 1)
+                                for ev in ("state:report", "ack") if hub.rx_count[ev]},
+            }
+        finally:
+            await ag.stop(args.keep)
+            hub.wire = False
+    return out
+
+def _sum_metric(m: Dict[str, float], prefix: str) -> float:
+    return sum(v for k, v in m.items() if k.startswith(prefix))
+
+async def scenario_scenes(args, hub: StandInHub) -> Dict[str, Any]:
+    """
+    Scènes programmées jouées par l'agent: planning one-shot envoyé par scenes:set, écart entre
+    l'heure prévue et le state:report (vu du hub) et l'écriture DB ; fondu rendu localement ;
+    au boot, rattrapage (catchup) / saut (skip) des occurrences manquées pendant l'arrêt.
+    """
+    port = _free_port()
+    ag = await _boot(args, hub, {"metrics_port": port})
+    try:
+        wall0, perf0 = time.time(), time.perf_counter()
+        items, waits = [], []
+        for i in range(args.count):
+            at = wall0 + 2.0 + i * 0.7
+            iso = datetime.datetime.fromtimestamp(at).isoformat(timespec="milliseconds")   # heure locale
+            if i % 2 == 0:
+                color = "#%02X%02X60" % ((i * 41) % 256, (i * 23) % 256)
+                sc, applied = {"leds": {"on": True, "color": color}}, _color_is(color)
+                db = lambda k, d, p, c=color: k == "db" and d == DEVICE and p.get("route") == "leds/style" and p.get("color") == c
+            else:
+                vol = 20 + (i * 7) % 60
+                sc, applied = {"music": {"volume": vol}}, _vol_is(vol)
+                db = lambda k, d, p, v=vol: k == "db" and d == DEVICE and p.get("route") == "music/volume" and p.get("value") == v
+            items.append({"id": f"s{i}", "at": iso, **sc})
+            waits.append((perf0 + (at - wall0),
+                          hub.waiter(lambda k, d, p, a=applied: k == "report" and d == DEVICE and a(p), 30),
+                          hub.waiter(db, 30)))
+        fade_at = wall0 + 2.0 + args.count * 0.7
+        items.append({"id": "fade", "at": datetime.datetime.fromtimestamp(fade_at).isoformat(timespec="milliseconds"),
+                      "leds": {"on": True, "color": "#FF6A00", "brightness": 90}, "fadeSec": 2})
+        r = await hub.command(DEVICE, "scenes:set", {"scenes": items}, ack_type="scenes")
+        report_ms, db_ms = [], []
+        for planned, rep_w, db_w in waits:
+            t_rep, t_db = await rep_w, await db_w
+            report_ms.append(None if t_rep is None else (t_rep - planned) * 1000)
+            db_ms.append(None if t_db is None else (t_db - planned) * 1000)
+        await asyncio.sleep(max(0.0, fade_at + 3 - time.time()))
+        m = await _scrape(port)
+        n = _sum_metric(m, "aura_scene_drift_seconds_count")
+        played = {
+            "setAckMs": r["ackMs"],
+            "reportLateMs": dist(report_ms), "dbLateMs": dist(db_ms),
+            "agentDriftMs": round(_sum_metric(m, "aura_scene_drift_seconds_sum") / n * 1000, 3) if n else None,
+            "fadeFrames": m.get("aura_fade_frames_total"),
+        }
+    finally:
+        await ag.stop(args.keep)
+    # boot après un arrêt: deux occurrences quotidiennes passées pendant que l'agent était éteint
+    port = _free_port()
+    ag = AgentProc(hub, DEVICE, KEY, latency_ms=args.driver_latency_ms, cfg={"metrics_port": port})
+    past = time.strftime("%H:%M:%S", time.localtime(time.time() - 20))
+    with open(os.path.join(ag.dir, "scenes.json"), "w") as f:
+        json.dump({"setAt": time.time() - 3600, "lastRun": {}, "scenes": [
+            {"id": "catch", "at": past, "leds": {"on": True, "color": "#2040FF"}, "missed": "catchup"},
+            {"id": "skip", "at": past, "music": {"volume": 33}, "missed": "skip"},
+        ]}, f)
+    try:
+        rep_w = hub.waiter(lambda k, d, p: k == "report" and d == DEVICE and _color_is("#2040FF")(p), 30)
+        await ag.start()
+        await rep_w
+        await asyncio.sleep(args.settle)
+        m = await _scrape(port)
+        with open(os.path.join(ag.dir, "scenes.json")) as f:
+            runs = json.load(f).get("lastRun", {})
+        boot_out = {
+            "caughtUp": m.get('aura_scene_runs_total{how="catchup"}'),
+            "skipped": _sum_metric(m, "aura_scene_missed_total"),
+            "lastRunSaved": sorted(runs),
+        }
+    finally:
+        await ag.stop(args.keep)
+    return {"played": played, "boot": boot_out}
+
+async def scenario_storm(args, hub: StandInHub) -> Dict[str, Any]:
+    """
+    Tempête de reconnexion avec de vrais agents (main.py, un processus par device):
+    N processus, api figée `storm_down` s (TCP accepté, jamais de réponse) puis relancée.
+    Étalement des reconnexions (register vu du hub) et vie du scheduler pendant la coupure:
+    un fondu de scène la couvre, ses images sautées (aura_sched_skipped_total) doivent rester à 0.
+    """
+    from bench.fleet import _peak
+    ids = [f"bench-storm-{i:04d}" for i in range(args.storm_agents)]
+    for did in ids:
+        if did not in hub.devices:
+            hub.add_device(did, f"{KEY}-{did}")
+    ports = [_free_port() for _ in ids]
+    agents = [AgentProc(hub, did, f"{KEY}-{did}", latency_ms=args.driver_latency_ms, cfg={"metrics_port": port})
+              for did, port in zip(ids, ports)]
+    regs = [hub.waiter(lambda k, d, p, did=did: k == "register" and d == did, 30) for did in ids]
+    try:
+        for ag in agents:
+            await ag.start()
+        if None in [await r for r in regs]:
+            raise RuntimeError(f"storm: agents non connectés (voir {agents[0].dir}/agent.log)")
+        await asyncio.sleep(args.settle)
+        # fondu qui démarre avec la coupure et se termine après la relance (planning envoyé en
+        # parallèle, marge pour une machine chargée: une scène reçue après `at` ne serait pas jouée)
+        fade_sec = args.storm_down + 2.0
+        at = time.time() + 3.0
+        scene = {"id": "storm", "at": datetime.datetime.fromtimestamp(at).isoformat(timespec="milliseconds"),
+                 "leds": {"on": True, "color": "#FF6A00", "brightness": 90}, "fadeSec": fade_sec}
+        sets = await asyncio.gather(*(hub.command(did, "scenes:set", {"scenes": [scene]}, ack_type="scenes") for did in ids))
+        await asyncio.sleep(max(0.0, at - time.time()))
+        regs = [hub.waiter(lambda k, d, p, did=did: k == "register" and d == did, args.storm_down + 60) for did in ids]
+        t_up = await hub.restart(args.storm_down, stall=True)
+        back = [await r for r in regs]
+        await asyncio.sleep(max(0.0, at + fade_sec + 0.5 - time.time()))
+        ms = [await _scrape(port) for port in ports]
+        rel = [t - t_up for t in back if t is not None]
+        return {
+            "agents": len(ids), "downSec": args.storm_down, "stall": True,
+            "scenesAcked": sum(r["ackMs"] is not None for r in sets),
+            "reconnected": len(rel),
+            "reconnectMs": dist([None if t is None else (t - t_up) * 1000 for t in back]),
+            "spreadMs": round((max(rel) - min(rel)) * 1000, 3) if rel else None,
+            "registerPeakPerSec": {"100ms": _peak(rel, 0.1), "1s": _peak(rel, 1.0)},
+            "fade": {
+                "frames": dist([m.get("aura_fade_frames_total") for m in ms]),
+                "skippedTicks": dist([_sum_metric(m, 'aura_sched_skipped_total{task="fade"}') for m in ms]),
+            },
+        }
+    finally:
+        for ag in agents:
+            await ag.stop(args.keep)
+
+def _weather_in(p: Dict[str, Any]) -> bool:
+    return any(w.get("key") == "weather" and w.get("data") for w in p.get("widgets") or [])
+
+async def scenario_widgets(args, hub: StandInHub) -> Dict[str, Any]:
+    """
+    Cache des données widgets: N devices affichant la météo de la même ville (une requête par
+    rafraîchissement, pas une par device ni par report), /weather lent sans effet sur les acks,
+    puis redémarrage avec /weather en panne: données servies depuis le cache persisté.
+    """
+    n = 3
+    ids = [f"bench-widget-{i:04d}" for i in range(n)]
+    items = [{"key": "weather", "enabled": True, "orderIndex": 0, "config": {"city": "Paris"}},
+             {"key": "clock", "enabled": True, "orderIndex": 1, "config": {}}]
+    for did in ids:
+        dev = hub.devices.get(did) or hub.add_device(did, f"{KEY}-{did}")
+        dev.widgets = [dict(it) for it in items]
+        dev.leds.update({"on": True, "preset": "weather"})
+    specs = [{"name": f"w{i}", "device_id": did, "api_key": f"{KEY}-{did}", "sink": f"w{i}", "player": f"w{i}"}
+             for i, did in enumerate(ids)]
+    port = _free_port()
+    cfg = {"devices": specs, "metrics_port": port, "widget_ttl_sec": {"weather": args.widget_ttl}, "widgets_check_sec": 1}
+    ag = AgentProc(hub, ids[0], f"{KEY}-{ids[0]}", latency_ms=args.driver_latency_ms, cfg=cfg)
+    hub.weather_latency = args.weather_latency
+    out: Dict[str, Any] = {"devices": n, "ttlSec": args.widget_ttl, "weatherLatencyMs": args.weather_latency * 1000}
+    try:
+        firsts = [hub.waiter(lambda k, d, p, did=did: k == "report" and d == did and _weather_in(p), 30) for did in ids]
+        w0 = hub.http["weather"]
+        t0 = time.perf_counter()
+        await ag.start()
+        got = [await f for f in firsts]
+        out["firstDataMs"] = dist([None if t is None else (t - t0) * 1000 for t in got])
+        out["bootWeatherRequests"] = hub.http["weather"] - w0
+        # fenêtre d'observation: commandes pendant que des rafraîchissements lents sont en vol
+        w0, r0 = hub.http["weather"], hub.events["report"]
+        acks: List[Optional[float]] = []
+        t_end = time.perf_counter() + args.widget_window
+        i = 0
+        while time.perf_counter() < t_end:
+            did = ids[i % n]
+            r = await hub.command(did, "leds:update", {"leds": {"brightness": 20 + i % 60}}, ack_type="leds",
+                                  db={"leds": {"brightness": 20 + i % 60}})
+            acks.append(r["ackMs"])
+            i += 1
+            await asyncio.sleep(0.2)
+        m = await _scrape(port)
+        out["window"] = {
+            "sec": args.widget_window, "ackMs": dist(acks),
+            "weatherRequests": hub.http["weather"] - w0, "reports": hub.events["report"] - r0,
+            "cache": {r: m.get(f'aura_widget_cache_total{{result="{r}",source="weather"}}') for r in ("hit", "stale", "miss")},
+            "coalesced": m.get('aura_widget_coalesced_total{source="weather"}'),
+        }
+        await ag.stop(keep=True)
+        # redémarrage, /weather en panne: la météo vient du cache persisté
+        hub.weather_down = True
+        firsts = [hub.waiter(lambda k, d, p, did=did: k == "report" and d == did and _weather_in(p), 30) for did in ids]
+        t0 = time.perf_counter()
+        await ag.start()
+        got = [await f for f in firsts]
+        out["restartApiDown"] = {"firstDataMs": dist([None if t is None else (t - t0) * 1000 for t in got])}
+    finally:
+        hub.weather_latency, hub.weather_down = 0.0, False
+        await ag.stop(args.keep)
+    return out
+
+SCENARIOS = {
+    "single": scenario_single,
+    "burst": scenario_burst,
+    "reconnect": scenario_reconnect,
+    "idle": scenario_idle,
+    "boot": scenario_boot,
+    "multi": scenario_multi,
+    "lan": scenario_lan,
+    "wire": scenario_wire,
+    "scenes": scenario_scenes,
+    "widgets": scenario_widgets,
+    "storm": scenario_storm,
+}
+
+# ---------- comparaison ----------
+# chemin → plus petit = meilleur
+WATCH = (
+    "single.ackMs.leds.p50", "single.ackMs.music.p50", "single.appliedMs.leds.p90", "single.appliedMs.music.p90",
+    "burst.ackMs.p90", "burst.convergeMs", "reconnect.reconnectMs.p50",
+    "idle.usage.cpuPct", "idle.usage.wakeupsPerSec", "idle.usage.httpPerMin",
+    "boot.online.firstPhotonMs.p50", "boot.online.spawnToAckMs.p50", "boot.offline.firstPhotonMs.p50",
+    "lan.lan.replyMs.leds.p50", "lan.lan.appliedMs.music.p90", "scenes.played.reportLateMs.p90",
+    "storm.fade.skippedTicks.max",
+    "multi.sockets.rssKbPerDevice", "multi.sockets.cpuPctPerDevice", "multi.multiplex.ackMs.p50",
+)
+
+def _dig(d: Dict[str, Any], path: str):
+    for k in path.split("."):
+        if not isinstance(d, dict) or k not in d:
+            return None
+        d = d[k]
+    return d
+
+def compare(cur: Dict[str, Any], base: Dict[str, Any], tol: float) -> List[str]:
+    out = []
+    for path in WATCH:
+        a, b = _dig(base.get("scenarios", {}), path), _dig(cur.get("scenarios", {}), path)
+        if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+            continue
+        if b > a * (1 + tol) and (b - a) > 1.0:
+            out.append(f"{path}: {a} → {b} (+{(b / a - 1) * 100 if a else float('inf'):.0f}%)")
+    return out
+
+# ---------- CLI ----------
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=AGENT_DIR, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Bench de bout en bout de l'agent Aura")
+    ap.add_argument("-s", "--scenarios", nargs="*", default=list(SCENARIOS), choices=list(SCENARIOS))
+    ap.add_argument("--driver-latency-ms", type=float, default=5.0, help="latence des faux pactl/playerctl")
+    ap.add_argument("--rest-latency-ms", type=float, default=0.0, help="latence REST du hub")
+    ap.add_argument("--count", type=int, default=20, help="single: nombre de commandes")
+    ap.add_argument("--gap", type=float, default=0.5, help="single: pause entre commandes (s)")
+    ap.add_argument("--burst", type=int, default=40, help="burst: nombre d'événements")
+    ap.add_argument("--burst-interval", type=float, default=0.025, help="burst: espacement (s)")
+    ap.add_argument("--cycles", type=int, default=5, help="reconnect: redémarrages du hub")
+    ap.add_argument("--down", type=float, default=0.5, help="reconnect: durée de coupure (s)")
+    ap.add_argument("--idle", type=float, default=30.0, help="idle: durée d'échantillonnage (s)")
+    ap.add_argument("--boots", type=int, default=5, help="boot: démarrages à froid par variante")
+    ap.add_argument("--devices", type=int, default=4, help="multi: devices simulés")
+    ap.add_argument("--multi-idle", type=float, default=10.0, help="multi: échantillon au repos (s)")
+    ap.add_argument("--widget-ttl", type=float, default=30.0, help="widgets: TTL météo forcé (s, plancher agent 30)")
+    ap.add_argument("--weather-latency", type=float, default=1.0, help="widgets: latence de /weather (s)")
+    ap.add_argument("--widget-window", type=float, default=35.0, help="widgets: fenêtre d'observation (s, > TTL)")
+    ap.add_argument("--storm-agents", type=int, default=8, help="storm: agents réels (processus)")
+    ap.add_argument("--storm-down", type=float, default=6.0, help="storm: durée de l'api figée (s)")
+    ap.add_argument("--settle", type=float, default=1.5, help="attente après connexion (s)")
+    ap.add_argument("--out", help="écrit le rapport JSON dans ce fichier")
+    ap.add_argument("--baseline", help="rapport JSON de référence")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="régression tolérée (fraction)")
+    ap.add_argument("--keep", action="store_true", help="garde les dossiers temporaires (logs agent)")
+    return ap.parse_args(argv)
+
+async def amain(args) -> Dict[str, Any]:
+    hub = StandInHub(rest_latency_ms=args.rest_latency_ms)
+    hub.add_device(DEVICE, KEY)
+    await hub.start()
+    report: Dict[str, Any] = {
+        "rev": _git_rev(), "ts": int(time.time()), "python": platform.python_version(),
+        "machine": platform.machine(), "params": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenarios:
+            hub.http.clear()
+            print(f"▶ {name}…", file=sys.stderr)
+            report["scenarios"][name] = await SCENARIOS[name](args, hub)
+    finally:
+        await hub.stop()
+    return report
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(amain(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regs = compare(report, json.load(f), args.tolerance)
+        for r in regs:
+            print(f"❌ régression {r}", file=sys.stderr)
+        return 1 if regs else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# bench/wire.py
+"""
+Microbench de l'encodage des événements socket: JSON (actuel) vs msgpack à champs courts.
+Taille du payload, taille sur le fil (paquet socket.io + en-têtes engine.io / WebSocket),
+coût encode/decode par message, sur des payloads représentatifs de l'agent.
+"parser" = même payload court avec le parser msgpack de socket.io pour toute la connexion
+(plus compact, mais à configurer des deux côtés avant connexion: non négociable à register).
+
+    python -m bench.wire                  # JSON sur stdout
+    python -m bench.wire -n 50000 --out wire.json
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from socketio import msgpack_packet, packet
+
+from utils import wire
+
+NS = "/agent"
+DEVICE = "89e81262-2101-4f6a-9969-40b81a18d929"
+
+WIDGETS = [
+    {"kind": "weather", "enabled": True, "config": {"city": "Paris", "units": "metric"},
+     "data": {"temp": 12.5, "desc": "cloudy", "icon": "cloud", "updatedAt": "2025-01-01T10:00:00Z"}},
+    {"kind": "clock", "enabled": True, "config": {"format": "24h"}},
+]
+
+# (sens, événement, payload) ; agent→hub = trames masquées côté client
+PAYLOADS: List[Tuple[str, str, Dict[str, Any]]] = [
+    ("up", "state:report", {"deviceId": DEVICE,
+                            "leds": {"on": True, "color": "#FF8800", "brightness": 60, "preset": None},
+                            "music": {"status": "play", "volume": 42, "track": None}}),
+    ("up", "state:report+widgets", {"deviceId": DEVICE,
+                                    "leds": {"on": True, "color": "#FF8800", "brightness": 60, "preset": None},
+                                    "music": {"status": "play", "volume": 42, "track": None}, "widgets": WIDGETS}),
+    ("up", "ack", {"deviceId": DEVICE, "type": "leds:style", "status": "ok", "data": {"applied": True}}),
+    ("up", "nack", {"deviceId": DEVICE, "type": "music:volume", "reason": "Missing/invalid volume/value (expected 0..100)"}),
+    ("up", "agent:register", {"deviceId": DEVICE, "stateVersion": {"leds": "3f2a9c1b7d40", "music": "a81c0e22f3b9"},
+                              "wire": ["msgpack", "json"]}),
+    ("down", "leds:update", {"deviceId": DEVICE, "leds": {"on": True, "color": "#00AAFF", "brightness": 80}}),
+    ("down", "leds:style", {"deviceId": DEVICE, "color": "#00AAFF"}),
+    ("down", "music:volume", {"deviceId": DEVICE, "music": {"volume": 35}}),
+]
+
+def _ws_frame(n: int, masked: bool) -> int:
+    """Octets d'une trame WebSocket portant n octets de données."""
+    hdr = 2 if n < 126 else (4 if n < 65536 else 10)
+    return hdr + (4 if masked else 0) + n
+
+def wire_bytes(event: str, payload: Any, masked: bool) -> int:
+    """Paquet socket.io encodé → trames engine.io ("4" + texte, binaire brut) → trames WebSocket."""
+    enc = packet.Packet(packet.EVENT, namespace=NS, data=[event, payload]).encode()
+    frames = enc if isinstance(enc, list) else [enc]
+    total = 0
+    for f in frames:
+        n = len(f.encode("utf-8")) + 1 if isinstance(f, str) else len(f)
+        total += _ws_frame(n, masked)
+    return total
+
+def parser_bytes(event: str, payload: Any, masked: bool) -> int:
+    """Paquet entier en msgpack (serializer="msgpack"): une seule trame binaire."""
+    short = wire._short(payload, True) if isinstance(payload, dict) else payload
+    return _ws_frame(len(msgpack_packet.MsgPackPacket(packet.EVENT, namespace=NS, data=[event, short]).encode()), masked)
+
+def _per_op(fn: Callable[[], Any], n: int) -> float:
+    """µs par appel (meilleur de 3 séries)."""
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best / n * 1e6, 3)
+
+def run(n: int) -> Dict[str, Any]:
+    if wire.MSGPACK not in wire.available():
+        raise SystemExit("msgpack absent: pip install msgpack")
+    out: Dict[str, Any] = {}
+    totals = {"json": 0, "msgpack": 0, "parser": 0}
+    for direction, name, p in PAYLOADS:
+        event = name.split("+", 1)[0]
+        j = json.dumps(p, separators=(",", ":"))
+        m = wire.encode(p)
+        assert wire.decode(m) == p, name            # aller-retour exact
+        masked = direction == "up"
+        wj, wm, wp = wire_bytes(event, p, masked), wire_bytes(event, m, masked), parser_bytes(event, p, masked)
+        totals["json"] += wj
+        totals["msgpack"] += wm
+        totals["parser"] += wp
+        out[name] = {
+            "direction": direction,
+            "payloadBytes": {"json": len(j), "msgpack": len(m)},
+            "wireBytes": {"json": wj, "msgpack": wm, "parser": wp, "saved": f"{(1 - wm / wj) * 100:.0f}%"},
+            "encodeUs": {"json": _per_op(lambda: json.dumps(p, separators=(",", ":")), n),
+                         "msgpack": _per_op(lambda: wire.encode(p), n)},
+            "decodeUs": {"json": _per_op(lambda: json.loads(j), n), "msgpack": _per_op(lambda: wire.decode(m), n)},
+        }
+    out["_total"] = {"wireBytes": totals, "saved": f"{(1 - totals['msgpack'] / totals['json']) * 100:.0f}%",
+                     "savedParser": f"{(1 - totals['parser'] / totals['json']) * 100:.0f}%"}
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Microbench encodage socket (JSON vs msgpack)")
+    ap.add_argument("-n", type=int, default=20000, help="itérations par mesure")
+    ap.add_argument("--out", help="écrit le rapport JSON dans ce fichier")
+    args = ap.parse_args(argv)
+    text = json.dumps({"n": args.n, "payloads": run(args.n)}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
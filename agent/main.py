@@ -1,9 +1,25 @@
+import hashlib
+import json
+import os
 import signal
 import sys
+import threading
 import time
-import requests
-import socketio
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from functools import wraps
+
+from utils import boot, lan, log as _logmod, metrics, persist, profiler, sched, trace, wire
+from utils.backoff import Backoff
+
+# Imports lourds en tâche de fond: le ruban se rallume (état persisté) pendant que
+# socketio/requests se chargent ; load_config() n'attend que yaml, les LEDs que rpi_ws281x.
+boot.preload("yaml", "rpi_ws281x", "socketio", "requests")
+
+if TYPE_CHECKING:
+    import requests   # annotations seulement: chargé en tâche de fond (boot.preload)
+
+log = _logmod.get("main")
 
 # ---------- Config ----------
 def _parse_simple_kv_yaml(path: str) -> Dict[str, Any]:
@@ -35,7 +51,7 @@ def _parse_simple_kv_yaml(path: str) -> Dict[str, Any]:
 
 def load_config() -> Dict[str, Any]:
     try:
-        import yaml
+        yaml = boot.get("yaml")
         with open("config.yaml", "r", encoding="utf-8") as f:
             return yaml.safe_load(f) or {}
     except Exception:
@@ -47,99 +63,347 @@ API_URL   = str(cfg["api_url"]).rstrip("/")
 API_BASE  = f"{API_URL}/api/v1"
 WS_PATH   = str(cfg.get("ws_path", "/socket.io"))
 NS        = str(cfg.get("namespace", "/agent"))
-DEVICE_ID = str(cfg["device_id"])
-API_KEY   = str(cfg["api_key"])
+# Une seule socket pour tous les devices: agent:register rejoint la room de chaque device
+# secondaire. L'api ne vérifie pas de clé pour ces rooms ⇒ opt-in.
+MULTIPLEX_SOCKET = bool(cfg.get("multiplex_socket", False))
+# Encodage des événements socket: "json" (défaut) ou "msgpack" (proposé à agent:register,
+# utilisé seulement si le hub l'accepte dans welcome ; l'aura-api actuelle reste en JSON)
+WIRE_ENCODING = str(cfg.get("wire_encoding", wire.JSON)).lower()
 
 HEARTBEAT = int(cfg.get("heartbeat_sec", 10))
 FALLBACK_LOCAL_ON_BOOT = bool(cfg.get("fallback_local_on_boot", False))
+RECONNECT_MIN_SEC = float(cfg.get("reconnect_min_sec", 1.0))     # backoff exponentiel + jitter
+RECONNECT_MAX_SEC = float(cfg.get("reconnect_max_sec", 30.0))
+BLACKOUT_GRACE_SEC = float(cfg.get("blackout_grace_sec", 30.0))  # coupure plus longue ⇒ ruban éteint (0 = immédiat)
 MUSIC_POLL_SEC = float(cfg.get("music_poll_sec", 1.0))   # plus nerveux
+# Sink: événements `pactl subscribe` ; polling à cette période seulement tant que subscribe est tombé
 SINK_WATCH_SEC = float(cfg.get("sink_watch_sec", 0.3))
+SINK_EVENT_SEC = 0.05                                     # regroupe la rafale d'événements d'un changement
+_logmod.configure(level=cfg.get("log_level"), fmt=cfg.get("log_format"))
+
+METRICS_PORT = int(cfg.get("metrics_port", 9464))          # 0 = désactivé
+METRICS_HOST = str(cfg.get("metrics_host", "127.0.0.1"))
+METRICS_SUMMARY_SEC = float(cfg.get("metrics_summary_sec", 60))  # résumé joint au heartbeat
+
+# Contrôle direct depuis le réseau local (UDP signé HMAC avec la clé du device) ; 0 = off
+LAN_PORT = int(cfg.get("lan_port", 0))
+LAN_HOST = str(cfg.get("lan_host", "0.0.0.0"))
+LAN_WINDOW_SEC = float(cfg.get("lan_window_sec", 10))    # fraîcheur max d'un datagramme
+DB_RETRY_SEC = 5.0                                      # écriture DB en échec (hub absent)
+DB_ECHO_SEC = 10.0                                      # durée d'attente du renvoi par l'api
+
+STATE_PATH = str(cfg.get("state_path", "state.json") or "")    # "" = pas de persistance
+STATE_PERSIST_SEC = float(cfg.get("state_persist_sec", 2.0))  # regroupement des écritures
+
+# Scènes programmées (planning reçu par scenes:set, exécuté sur place, gardé sur disque)
+SCENES_PATH = str(cfg.get("scenes_path", "scenes.json") or "")  # "" = planning non conservé
+FADE_FPS = float(cfg.get("fade_fps", 25))                      # plafond d'images/s d'un fondu
+CLOCK_CHECK_SEC = float(cfg.get("clock_check_sec", 30))        # détection des sauts d'horloge
+CLOCK_JUMP_SEC = 2.0                                           # écart murale/monotone ⇒ replanification
+SCENE_ON_TIME_SEC = 60.0                                       # au-delà: occurrence manquée (politique)
 
-def _auth_headers():
-    return {"Authorization": f"ApiKey {API_KEY}", "x-device-id": DEVICE_ID, "Content-Type": "application/json"}
+# Données des widgets (météo…): cache partagé, persisté, rafraîchi en fond
+WIDGETS_PATH = str(cfg.get("widgets_path", "widgets.json") or "")   # "" = cache non conservé
+WIDGETS_CHECK_SEC = float(cfg.get("widgets_check_sec", 30))         # revalidation des widgets affichés
+WIDGET_TTL_SEC: Dict[str, float] = dict(cfg.get("widget_ttl_sec") or {})  # par source, sinon TTL de l'api
 
-from utils import leds, music, state as dev_state
+trace.configure(cfg.get("trace_path"), int(float(cfg.get("trace_max_mb", 8)) * 1024 * 1024), cfg.get("trace_keep", 3))
 
-sio = socketio.Client(reconnection=True, reconnection_attempts=0, logger=False, engineio_logger=False)
+profiler.configure(
+    dir=cfg.get("profile_dir"), duration=cfg.get("profile_sec"), hz=cfg.get("profile_hz"),
+    alloc=cfg.get("profile_alloc"), keep=cfg.get("profile_keep"), max_bytes=cfg.get("profile_max_bytes"),
+)
+
+from utils import leds, music, scenes, state as dev_state, widgets
+
+_HANDLERS: List[Tuple[str, Callable]] = []
 
-_last_report: Optional[Dict[str, Any]] = None
-_last_emit_ts: float = 0.0
 EMIT_THROTTLE_SEC = 0.2
 
-_last_sink_check: float = 0.0
-_last_music_poll: float = -1e9  # poll immédiat au boot
-_last_sink_volume: Optional[int] = None
-_last_db_music_seen: Optional[Dict[str, Any]] = None
+_sched = sched.Scheduler()   # tous devices, local: scènes / fondus / widgets / grâce
+_io = sched.Scheduler()      # appels bloquants, thread aura-io: REST (heartbeat, poll DB, écritures DB, synchro), pactl (sink watch, reports différés)
+_last_metrics_summary: float = 0.0
+
+# ---------- Devices ----------
+# Clés propres à un device (sous `devices:`, ou à la racine en config mono-device historique)
+_DEVICE_KEYS = ("led_count", "led_pin", "led_dma", "led_channel", "sink", "player", "state_path", "scenes_path", "name")
+
+class Device:
+    """
+    Un device Aura piloté par ce process: identité hub, ruban, sink et état logique propres,
+    plus le suivi de synchro (dernier report, versions hub, grâce…).
+    """
+
+    def __init__(self, spec: Dict[str, Any], name: str, state_path: Optional[str], scenes_path: Optional[str]):
+        self.id = str(spec["device_id"])
+        self.key = str(spec["api_key"])
+        self.name = name                      # suffixe des tâches du scheduler ("" en mono-device)
+        self.spec = spec
+        self._strip: Optional[leds.AuraLEDs] = None
+        self._strip_lock = threading.Lock()
+        self.music = music.Sink(spec.get("sink") or os.environ.get("AURA_PULSE_SINK"), spec.get("player"))
+        self.state = dev_state.DeviceState()
+        self.store = persist.StateFile(state_path)
+        self.link: Optional["Link"] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.last_emit_ts = 0.0
+        self.last_sink_volume: Optional[int] = None
+        self.last_db_music_seen: Optional[Dict[str, Any]] = None
+        # Versions = hash de contenu par section du dernier snapshot hub réconcilié
+        self.hub_versions: Dict[str, str] = {}
+        self.restored = False   # état local rejoué au boot (sinon: rien sur le ruban/sink ne vient de l'agent)
+        self.dark = False   # ruban éteint par expiration de la grâce (l'état logique, lui, est conservé)
+        # Sérialise tout ce qui applique un état au device (hub, LAN, scènes/fondus, pull, poll, sink)
+        self.lock = threading.RLock()
+        # Actions locales (LAN, scènes): écritures DB en attente (par route REST) et renvois attendus de l'api
+        self.db_lock = threading.Lock()
+        self.db_pending: Dict[str, Dict[str, Any]] = {}
+        self.db_echo: List[Tuple[str, Dict[str, Any], float]] = []
+        # Scènes: planning, dernière occurrence traitée (jouée ou sautée) par scène, date de réception
+        self.scenes_store = persist.StateFile(scenes_path)
+        self.scenes_lock = threading.Lock()
+        self.scenes: List[scenes.Scene] = []
+        self.scene_runs: Dict[str, float] = {}
+        self.scenes_set_at = 0.0
+        # Widgets: liste configurée côté api (key/enabled/orderIndex/config) ; preset ambiant actif
+        self.widget_items: List[Dict[str, Any]] = []
+        self.ambient: Optional[str] = None
+        self.ambient_rgb: Optional[Tuple[int, ...]] = None
+        if self.store.enabled():
+            self.state.subscribe(lambda: _persist_later(self))
+
+    @property
+    def strip(self) -> leds.AuraLEDs:
+        # instancié au 1er usage (charge rpi_ws281x) ; un canal PWM et un DMA par ruban
+        if self._strip is None:
+            with self._strip_lock:
+                if self._strip is None:
+                    s = self.spec
+                    self._strip = leds.AuraLEDs(
+                        count=int(s.get("led_count", leds.DEFAULT_LED_COUNT)),
+                        pin=int(s.get("led_pin", leds.DEFAULT_LED_PIN)),
+                        dma=int(s.get("led_dma", leds.DEFAULT_DMA)),
+                        channel=int(s.get("led_channel", leds.DEFAULT_CHANNEL)),
+                    )
+        return self._strip
+
+    def task(self, base: str) -> str:
+        return f"{base}:{self.name}" if self.name else base
+
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"ApiKey {self.key}", "x-device-id": self.id, "Content-Type": "application/json"}
+
+class Link:
+    """Une socket /agent et sa reconnexion ; porte un device, ou tous en mode multiplexé."""
+
+    def __init__(self, devices: List[Device]):
+        self.devices = devices
+        self.primary = devices[0]            # la socket s'authentifie avec ce device
+        self.backoff = Backoff(RECONNECT_MIN_SEC, RECONNECT_MAX_SEC)
+        self.sio = None                      # socketio.Client, créé par client() (import différé)
+        self.codec = wire.JSON               # négocié à chaque connexion (welcome)
+        self.connecting = False              # tentative de connexion en cours (thread dédié)
+        self._by_id = {d.id: d for d in devices}
+        for d in devices:
+            d.link = self
+
+    def client(self):
+        if self.sio is None:
+            socketio = boot.get("socketio")
+            c = socketio.Client(reconnection=False, logger=False, engineio_logger=False)
+            for event, fn in _HANDLERS:
+                c.on(event, self._bind(fn), namespace=NS)
+            self.sio = c
+        return self.sio
+
+    def _bind(self, fn):
+        return lambda *a: fn(self, *a)
+
+    @property
+    def connected(self) -> bool:
+        return self.sio is not None and self.sio.connected
+
+    def route(self, payload: Any) -> Optional[Device]:
+        """Device visé par un événement (deviceId) ; None s'il n'est pas porté par cette socket."""
+        did = payload.get("deviceId") if isinstance(payload, dict) else None
+        if did is None:
+            return self.primary
+        return self._by_id.get(did)
+
+    def task(self, base: str) -> str:
+        return self.primary.task(base)
+
+def _load_devices() -> List[Device]:
+    specs = cfg.get("devices")
+    if not specs:
+        # config historique: un seul device à la racine
+        spec = {k: cfg[k] for k in ("device_id", "api_key") + _DEVICE_KEYS if k in cfg}
+        return [Device(spec, "", STATE_PATH or None, SCENES_PATH or None)]
+    out: List[Device] = []
+    def _path(spec: Dict[str, Any], key: str, default: str, name: str) -> Optional[str]:
+        base, ext = os.path.splitext(default)
+        return str(spec.get(key) or f"{base}-{name}{ext}") if default else None
+    for i, spec in enumerate(specs):
+        name = str(spec.get("name") or i)
+        out.append(Device(spec, name, _path(spec, "state_path", STATE_PATH, name),
+                          _path(spec, "scenes_path", SCENES_PATH, name)))
+    return out
+
+DEVICES = _load_devices()
+LINKS = [Link(DEVICES)] if MULTIPLEX_SOCKET else [Link([d]) for d in DEVICES]
+metrics.gauge("aura_devices", "Devices pilotés par ce process").set(len(DEVICES))
+
+# ---------- Instrumentation ----------
+# Métriques résolues une fois par label (le lookup du registre coûte plus qu'un observe)
+_http_h: Dict[str, metrics.Histogram] = {}
+_http_c: Dict[Any, metrics.Counter] = {}
+_emit_h: Dict[str, metrics.Histogram] = {}
+
+_http_session = None
+_http_lock = threading.Lock()
+
+def _session():
+    """Session requests partagée par tous les devices (pool keep-alive vers l'api)."""
+    global _http_session
+    if _http_session is None:
+        with _http_lock:
+            if _http_session is None:
+                requests = boot.get("requests")
+                s = requests.Session()
+                pool = max(10, 4 * len(DEVICES))   # heartbeat + poll + pull concurrents par device
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _http_session = s
+    return _http_session
+
+def _http(method: str, route: str, url: str, **kw) -> "requests.Response":
+    """requests.<method> chronométré par route (state, heartbeat…)."""
+    t0 = time.perf_counter()
+    code = "error"
+    try:
+        r = _session().request(method, url, **kw)
+        code = str(r.status_code)
+        return r
+    finally:
+        h = _http_h.get(route)
+        if h is None:
+            h = _http_h[route] = metrics.histogram("aura_http_seconds", "Durée des appels REST", route=route)
+        h.observe(time.perf_counter() - t0)
+        c = _http_c.get((route, code))
+        if c is None:
+            c = _http_c[(route, code)] = metrics.counter("aura_http_requests_total", "Appels REST", route=route, code=code)
+        c.inc()
+
+def _emit(d: Device, event: str, payload: Any) -> None:
+    t0 = time.perf_counter()
+    try:
+        if d.link.codec == wire.MSGPACK:
+            payload = wire.encode(payload)
+        d.link.client().emit(event, payload, namespace=NS)
+    finally:
+        h = _emit_h.get(event)
+        if h is None:
+            h = _emit_h[event] = metrics.histogram("aura_emit_seconds", "Durée des sio.emit", event=event)
+        h.observe(time.perf_counter() - t0)
+
+def _handler(event: str):
+    """Chronomètre le handler et trace l'événement entrant (si trace_path)."""
+    timed = metrics.timed("aura_event_seconds", "Durée des handlers socket", event=event)
+    def deco(fn):
+        inner = timed(fn)
+        nargs = fn.__code__.co_argcount
+        @wraps(fn)
+        def wrapper(link, *a):
+            if a and isinstance(a[0], (bytes, bytearray)):
+                a = (wire.decode(a[0]),) + a[1:]
+            trace.record("ev", event, a[0] if a else None)
+            return inner(link, *a[:nargs - 1])
+        return wrapper
+    return deco
+
+def _on(event: str):
+    """Handler socket (chronométré/tracé), branché sur chaque client à sa création."""
+    def deco(fn):
+        w = _handler(event)(fn)
+        _HANDLERS.append((event, w))
+        return w
+    return deco
 
 # ---------- API helpers ----------
-def _fetch_api_state_raw() -> Optional[str]:
-    url = f"{API_BASE}/devices/{DEVICE_ID}/state"
+def _fetch_api_state_raw(d: Device) -> Optional[str]:
+    url = f"{API_BASE}/devices/{d.id}/state"
     try:
-        r = requests.get(url, headers=_auth_headers(), timeout=5)
-        print(f"🟦 RAW GET {url} → {r.status_code}")
-        print("🟦 BODY:", r.text)
+        r = _http("GET", "state", url, headers=d.headers(), timeout=5)
+        log.debug("🟦 RAW GET %s → %s", url, r.status_code)
+        log.debug("🟦 BODY: %s", r.text)
         if r.status_code == 200:
             return r.text
     except Exception as e:
-        print("ℹ️ API GET state échec:", e)
+        log.info("ℹ️ API GET state échec: %s", e, every=30)
     return None
 
-def _fetch_api_state() -> Optional[Dict[str, Any]]:
-    url = f"{API_BASE}/devices/{DEVICE_ID}/state"
+def _fetch_api_state(d: Device, source: str = "poll") -> Optional[Dict[str, Any]]:
+    url = f"{API_BASE}/devices/{d.id}/state"
+    data = None
     try:
-        r = requests.get(url, headers=_auth_headers(), timeout=5)
-        print(f"🟦 RAW GET {url} → {r.status_code}")
-        print("🟦 BODY:", r.text)
+        r = _http("GET", "state", url, headers=d.headers(), timeout=5)
+        log.debug("🟦 RAW GET %s → %s", url, r.status_code)
+        log.debug("🟦 BODY: %s", r.text)
         if r.status_code == 200:
-            return r.json()
+            data = r.json()
         else:
-            print(f"ℹ️ API GET state non-200: {r.status_code} {r.text[:300]}")
+            log.info("ℹ️ API GET state non-200: %s %s", r.status_code, r.text[:300], every=30)
     except Exception as e:
-        print("ℹ️ API GET state échec:", e)
-    return None
+        log.info("ℹ️ API GET state échec: %s", e, every=30)
+    trace.record("rest", source, data)
+    return data
 
 # ---------- State helpers ----------
-def _refresh_runtime_music_into_state() -> None:
+def _refresh_runtime_music_into_state(d: Device) -> None:
     """
     Ne pousse dans state que si on a une vraie lecture volume.
     Évite de re-forcer un 40% par défaut au boot.
     """
     try:
-        m = music.get_state()
+        m = d.music.get_state()
         if m.get("volume") is not None:
-            dev_state.set_music(m)
+            d.state.set_music(m)
         else:
-            print("ℹ️ get_state volume=None → on n'écrase pas l'état actuel")
+            log.debug("ℹ️ get_state volume=None → on n'écrase pas l'état actuel", every=60)
     except Exception as e:
-        print("ℹ️ refresh music state fail:", e)
+        log.info("ℹ️ refresh music state fail: %s", e, every=30)
 
-def _current_snapshot() -> Dict[str, Any]:
-    _refresh_runtime_music_into_state()
-    snap = dev_state.snapshot()
+def _current_snapshot(d: Device) -> Dict[str, Any]:
+    _refresh_runtime_music_into_state(d)
+    snap = d.state.snapshot()
     if not isinstance(snap, dict): return {}
-    out = {"deviceId": DEVICE_ID}
+    out = {"deviceId": d.id}
     if "leds" in snap:   out["leds"] = snap["leds"]
     if "music" in snap:  out["music"] = snap["music"]
     if "widgets" in snap and snap["widgets"] is not None: out["widgets"] = snap["widgets"]
     return out
 
-def emit_state(force: bool = False, *, tag_for_api_log: Optional[str] = None):
-    global _last_report, _last_emit_ts
+def emit_state(d: Device, force: bool = False, *, tag_for_api_log: Optional[str] = None):
     now = time.time()
-    if not force and (now - _last_emit_ts) < EMIT_THROTTLE_SEC:
+    if not force and (now - d.last_emit_ts) < EMIT_THROTTLE_SEC:
+        # throttlé: un seul emit de fin de rafale, pour que le dernier état parte quand même
+        _io.once(d.task("emit:trailing"), EMIT_THROTTLE_SEC - (now - d.last_emit_ts),
+                    lambda: emit_state(d, tag_for_api_log=tag_for_api_log))
         return
-    payload = _current_snapshot()
+    payload = _current_snapshot(d)
     if not payload: return
-    if (not force) and (_last_report == payload): return
-    _last_report = payload
-    _last_emit_ts = now
-    print("📤 state:report →", payload)
+    if (not force) and (d.last_report == payload): return
+    d.last_report = payload
+    d.last_emit_ts = now
+    log.debug("📤 state:report → %s", payload)
     try:
-        sio.emit("state:report", payload, namespace=NS)
+        _emit(d, "state:report", payload)
     except Exception as e:
-        print("⚠️ state:report erreur:", e)
-    if tag_for_api_log:
-        _fetch_api_state_raw()
+        log.warn("⚠️ state:report erreur: %s", e, every=10)
+    # GET de contrôle purement informatif: seulement si le debug est actif
+    if tag_for_api_log and _logmod.enabled(_logmod.DEBUG):
+        _fetch_api_state_raw(d)
 
 # ---------- LEDs ----------
 def _coerce_leds_payload(raw: Dict[str, Any]) -> Dict[str, Any]:
@@ -155,19 +419,137 @@ def _coerce_leds_payload(raw: Dict[str, Any]) -> Dict[str, Any]:
         out["preset"] = str(p["preset"])
     return out
 
-def _apply_leds(norm: Dict[str, Any]):
+def _apply_leds(d: Device, norm: Dict[str, Any]):
+    if _sched.pending(d.task("fade")):
+        # fondu interrompu: le ruban n'a qu'une image intermédiaire ⇒ état logique complet + changement
+        _sched.cancel(d.task("fade"))
+        cur = d.state.snapshot().get("leds") or {}
+        norm = {**{k: v for k, v in cur.items() if k in ("on", "color", "brightness")}, **norm}
+    # preset ambiant (ex. "weather"): couleur calculée depuis les données d'un widget, pas par le driver
+    if "preset" in norm or "color" in norm:
+        d.ambient = norm.get("preset") if norm.get("preset") in widgets.AMBIENT else None
+    d.ambient_rgb = None
+    hw = {k: v for k, v in norm.items() if k != "preset"} if norm.get("preset") in widgets.AMBIENT else norm
     try:
-        if hasattr(leds, "apply") and callable(getattr(leds, "apply")):
-            leds.apply({"leds": norm})
-            dev_state.merge_leds(norm)
-            return
+        d.strip.apply_payload({"leds": hw})
     except Exception as e:
-        print("⚠️ utils.leds.apply a échoué, fallback granular:", e)
-    if "on" in norm and hasattr(leds, "set_on"): leds.set_on(bool(norm["on"]))
-    if "color" in norm and hasattr(leds, "set_color"): leds.set_color(str(norm["color"]))
-    if "brightness" in norm and hasattr(leds, "set_brightness"): leds.set_brightness(int(norm["brightness"]))
-    if "preset" in norm and hasattr(leds, "set_preset"): leds.set_preset(str(norm["preset"]))
-    dev_state.merge_leds(norm)
+        log.warn("⚠️ LEDs apply a échoué, fallback granular: %s", e)
+        s = d.strip
+        if "on" in hw: s.set_on(bool(hw["on"]))
+        if "color" in hw: s.set_color(str(hw["color"]))
+        if "brightness" in hw: s.set_brightness(int(hw["brightness"]))
+        if "preset" in hw: s.set_preset(str(hw["preset"]))
+    d.state.merge_leds(norm)
+    if d.ambient:
+        _render_ambient(d)
+    boot.mark("first_photon")
+
+# ---------- Persistance locale (boot sans réseau) ----------
+def _persist_now(d: Device):
+    snap = d.state.snapshot()
+    d.store.save({k: snap.get(k) for k in ("leds", "music", "widgets")})
+
+def _persist_later(d: Device):
+    # N changements rapprochés ⇒ une seule écriture (carte SD)
+    _sched.once(d.task("persist"), STATE_PERSIST_SEC, lambda: _persist_now(d))
+
+def restore_local_state(d: Device) -> bool:
+    """
+    Boot: réapplique le dernier état persisté au ruban avant toute connexion.
+    Le hub reste la référence: connect() → pull_snapshot_rest() réconcilie ensuite.
+    """
+    data = d.store.load()
+    if data is None:
+        return False
+    try:
+        if isinstance(data.get("music"), dict):
+            d.state.set_music(data["music"])   # le sink garde son volume: état logique seulement
+        if data.get("widgets") is not None:
+            d.state.set_widgets(data["widgets"])
+            _set_widget_items(d, data["widgets"])
+        leds_cfg = data.get("leds")
+        if isinstance(leds_cfg, dict):
+            _apply_leds(d, _coerce_leds_payload(leds_cfg))
+        d.restored = True
+        log.info("💾 État local restauré (%s): %s", d.store.path, leds_cfg)
+        return True
+    except Exception as e:
+        log.warn("⚠️ restauration état local: %s", e)
+        return False
+
+# ---------- Widgets ----------
+# La liste des widgets vient de l'api (GET state, widgets:update) ; leurs données (météo) du
+# cache partagé. Le state:report porte la liste enrichie de `data` (+ `stale`). Lecture du
+# cache non bloquante: handlers et rendu ne font jamais d'appel réseau pour un widget.
+def _fetch_weather(params: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[float]]:
+    r = _http("GET", "weather", f"{API_BASE}/weather", params=params, timeout=5)
+    if r.status_code != 200:
+        raise RuntimeError(f"weather {r.status_code}")
+    body = r.json()
+    ttl = body.pop("ttlSec", None)
+    return body, (float(ttl) if ttl is not None else None)
+
+_widget_cache = widgets.Cache(WIDGETS_PATH or None)
+_widget_cache.register(widgets.Source("weather", _fetch_weather, widgets.weather_params, ttl=WIDGET_TTL_SEC.get("weather")))
+
+def _widget_params(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    src = _widget_cache.sources.get(str(item.get("key")))
+    if src is None or not item.get("enabled", True):
+        return None
+    return src.params(item.get("config") if isinstance(item.get("config"), dict) else {})
+
+def _set_widget_items(d: Device, items: Any) -> None:
+    if not isinstance(items, list):
+        return
+    d.widget_items = sorted(
+        ({k: it[k] for k in ("key", "enabled", "orderIndex", "config") if k in it} for it in items if isinstance(it, dict) and it.get("key")),
+        key=lambda it: it.get("orderIndex", 0))
+    _sched.once(d.task("widgets:update"), 0.0, lambda: _refresh_widgets(d))
+
+def _widgets_view(d: Device) -> List[Dict[str, Any]]:
+    out = []
+    for it in d.widget_items:
+        params = _widget_params(it)
+        got = _widget_cache.get(str(it["key"]), params) if params else None
+        out.append({**it, "data": got[0], "stale": not got[1]} if got else dict(it))
+    return out
+
+def _refresh_widgets(d: Device) -> None:
+    """Revalide les widgets affichés (fond) et publie les nouvelles valeurs (report + rendu)."""
+    view = _widgets_view(d)
+    with d.lock:
+        changed = view != d.state.snapshot().get("widgets")
+        if changed:
+            d.state.set_widgets(view)
+        _render_ambient(d)
+    if changed:
+        # report (lecture du sink, emit) sur aura-io: le rendu ne bloque pas sur pactl
+        _io.once(d.task("widgets:report"), 0.0, lambda: emit_state(d, tag_for_api_log="widgets"))
+
+def _on_widget_data(key: str) -> None:
+    # thread du cache → scheduler (les devices qui affichent cette clé)
+    for d in DEVICES:
+        if any(p and widgets.Cache.key(str(it["key"]), p) == key for it in d.widget_items for p in [_widget_params(it)]):
+            _sched.once(d.task("widgets:update"), 0.0, lambda d=d: _refresh_widgets(d))
+
+_widget_cache.subscribe(_on_widget_data)
+
+def _render_ambient(d: Device) -> None:
+    if d.ambient is None or d.dark or _sched.pending(d.task("fade")):
+        return
+    leds_st = d.state.snapshot().get("leds") or {}
+    if not leds_st.get("on"):
+        return
+    source, color = widgets.AMBIENT[d.ambient]
+    item = next((it for it in d.widget_items if it.get("key") == source), None)
+    params = _widget_params(item) if item else None
+    got = _widget_cache.get(source, params) if params else None
+    rgb = color(got[0]) if got else None
+    if rgb is None or rgb == d.ambient_rgb:
+        return
+    d.ambient_rgb = rgb
+    d.strip.render(rgb, int(leds_st.get("brightness", 0)))
+    log.info("🌡️ Ambiance %s → #%02X%02X%02X", d.ambient, *rgb)
 
 # ---------- Music (DB→SYS + handlers) ----------
 def _coerce_db_volume(v) -> Optional[int]:
@@ -181,7 +563,7 @@ def _coerce_db_volume(v) -> Optional[int]:
         except Exception:
             return None
 
-def _apply_music_from_snapshot(mraw: Dict[str, Any], *, source: str):
+def _apply_music_from_snapshot(d: Device, mraw: Dict[str, Any], *, source: str):
     try:
         # Normalise
         norm: Dict[str, Any] = {}
@@ -194,385 +576,882 @@ def _apply_music_from_snapshot(mraw: Dict[str, Any], *, source: str):
             if st in ("play", "pause"):
                 norm["status"] = st
 
-        before = music.get_state().get("volume")
+        before = d.music.get_state().get("volume")
 
-        print(f"🎯 [{source}] MUSIC snapshot norm: {norm}")
+        log.debug("🎯 [%s] MUSIC snapshot norm: %s", source, norm)
 
         if "volume" in norm:
             want = norm["volume"]
-            print(f"🧭 DECIDE: set volume → {want}% (before sink={before}%)")
-            st = music.set_volume(want)              # APPLY
+            log.info("🧭 DECIDE: set volume → %s%% (before sink=%s%%)", want, before)
+            st = d.music.set_volume(want)              # APPLY
             after = st.get("volume")
-            print(f"✅ VERIFY: sink volume={after}% (wanted={want}%)")
+            log.debug("✅ VERIFY: sink volume=%s%% (wanted=%s%%)", after, want)
 
         if norm.get("status") == "play":
-            print("🧭 DECIDE: status → play")
-            music.play()
+            log.info("🧭 DECIDE: status → play")
+            d.music.play()
         elif norm.get("status") == "pause":
-            print("🧭 DECIDE: status → pause")
-            music.pause()
+            log.info("🧭 DECIDE: status → pause")
+            d.music.pause()
 
-        dev_state.set_music(music.get_state())
+        d.state.set_music(d.music.get_state())
     except Exception as e:
-        print("⚠️ apply music snapshot:", e)
+        log.warn("⚠️ apply music snapshot: %s", e)
 
-def _handle_volume_payload(payload: Dict[str, Any], *, source: str):
+def _handle_volume_payload(d: Device, payload: Dict[str, Any], *, source: str):
     data = payload.get("music", payload)
     cv = _coerce_db_volume(data.get("value", data.get("volume", None)))
     if cv is None:
         raise ValueError("Missing/invalid volume/value (expected 0..100)")
-    before = music.get_state().get("volume")
-    print(f"🧭 [{source}] DECIDE: set volume {cv}% (before sink={before}%)")
-    st = music.set_volume(cv)
+    before = d.music.get_state().get("volume")
+    log.info("🧭 [%s] DECIDE: set volume %s%% (before sink=%s%%)", source, cv, before)
+    st = d.music.set_volume(cv)
     after = st.get("volume")
-    print(f"✅ [{source}] VERIFY: sink volume={after}% (wanted={cv}%)")
-    dev_state.set_music(st)
+    log.debug("✅ [%s] VERIFY: sink volume=%s%% (wanted=%s%%)", source, after, cv)
+    d.state.set_music(st)
 
 # ---------- Apply snapshot / REST ----------
-def apply_snapshot(snapshot: Dict[str, Any], *, reason: str = "unknown"):
-    print(f"⬇️  state:apply ({reason}) →", snapshot)
+def apply_snapshot(d: Device, snapshot: Dict[str, Any], *, reason: str = "unknown"):
+    log.info("⬇️  state:apply (%s) → %s", reason, snapshot)
     try:
-        if "leds" in snapshot and isinstance(snapshot["leds"], dict):
-            _apply_leds(_coerce_leds_payload(snapshot["leds"]))
-        if "music" in snapshot and isinstance(snapshot["music"], dict):
-            _apply_music_from_snapshot(snapshot["music"], source=f"{reason}/state:apply")
-        emit_state(force=True, tag_for_api_log=f"{reason}/state:apply")
+        with d.lock:
+            if "leds" in snapshot and isinstance(snapshot["leds"], dict):
+                _apply_leds(d, _coerce_leds_payload(snapshot["leds"]))
+            if "music" in snapshot and isinstance(snapshot["music"], dict):
+                _apply_music_from_snapshot(d, snapshot["music"], source=f"{reason}/state:apply")
+        emit_state(d, force=True, tag_for_api_log=f"{reason}/state:apply")
     except Exception as e:
-        print("⚠️ apply_snapshot:", e)
-
-def pull_snapshot_rest() -> bool:
-    data = _fetch_api_state()
-    if isinstance(data, dict):
-        apply_snapshot(data, reason="REST")
-        print("✅ Snapshot REST appliqué.")
-        return True
-    return False
-
-# ---------- WS guards ----------
-def _accept_for_me(payload: Dict[str, Any]) -> bool:
-    did = payload.get("deviceId")
-    return (did is None) or (did == DEVICE_ID)
+        log.warn("⚠️ apply_snapshot: %s", e)
+
+# ---------- Réconciliation (re)connexion ----------
+# Versions = hash de contenu par section (l'api n'expose pas de version). On garde celles du
+# dernier snapshot hub réconcilié (Device.hub_versions): à la reconnexion, seules les sections
+# modifiées côté hub pendant la coupure sont appliquées, et seulement les champs qui diffèrent
+# de ce que portent réellement le ruban et le sink (pas de l'état logique, qui au premier boot
+# n'a que des valeurs par défaut). Première réconciliation sans état restauré: tout est appliqué.
+def _version(section: Any) -> str:
+    raw = json.dumps(section, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+def _state_versions(snap: Dict[str, Any]) -> Dict[str, str]:
+    return {k: _version(snap[k]) for k in ("leds", "music", "widgets") if k in snap}
+
+def _relight_local(d: Device) -> None:
+    with d.lock:
+        if d.dark:
+            d.dark = False
+            _apply_leds(d, _coerce_leds_payload(d.state.snapshot().get("leds") or {}))
+            log.info("💡 Ruban rallumé (état local)")
+
+def pull_snapshot_rest(d: Device) -> bool:
+    _db_flush(d)   # actions locales faites hors ligne: en DB avant de relire la référence
+    data = _fetch_api_state(d, "pull")
+    if not isinstance(data, dict):
+        return False
+    try:
+        first = not d.hub_versions and not d.restored
+        # lecture du sink hors verrou (pactl) ; seule la comparaison se fait sous verrou
+        sink = d.music.get_state() if not first and isinstance(data.get("music"), dict) else {}
+        with d.lock:
+            vers = _state_versions(data)
+            changed = [k for k, v in vers.items() if first or d.hub_versions.get(k) != v]
+            delta: Dict[str, Any] = {}
+            if "leds" in changed and isinstance(data.get("leds"), dict):
+                want = _coerce_leds_payload(data["leds"])
+                if first:
+                    diff = want
+                else:
+                    # pendant un fondu le ruban n'a qu'une image intermédiaire: on compare à sa cible
+                    cur = d.state.snapshot().get("leds") if _sched.pending(d.task("fade")) else d.strip.snapshot()
+                    diff = {k: v for k, v in want.items() if (cur or {}).get(k) != v}
+                if diff:
+                    delta["leds"] = diff
+            if "music" in changed and isinstance(data.get("music"), dict):
+                vol = _coerce_db_volume(data["music"].get("volume"))
+                st = str(data["music"].get("status") or "").lower()
+                diff = {}
+                if vol is not None and (first or sink.get("volume") != vol):
+                    diff["volume"] = vol
+                if st in ("play", "pause") and (first or st != (sink.get("status") or "").lower()):
+                    diff["status"] = st
+                if diff:
+                    delta["music"] = diff
+            log.info("🔀 Réconciliation REST%s: sections modifiées=%s delta=%s", " (initiale)" if first else "", changed, delta)
+            if d.dark:
+                # grâce expirée: tout l'état LEDs (local + écart hub) repart au ruban
+                d.state.merge_leds(delta.get("leds") or {})
+                _relight_local(d)
+            elif "leds" in delta:
+                _apply_leds(d, delta["leds"])
+            if "music" in delta:
+                _apply_music_from_snapshot(d, delta["music"], source="REST/delta")
+            if "widgets" in changed:
+                _set_widget_items(d, data.get("widgets"))
+            d.hub_versions = vers
+        boot.mark("first_photon")   # ruban conforme au hub (même sans écart à appliquer)
+        emit_state(d, force=True, tag_for_api_log="REST/delta")
+    except Exception as e:
+        log.warn("⚠️ réconciliation REST: %s", e)
+    return True
 
 # ---------- WS ----------
-def _ack_ok(evt_type: str, data: Optional[Dict[str, Any]] = None):
-    sio.emit("ack", {"deviceId": DEVICE_ID, "type": evt_type, "status": "ok", "data": data or {}}, namespace=NS)
-
-def _ack_err(evt_type: str, msg: str):
-    sio.emit("nack", {"deviceId": DEVICE_ID, "type": evt_type, "reason": msg}, namespace=NS)
-
-def post_heartbeat():
-    url = f"{API_BASE}/devices/{DEVICE_ID}/heartbeat"
+def _ack_ok(d: Device, evt_type: str, data: Optional[Dict[str, Any]] = None):
+    boot.mark("first_ack")
+    _emit(d, "ack", {"deviceId": d.id, "type": evt_type, "status": "ok", "data": data or {}})
+
+def _ack_err(d: Device, evt_type: str, msg: str):
+    metrics.counter("aura_nack_total", "Commandes refusées", type=evt_type).inc()
+    _emit(d, "nack", {"deviceId": d.id, "type": evt_type, "reason": msg})
+
+def post_heartbeat(d: Device):
+    global _last_metrics_summary
+    url = f"{API_BASE}/devices/{d.id}/heartbeat"
+    body: Dict[str, Any] = {"status": "ok"}
+    now = time.monotonic()
+    # métriques du process: jointes au heartbeat du premier device seulement
+    if d is DEVICES[0] and METRICS_SUMMARY_SEC > 0 and (now - _last_metrics_summary) >= METRICS_SUMMARY_SEC:
+        _last_metrics_summary = now
+        body["metrics"] = metrics.summary()
     try:
-        resp = requests.post(url, json={"status": "ok"}, headers=_auth_headers(), timeout=5)
+        resp = _http("POST", "heartbeat", url, json=body, headers=d.headers(), timeout=5)
         if resp.status_code >= 400:
-            print(f"⚠️ HB non-200: {resp.status_code} {resp.text}")
+            log.warn("⚠️ HB non-200: %s %s", resp.status_code, resp.text, every=30)
         else:
-            print("💓 Heartbeat OK")
-    except Exception as e:
-        print("⚠️ Heartbeat HTTP échec:", e)
-
-@sio.event(namespace=NS)
-def connect():
-    print(f"✅ Connecté au hub {NS}")
-    try:
-        sio.emit("agent:register", {"deviceId": DEVICE_ID}, namespace=NS)
+            log.debug("💓 Heartbeat OK")
     except Exception as e:
-        print("⚠️ agent:register erreur:", e)
+        log.warn("⚠️ Heartbeat HTTP échec: %s", e, every=30)
 
-    pulled = pull_snapshot_rest()
+def _sync_on_connect(d: Device):
+    pulled = pull_snapshot_rest(d)
 
+    if not pulled:
+        _relight_local(d)
     if (not pulled) and FALLBACK_LOCAL_ON_BOOT:
         try:
-            snap = dev_state.snapshot() or {}
+            snap = d.state.snapshot() or {}
             leds_cfg = snap.get("leds")
             if isinstance(leds_cfg, dict):
-                _apply_leds(_coerce_leds_payload(leds_cfg))
-                print("✅ Boot LEDs (fallback local) appliqué:", leds_cfg)
-                emit_state(force=True, tag_for_api_log="boot-local")
+                with d.lock:
+                    _apply_leds(d, _coerce_leds_payload(leds_cfg))
+                log.info("✅ Boot LEDs (fallback local) appliqué: %s", leds_cfg)
+                emit_state(d, force=True, tag_for_api_log="boot-local")
         except Exception as e:
-            print("⚠️ Boot fallback error:", e)
-
-    # Poll immédiat juste après connexion pour forcer l'alignement musique
-    try:
-        print("⏳ First music DB poll right after connect() …")
-        _poll_music_from_db()
-    except Exception as e:
-        print("ℹ️ initial poll music fail:", e)
-
-    post_heartbeat()
+            log.warn("⚠️ Boot fallback error: %s", e)
 
+    # Poll immédiat pour forcer l'alignement musique (inutile si le pull REST vient de le faire)
     if not pulled:
         try:
-            sio.emit("state:pull", {"deviceId": DEVICE_ID}, namespace=NS)
+            log.debug("⏳ First music DB poll right after connect() …")
+            _poll_music_from_db(d)
         except Exception as e:
-            print("ℹ️ state:pull échec:", e)
+            log.info("ℹ️ initial poll music fail: %s", e)
 
-@sio.event(namespace=NS)
-def disconnect():
-    print("❌ Déconnecté du hub — blackout LEDs")
-    try:
-        leds.blackout()
-    except Exception as e:
-        print("⚠️ blackout error:", e)
+    post_heartbeat(d)
+    _io.postpone(d.task("heartbeat"))
 
-@sio.on("agent:ack", namespace=NS)
-def on_agent_ack(payload):
-    if not _accept_for_me(payload): return
-    print("✅ ACK serveur:", payload)
-
-@sio.on("presence", namespace=NS)
-def on_presence(payload):
-    if not _accept_for_me(payload): return
-    print("👀 Presence:", payload)
+    if not pulled:
+        try:
+            _emit(d, "state:pull", {"deviceId": d.id})
+        except Exception as e:
+            log.info("ℹ️ state:pull échec: %s", e)
+
+@_on("connect")
+def connect(link: Link):
+    log.info("✅ Connecté au hub %s (%s device(s))", NS, len(link.devices))
+    boot.mark("connected")
+    link.backoff.reset()
+    link.codec = wire.JSON
+    for d in link.devices:
+        _sched.cancel(d.task("blackout"))
+        try:
+            # stateVersion: ignoré par l'api actuelle, utile à un hub capable de ne pousser que l'écart
+            reg: Dict[str, Any] = {"deviceId": d.id, "stateVersion": _state_versions({**d.state.snapshot(), "widgets": d.widget_items})}
+            if WIRE_ENCODING == wire.MSGPACK:
+                reg["wire"] = wire.available()
+            _emit(d, "agent:register", reg)
+        except Exception as e:
+            log.warn("⚠️ agent:register erreur: %s", e)
+        # pull REST / heartbeat hors du handler: socketio n'achève connect() qu'à son retour
+        _io.once(d.task("sync"), 0.0, lambda d=d: _sync_on_connect(d), replace=True)
 
-@sio.on("state:apply", namespace=NS)
-def on_state_apply(payload):
-    if not _accept_for_me(payload): return
-    apply_snapshot({k: v for k, v in payload.items() if k in ("leds", "music", "widgets")}, reason="WS")
+@_on("disconnect")
+def disconnect(link: Link):
+    if not _running:
+        return
+    log.warn("❌ Déconnecté du hub — blackout LEDs dans %ss si pas de retour", BLACKOUT_GRACE_SEC)
+    for d in link.devices:
+        _sched.once(d.task("blackout"), BLACKOUT_GRACE_SEC, lambda d=d: _grace_expired(d))
+    _schedule_connect(link)
 
-# ---------- LEDs events ----------
-@sio.on("leds:update", namespace=NS)
-def on_leds_update(payload):
-    if not _accept_for_me(payload): return
+def _grace_expired(d: Device):
+    if d.link.connected:
+        return
+    log.warn("🌑 Hub absent depuis %ss — blackout LEDs", BLACKOUT_GRACE_SEC)
     try:
-        norm = _coerce_leds_payload(payload.get("leds", payload))
-        _apply_leds(norm)
-        _ack_ok("leds")
-        emit_state(tag_for_api_log="leds:update")
+        with d.lock:
+            d.strip.blackout()
+            d.dark = True
     except Exception as e:
-        print("⚠️ LEDs update:", e)
-        _ack_err("leds", str(e))
+        log.warn("⚠️ blackout error: %s", e)
+
+@_on("welcome")
+def on_welcome(link: Link, payload):
+    codec = payload.get("wire") if isinstance(payload, dict) else None
+    if WIRE_ENCODING == wire.MSGPACK and codec == wire.MSGPACK and codec in wire.available() and link.codec != codec:
+        link.codec = codec
+        log.info("📦 Encodage socket négocié: %s", codec)
+
+@_on("agent:ack")
+def on_agent_ack(link: Link, payload):
+    d = link.route(payload)
+    if d is None: return
+    log.debug("✅ ACK serveur: %s", payload)
+
+@_on("presence")
+def on_presence(link: Link, payload):
+    d = link.route(payload)
+    if d is None: return
+    log.debug("👀 Presence: %s", payload)
+
+@_on("state:apply")
+def on_state_apply(link: Link, payload):
+    d = link.route(payload)
+    if d is None or not isinstance(payload, dict): return
+    apply_snapshot(d, {k: v for k, v in payload.items() if k in ("leds", "music", "widgets")}, reason="WS")
+
+# ---------- Commandes (hub ou LAN) ----------
+# Une commande applique le payload au device et retourne les données d'ack ; lève si invalide.
+def _cmd_leds_update(d: Device, payload: Dict[str, Any]):
+    _apply_leds(d, _coerce_leds_payload(payload.get("leds", payload)))
+    return None
 
-@sio.on("leds:state", namespace=NS)
-def on_leds_state(payload):
-    if not _accept_for_me(payload): return
+def _cmd_leds_state(d: Device, payload: Dict[str, Any]):
+    norm = _coerce_leds_payload(payload)
+    if "on" not in norm: raise ValueError("Missing 'on'")
+    _apply_leds(d, {"on": norm["on"]})
+    return {"on": norm["on"]}
+
+def _cmd_leds_style(d: Device, payload: Dict[str, Any]):
+    norm = _coerce_leds_payload(payload)
+    if not any(k in norm for k in ("color", "brightness", "preset")):
+        raise ValueError("Provide one of color|brightness|preset")
+    _apply_leds(d, {k: v for k, v in norm.items() if k in ("color", "brightness", "preset")})
+    return {"applied": True}
+
+def _cmd_volume(source: str):
+    def cmd(d: Device, payload: Dict[str, Any]):
+        _handle_volume_payload(d, payload, source=source)
+        return None
+    return cmd
+
+def _cmd_music(source: str):
+    def cmd(d: Device, payload: Dict[str, Any]):
+        data = payload.get("music", payload)
+        if "volume" in data or "value" in data:
+            _handle_volume_payload(d, data, source=source)
+        if "action" in data:
+            before = d.music.get_state().get("volume")
+            st = d.music.apply({"action": data["action"]})
+            after = st.get("volume")
+            log.info("🎵 [%s] action=%s (sink %s%% ; was %s%%)", source, data["action"], after, before)
+            d.state.set_music(st)
+        return None
+    return cmd
+
+def _cmd_scenes_set(d: Device, payload: Dict[str, Any]):
+    parsed = scenes.parse(payload.get("scenes"))
+    with d.scenes_lock:
+        for sc in d.scenes:
+            _sched.cancel(d.task(f"scene:{sc.id}"))
+        ids = {sc.id for sc in parsed}
+        d.scenes = parsed
+        # occurrences antérieures à la réception: jamais "manquées" (scène existante: son suivi est gardé)
+        d.scene_runs = {k: v for k, v in d.scene_runs.items() if k in ids}
+        d.scenes_set_at = time.time()
+        _save_scenes(d)
+    log.info("🗓️ Planning reçu: %s scène(s) %s", len(parsed), sorted(ids))
+    _plan_scenes(d, "set")
+    return {"scenes": len(parsed)}
+
+# événement → (type d'ack, commande)
+_COMMANDS: Dict[str, Tuple[str, Callable[[Device, Dict[str, Any]], Any]]] = {
+    "leds:update":    ("leds", _cmd_leds_update),
+    "leds:state":     ("leds:state", _cmd_leds_state),
+    "leds:style":     ("leds:style", _cmd_leds_style),
+    "music:volume":   ("music:volume", _cmd_volume("music:volume")),
+    "control:volume": ("control:volume", _cmd_volume("control:volume")),
+    "music:cmd":      ("music", _cmd_music("music:cmd")),
+    "music:update":   ("music:update", _cmd_music("music:update")),
+    "music":          ("music(generic)", _cmd_music("music(generic)")),
+    "scenes:set":     ("scenes", _cmd_scenes_set),
+}
+
+def _hub_command(link: Link, event: str, payload):
+    d = link.route(payload)
+    if d is None: return
+    ack_type, cmd = _COMMANDS[event]
+    if not isinstance(payload, dict):
+        _ack_err(d, ack_type, "invalid payload")   # ex. binaire non décodable (msgpack absent)
+        return
+    if _db_echo(d, event, payload):
+        _ack_ok(d, ack_type, {"applied": True, "echo": True})   # déjà appliqué en local
+        return
     try:
-        norm = _coerce_leds_payload(payload)
-        if "on" not in norm: raise ValueError("Missing 'on'")
-        _apply_leds({"on": norm["on"]})
-        _ack_ok("leds:state", {"on": norm["on"]})
-        emit_state(tag_for_api_log="leds:state")
+        with d.lock:
+            data = cmd(d, payload)
+        _ack_ok(d, ack_type, data)
+        emit_state(d, tag_for_api_log=event)
     except Exception as e:
-        print("⚠️ LEDs state:", e)
-        _ack_err("leds:state", str(e))
+        log.warn("⚠️ %s: %s", event, e)
+        _ack_err(d, ack_type, str(e))
 
-@sio.on("leds:style", namespace=NS)
-def on_leds_style(payload):
-    if not _accept_for_me(payload): return
+# ---------- LEDs events ----------
+@_on("leds:update")
+def on_leds_update(link: Link, payload):
+    _hub_command(link, "leds:update", payload)
+
+@_on("leds:state")
+def on_leds_state(link: Link, payload):
+    _hub_command(link, "leds:state", payload)
+
+@_on("leds:style")
+def on_leds_style(link: Link, payload):
+    _hub_command(link, "leds:style", payload)
+
+@_on("widgets:update")
+def on_widgets_update(link: Link, payload):
+    d = link.route(payload)
+    if d is None or not isinstance(payload, dict): return
+    log.info("🧩 widgets:update → %s", payload.get("items"))
+    _set_widget_items(d, payload.get("items"))
+
+# ---------- Scènes ----------
+@_on("scenes:set")
+def on_scenes_set(link: Link, payload):
+    _hub_command(link, "scenes:set", payload)
+
+# ---------- Diagnostic ----------
+@_on("agent:profile")
+def on_agent_profile(link: Link, payload):
+    p = payload if isinstance(payload, dict) else {}
+    d = link.route(p)
+    if d is None: return
     try:
-        norm = _coerce_leds_payload(payload)
-        if not any(k in norm for k in ("color", "brightness", "preset")):
-            raise ValueError("Provide one of color|brightness|preset")
-        _apply_leds({k: v for k, v in norm.items() if k in ("color", "brightness", "preset")})
-        _ack_ok("leds:style", {"applied": True})
-        emit_state(tag_for_api_log="leds:style")
-    except Exception as e:
-        print("⚠️ LEDs style:", e)
-        _ack_err("leds:style", str(e))
+        if payload not in (None, "") and not isinstance(payload, dict):
+            raise ValueError("invalid payload")
+        started = profiler.start(p.get("durationSec"), p.get("hz"), p.get("alloc"))
+    except ValueError as e:
+        log.warn("⚠️ agent:profile: %s", e)
+        _ack_err(d, "agent:profile", str(e))
+        return
+    if started:
+        _ack_ok(d, "agent:profile", {"started": True})
+    else:
+        _ack_err(d, "agent:profile", "profiler already running")
 
 # ---------- Music events ----------
-@sio.on("music:volume", namespace=NS)
-def on_music_volume(payload):
-    if not _accept_for_me(payload): return
-    try:
-        _handle_volume_payload(payload, source="music:volume")
-        _ack_ok("music:volume")
-        emit_state(tag_for_api_log="music:volume")
-    except Exception as e:
-        print("⚠️ Music volume:", e)
-        _ack_err("music:volume", str(e))
+@_on("music:volume")
+def on_music_volume(link: Link, payload):
+    _hub_command(link, "music:volume", payload)
+
+@_on("music:cmd")
+def on_music_cmd(link: Link, payload):
+    _hub_command(link, "music:cmd", payload)
+
+@_on("music:update")
+def on_music_update(link: Link, payload):
+    _hub_command(link, "music:update", payload)
+
+@_on("music")
+def on_music_generic(link: Link, payload):
+    _hub_command(link, "music", payload)
+
+@_on("control:volume")
+def on_control_volume(link: Link, payload):
+    _hub_command(link, "control:volume", payload)
+
+# ---------- Contrôle LAN ----------
+# Commande appliquée tout de suite et réponse signée au client ; ensuite, comme toute action
+# locale: state:report au hub et écriture en DB (ci-dessous).
+_BY_ID = {d.id: d for d in DEVICES}
+_lan_server: Optional[lan.Server] = None
+
+def _lan_dispatch(did: str, event: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    d = _BY_ID[did]
+    if event not in _COMMANDS:
+        return {"ok": False, "reason": f"unsupported event: {event}"}
+    ack_type, cmd = _COMMANDS[event]
+    with d.lock:
+        data = cmd(d, payload)
+        _local_to_db(d, event, payload)
+        snap = d.state.snapshot()
+    _io.once(d.task("lan:report"), 0.0, lambda: emit_state(d, tag_for_api_log=f"lan/{event}"))
+    return {"ok": True, "type": ack_type, "data": data or {}, "state": {"leds": snap["leds"], "music": snap["music"]}}
+
+# ---------- Actions locales → DB ----------
+# Une action décidée sur le device (LAN, scène) est écrite en DB via les routes REST de
+# contrôle (clé du device) pour que la DB reste la référence (sinon le poll musique DB→SYS ou
+# la réconciliation à la reconnexion annuleraient le changement). L'api renvoie ces commandes
+# à l'agent: ces échos sont acquittés sans être réappliqués.
+
+# route REST → (événement renvoyé par l'api, payload renvoyé)
+_DB_ECHO: Dict[str, Callable[[Dict[str, Any]], Tuple[str, Dict[str, Any]]]] = {
+    "leds/style":   lambda b: ("leds:style", dict(b)),
+    "leds/state":   lambda b: ("leds:state", {"on": b["on"]}),
+    "music/volume": lambda b: ("music:volume", {"music": {"volume": b["value"]}}),
+    "music/cmd":    lambda b: ("music:cmd", {"music": {"action": b["action"]}}),
+}
+
+def _local_to_db(d: Device, event: str, payload: Dict[str, Any]) -> None:
+    """Mémorise l'écriture DB correspondante (regroupée par route: une rafale ⇒ la dernière valeur)."""
+    if not event.startswith(("leds:", "music", "control:")):
+        return   # pas d'équivalent en DB (scenes:set)
+    with d.db_lock:
+        p = d.db_pending
+        if event.startswith("leds:"):
+            norm = _coerce_leds_payload(payload.get("leds", payload) if event == "leds:update" else payload)
+            style = {k: v for k, v in norm.items() if k in ("color", "brightness", "preset")}
+            if style:
+                p["leds/style"] = {**p.get("leds/style", {}), **style}
+            # leds/style force on=true en DB: on réécrit toujours l'état réel du ruban ensuite
+            p["leds/state"] = {"on": bool((d.state.snapshot().get("leds") or {}).get("on"))}
+        else:
+            data = payload.get("music", payload)
+            vol = _coerce_db_volume(data.get("value", data.get("volume")))
+            if vol is not None:
+                p["music/volume"] = {"value": vol}
+            action = str(data.get("action") or "").lower()
+            if action in ("play", "pause"):      # next/prev: rien à stocker en DB
+                p["music/cmd"] = {"action": action}
+    _io.once(d.task("db:sync"), 0.0, lambda: _db_sync(d))
+
+def _db_sync(d: Device) -> None:
+    with d.db_lock:
+        pending, d.db_pending = d.db_pending, {}
+    for route in ("leds/style", "leds/state", "music/volume", "music/cmd"):
+        body = pending.get(route)
+        if body is None:
+            continue
+        echo = _DB_ECHO[route](body)
+        with d.db_lock:
+            d.db_echo.append((echo[0], echo[1], time.monotonic() + DB_ECHO_SEC))
+        try:
+            r = _http("POST", f"db:{route}", f"{API_BASE}/devices/{d.id}/{route}", json=body, headers=d.headers(), timeout=5)
+            if r.status_code < 400:
+                continue
+            log.warn("⚠️ écriture DB %s: %s %s", route, r.status_code, r.text[:200], every=30)
+            retry = r.status_code >= 500
+        except Exception as e:
+            log.info("ℹ️ écriture DB %s: %s", route, e, every=30)
+            retry = True
+        with d.db_lock:
+            if d.db_echo and d.db_echo[-1][:2] == echo:
+                d.db_echo.pop()
+        if retry:
+            # hub injoignable: on réessaie plus tard, sans écraser une valeur plus récente
+            with d.db_lock:
+                d.db_pending[route] = {**body, **d.db_pending.get(route, {})}
+            _io.once(d.task("db:sync"), DB_RETRY_SEC, lambda: _db_sync(d))
+
+def _db_echo(d: Device, event: str, payload) -> bool:
+    """True si `payload` est le renvoi par l'api d'une action locale (déjà appliquée)."""
+    if not d.db_echo or not isinstance(payload, dict):
+        return False
+    now = time.monotonic()
+    body = {k: v for k, v in payload.items() if k != "deviceId"}
+    with d.db_lock:
+        d.db_echo[:] = [e for e in d.db_echo if e[2] > now]
+        for i, (ev, want, _) in enumerate(d.db_echo):
+            if ev == event and want == body:
+                del d.db_echo[i]
+                log.debug("↩️ écho api ignoré: %s %s", event, body)
+                return True
+    return False
 
-@sio.on("music:cmd", namespace=NS)
-def on_music_cmd(payload):
-    if not _accept_for_me(payload): return
+def _db_flush(d: Device) -> None:
+    # le poll DB→SYS ne doit pas lire la DB avant qu'une action locale y soit écrite
+    if d.db_pending:
+        _db_sync(d)
+
+# ---------- Scènes programmées ----------
+# Le planning (scenes:set, hub ou LAN) est gardé sur disque et joué sur place, sans le hub.
+# Échéance en heure murale → délai sur le tas du scheduler (horloge monotone: insensible aux
+# réglages d'horloge) ; un saut d'horloge (NTP, Pi sans RTC au boot) se voit à l'écart entre
+# time.time() et time.monotonic() et replanifie tout. Les fondus sont rendus localement
+# (images sur le ruban), pas envoyés comme une suite de commandes.
+_clock_offset: Optional[float] = None
+_drift_h: Dict[str, metrics.Histogram] = {}
+
+def _save_scenes(d: Device) -> None:
+    d.scenes_store.save({"scenes": [sc.raw for sc in d.scenes], "lastRun": d.scene_runs, "setAt": d.scenes_set_at})
+
+def load_scenes(d: Device) -> None:
+    data = d.scenes_store.load()
+    if data is None:
+        return
     try:
-        data = payload.get("music", payload)
-        if "volume" in data or "value" in data:
-            _handle_volume_payload(data, source="music:cmd")
-        if "action" in data:
-            before = music.get_state().get("volume")
-            st = music.apply({"action": data["action"]})
-            after = st.get("volume")
-            print(f"🎵 [music:cmd] action={data['action']} (sink {after}% ; was {before}%)")
-            dev_state.set_music(st)
-        _ack_ok("music")
-        emit_state(tag_for_api_log="music:cmd")
+        d.scenes = scenes.parse(data.get("scenes") or [])
+        d.scene_runs = {str(k): float(v) for k, v in (data.get("lastRun") or {}).items()}
+        d.scenes_set_at = float(data.get("setAt") or time.time())
+        log.info("🗓️ %s scène(s) restaurée(s) (%s)", len(d.scenes), d.scenes_store.path)
     except Exception as e:
-        print("⚠️ Music cmd:", e)
-        _ack_err("music", str(e))
+        log.warn("⚠️ planning persisté invalide: %s", e)
 
-@sio.on("music:update", namespace=NS)
-def on_music_update(payload):
-    if not _accept_for_me(payload): return
-    try:
-        data = payload.get("music", payload)
-        if "volume" in data or "value" in data:
-            _handle_volume_payload(data, source="music:update")
-        if "action" in data:
-            before = music.get_state().get("volume")
-            st = music.apply({"action": data["action"]})
-            after = st.get("volume")
-            print(f"🎵 [music:update] action={data['action']} (sink {after}% ; was {before}%)")
-            dev_state.set_music(st)
-        _ack_ok("music:update")
-        emit_state(tag_for_api_log="music:update")
-    except Exception as e:
-        print("⚠️ music:update:", e)
-        _ack_err("music:update", str(e))
+def _missed(d: Device, sc: scenes.Scene, at: float, how: str) -> None:
+    metrics.counter("aura_scene_missed_total", "Occurrences de scènes sautées", policy=sc.missed, how=how).inc()
+    log.info("⏭️ Scène %s du %s sautée (%s, %s)", sc.id, time.strftime("%d/%m %H:%M:%S", time.localtime(at)), sc.missed, how)
+    d.scene_runs[sc.id] = at
+
+def _plan_scenes(d: Device, reason: str) -> None:
+    """(Re)planifie chaque scène ; applique la politique aux occurrences manquées depuis la dernière."""
+    now = time.time()
+    with d.scenes_lock:
+        dirty = False
+        for sc in d.scenes:
+            name = d.task(f"scene:{sc.id}")
+            prev = sc.last_before(now)
+            if prev is not None and prev > d.scene_runs.get(sc.id, d.scenes_set_at):
+                if sc.missed == "catchup" and now - prev <= sc.max_late:
+                    # rejouée tout de suite ; _run_scene planifie ensuite la suivante
+                    _sched.once(name, 0.0, lambda sc=sc, prev=prev: _run_scene(d, sc, prev, catchup=True), replace=True)
+                    continue
+                _missed(d, sc, prev, reason)
+                dirty = True
+            nxt = sc.next_after(now)
+            if nxt is None:
+                _sched.cancel(name)
+                continue
+            _sched.once(name, nxt - now, lambda sc=sc, nxt=nxt: _run_scene(d, sc, nxt), replace=True)
+        if dirty:
+            _save_scenes(d)
+    log.debug("🗓️ Scènes planifiées (%s): %s", reason, len(d.scenes))
 
-@sio.on("music", namespace=NS)
-def on_music_generic(payload):
-    if not _accept_for_me(payload): return
+def _run_scene(d: Device, sc: scenes.Scene, at: float, *, catchup: bool = False) -> None:
+    now = time.time()
+    late = now - at
+    name = d.task(f"scene:{sc.id}")
+    if sc not in d.scenes:
+        return   # planning remplacé entre-temps
+    if late < -CLOCK_JUMP_SEC:
+        # horloge reculée depuis la planification: l'heure murale n'y est pas encore
+        _sched.once(name, -late, lambda: _run_scene(d, sc, at), replace=True)
+        return
+    if late > SCENE_ON_TIME_SEC:
+        catchup = True   # échéance franchie par un saut d'horloge ou un scheduler bloqué
+    if catchup and (sc.missed == "skip" or late > sc.max_late):
+        with d.scenes_lock:
+            _missed(d, sc, at, "late")
+    else:
+        how = "catchup" if catchup else "on_time"
+        if not catchup:
+            h = _drift_h.get(sc.id)
+            if h is None:
+                h = _drift_h[sc.id] = metrics.histogram("aura_scene_drift_seconds", "Écart exécution - heure prévue des scènes", scene=sc.id)
+            h.observe(abs(late))
+        metrics.counter("aura_scene_runs_total", "Scènes jouées", how=how).inc()
+        log.info("🎬 Scène %s (%s, écart %+.3fs)", sc.id, how, late)
+        _play_scene(d, sc, max(0.0, late))
+    with d.scenes_lock:
+        d.scene_runs[sc.id] = at
+        _save_scenes(d)
+    nxt = sc.next_after(max(now, at))
+    if nxt is not None:
+        _sched.once(name, nxt - time.time(), lambda: _run_scene(d, sc, nxt), replace=True)
+
+def _play_scene(d: Device, sc: scenes.Scene, late: float) -> None:
     try:
-        data = payload.get("music", payload)
-        if "volume" in data or "value" in data:
-            _handle_volume_payload(data, source="music(generic)")
-        if "action" in data:
-            st = music.apply({"action": data["action"]})
-            dev_state.set_music(st)
-        _ack_ok("music(generic)")
-        emit_state(tag_for_api_log="music(generic)")
+        if sc.leds is not None:
+            with d.lock:
+                norm = _coerce_leds_payload(sc.leds)
+                if sc.fade > late and "preset" not in norm:
+                    _start_fade(d, norm, sc.fade, late / sc.fade)   # rattrapage: le fondu reprend où il en serait
+                else:
+                    _apply_leds(d, norm)
+                _local_to_db(d, "leds:update", {"leds": norm})
+            # report (lecture du sink) hors du thread de rendu: le fondu démarre sans attendre pactl
+            _io.once(d.task("scene:report"), 0.0, lambda: emit_state(d, tag_for_api_log=f"scene/{sc.id}"))
+        if sc.music is not None:
+            # pactl/playerctl sur aura-io ; une tâche par scène (deux scènes au même instant: aucune perdue)
+            _io.once(d.task(f"scene:{sc.id}:music"), 0.0, lambda: _play_scene_music(d, sc))
     except Exception as e:
-        print("⚠️ music(generic):", e)
-        _ack_err("music(generic)", str(e))
+        log.warn("⚠️ scène %s: %s", sc.id, e)
 
-@sio.on("control:volume", namespace=NS)
-def on_control_volume(payload):
-    if not _accept_for_me(payload): return
+def _play_scene_music(d: Device, sc: scenes.Scene) -> None:
     try:
-        _handle_volume_payload(payload, source="control:volume")
-        _ack_ok("control:volume")
-        emit_state(tag_for_api_log="control:volume")
+        with d.lock:
+            _COMMANDS["music:update"][1](d, {"music": sc.music})
+            _local_to_db(d, "music:update", {"music": sc.music})
+        emit_state(d, tag_for_api_log=f"scene/{sc.id}")
     except Exception as e:
-        print("⚠️ control:volume:", e)
-        _ack_err("control:volume", str(e))
+        log.warn("⚠️ scène %s (musique): %s", sc.id, e)
+
+def _start_fade(d: Device, target: Dict[str, Any], duration: float, p0: float) -> None:
+    """Fondu de l'image actuelle vers `target`: l'état logique est la cible dès le départ."""
+    cur = d.state.snapshot().get("leds") or {}
+    a_on, b_on = bool(cur.get("on")), bool(target.get("on", cur.get("on")))
+    a_rgb = scenes.hex_to_rgb(str(cur.get("color") or "#FFFFFF"))
+    b_rgb = scenes.hex_to_rgb(str(target.get("color") or cur.get("color") or "#FFFFFF"))
+    a_br = int(cur.get("brightness", 0)) if a_on else 0
+    b_br = int(target.get("brightness", cur.get("brightness", 0))) if b_on else 0
+    # ruban éteint à un bout: on fond la luminosité seule, dans la couleur de l'autre bout
+    if not a_on: a_rgb = b_rgb
+    if not b_on: b_rgb = a_rgb
+    a, b = a_rgb + (a_br,), b_rgb + (b_br,)
+    # une image par niveau distinct (luminosité comptée en pas matériels), au plus FADE_FPS/s
+    levels = scenes.fade_levels(a[:3] + (int(a_br * 2.55),), b[:3] + (int(b_br * 2.55),))
+    interval = max(1.0 / FADE_FPS, duration / levels)
+    frames = metrics.counter("aura_fade_frames_total", "Images rendues par les fondus")
+    _sched.cancel(d.task("fade"))
+    d.state.merge_leds({**target, "on": b_on})
+    final = {k: v for k, v in (d.state.snapshot().get("leds") or {}).items() if k in ("on", "color", "brightness")}
+    t0 = time.monotonic() - p0 * duration
+    last: List[Any] = [None]
+    me: List[Any] = [None]
+
+    def step():
+        with d.lock:
+            if me[0] is not None and me[0].cancelled:
+                return   # interrompu par une commande pendant que cette image attendait le verrou
+            p = (time.monotonic() - t0) / duration
+            if d.dark or p >= 1.0:
+                _sched.cancel(d.task("fade"))
+                if not d.dark:
+                    d.strip.apply_payload({"leds": final})   # dernière image = état logique (luminosité matérielle comprise)
+                return
+            img = scenes.lerp(a, b, p)
+            if img != last[0]:
+                last[0] = img
+                d.strip.render(img[:3], img[3])
+                frames.inc()
+
+    log.info("🌅 Fondu %.0fs → %s (départ %.0f%%, %.0f img/s)", duration, target, p0 * 100, 1.0 / interval)
+    me[0] = _sched.every(d.task("fade"), interval, step)
+    boot.mark("first_photon")
+
+def _check_clock() -> None:
+    global _clock_offset
+    off = time.time() - time.monotonic()
+    if _clock_offset is not None and abs(off - _clock_offset) > CLOCK_JUMP_SEC:
+        metrics.counter("aura_clock_jumps_total", "Sauts de l'horloge murale détectés").inc()
+        log.warn("⏰ Saut d'horloge de %+.1fs → scènes replanifiées", off - _clock_offset)
+        for d in DEVICES:
+            if d.scenes:
+                _plan_scenes(d, "clock")
+    _clock_offset = off
 
 # ---------- Main loop ----------
 _running = True
 def sigterm(*_):
     global _running
-    print("↩️ Stop… blackout LEDs")
+    log.info("↩️ Stop… blackout LEDs")
     _running = False
-    try: leds.blackout()
-    except: pass
-    try: sio.disconnect()
-    except: pass
+    if _lan_server is not None:
+        _lan_server.close()
+    music.unwatch()
+    for d in DEVICES:
+        try: d.strip.blackout()
+        except: pass
+    for link in LINKS:
+        try:
+            if link.sio is not None: link.sio.disconnect()
+        except: pass
+    for d in DEVICES:
+        _persist_now(d)
+    trace.close()
+    _logmod.flush()
     sys.exit(0)
 
+def _sigdump(*_):
+    _logmod.dump_to(sys.stderr, int(cfg.get("log_dump_lines", 200)))
+
 signal.signal(signal.SIGINT, sigterm)
 signal.signal(signal.SIGTERM, sigterm)
+if hasattr(signal, "SIGUSR2"):
+    signal.signal(signal.SIGUSR2, _sigdump)
+profiler.install()   # SIGUSR1 → session de profilage bornée
 
-def _poll_music_from_db():
+def _poll_music_from_db(d: Device):
     """
     Pipeline: DETECT → FETCH(DB) → DECIDE → APPLY(pactl/playerctl) → VERIFY → REPORT
     """
-    global _last_db_music_seen
-
-    data = _fetch_api_state()
+    _db_flush(d)
+    data = _fetch_api_state(d)
     if not isinstance(data, dict):
-        print("🔎 POLL → pas de JSON dict (skip)")
+        log.debug("🔎 POLL → pas de JSON dict (skip)", every=30)
         return
 
     db_music = data.get("music") or {}
     if not isinstance(db_music, dict):
-        print("🔎 POLL → pas de music dict (skip)")
+        log.debug("🔎 POLL → pas de music dict (skip)", every=30)
         return
 
     # DETECT changements DB
-    if _last_db_music_seen is None or any(db_music.get(k) != (_last_db_music_seen or {}).get(k) for k in ("status", "volume")):
-        print(f"🆕 DB changed → {db_music}")
-        _last_db_music_seen = dict(db_music)
+    seen = d.last_db_music_seen
+    if seen is None or any(db_music.get(k) != seen.get(k) for k in ("status", "volume")):
+        log.info("🆕 DB changed → %s", db_music)
+        d.last_db_music_seen = dict(db_music)
     else:
-        print(f"🔁 DB unchanged → {db_music}")
+        log.debug("🔁 DB unchanged → %s", db_music, every=60)
 
-    # FETCH sink
-    sink_state = music.get_state()
-    sink_vol   = sink_state.get("volume")
-    sink_st    = (sink_state.get("status") or "").lower()
     wanted_vol = _coerce_db_volume(db_music.get("volume"))
     wanted_st  = (str(db_music.get("status") or "").lower())
+    # lecture pilote hors verrou (cas courant: rien à faire) ; relue sous verrou avant d'agir
+    sink_state = d.music.get_state()
+    if not _music_differs(sink_state, wanted_vol, wanted_st):
+        log.debug("🔎 COMPARE DB{status:%s, volume:%s} = SINK", wanted_st, wanted_vol, every=60)
+        return
 
-    print(f"🔎 COMPARE DB{{status:{wanted_st}, volume:{wanted_vol}}} vs SINK{{status:{sink_st}, volume:{sink_vol}}}")
-
-    # DECIDE/APPLY volume
-    if wanted_vol is not None and sink_vol != wanted_vol:
-        print(f"🧭 DECIDE volume: {sink_vol}% → {wanted_vol}%")
-        st = music.set_volume(wanted_vol)     # APPLY
-        after = st.get("volume")
-        print(f"✅ VERIFY volume: sink={after}% (wanted={wanted_vol}%)")
-        dev_state.set_music(st)
-        emit_state(tag_for_api_log="poll/music")
-
-    # DECIDE/APPLY status
-    if wanted_st in ("play", "pause") and wanted_st != sink_st:
-        print(f"🧭 DECIDE status: {sink_st} → {wanted_st}")
-        if wanted_st == "play":
-            music.play()
-        else:
-            music.pause()
-        dev_state.set_music(music.get_state())
-        emit_state(tag_for_api_log="poll/music")
+    with d.lock:
+        # FETCH sink
+        sink_state = d.music.get_state()
+        sink_vol   = sink_state.get("volume")
+        sink_st    = (sink_state.get("status") or "").lower()
 
-def _watch_sink_volume():
+        log.debug("🔎 COMPARE DB{status:%s, volume:%s} vs SINK{status:%s, volume:%s}", wanted_st, wanted_vol, sink_st, sink_vol, every=60)
+
+        # DECIDE/APPLY volume
+        if wanted_vol is not None and sink_vol != wanted_vol:
+            log.info("🧭 DECIDE volume: %s%% → %s%%", sink_vol, wanted_vol)
+            st = d.music.set_volume(wanted_vol)     # APPLY
+            after = st.get("volume")
+            log.debug("✅ VERIFY volume: sink=%s%% (wanted=%s%%)", after, wanted_vol)
+            d.state.set_music(st)
+            emit_state(d, tag_for_api_log="poll/music")
+
+        # DECIDE/APPLY status
+        if wanted_st in ("play", "pause") and wanted_st != sink_st:
+            log.info("🧭 DECIDE status: %s → %s", sink_st, wanted_st)
+            if wanted_st == "play":
+                d.music.play()
+            else:
+                d.music.pause()
+            d.state.set_music(d.music.get_state())
+            emit_state(d, tag_for_api_log="poll/music")
+
+def _music_differs(sink_state: Dict[str, Any], wanted_vol: Optional[int], wanted_st: str) -> bool:
+    if wanted_vol is not None and sink_state.get("volume") != wanted_vol:
+        return True
+    return wanted_st in ("play", "pause") and wanted_st != (sink_state.get("status") or "").lower()
+
+def _watch_sink_volume(d: Device):
     """Détecte les changements locaux et réémet l'état immédiatement."""
-    global _last_sink_volume
-    st = music.get_state()
-    v = st.get("volume")
-    if v is None:
-        return
-    if _last_sink_volume is None:
-        _last_sink_volume = v
+    # lecture hors verrou: un pactl lent ne retient pas les commandes ; relue sous verrou si changement
+    v = d.music.get_state().get("volume")
+    if v is None or v == d.last_sink_volume:
         return
-    if v != _last_sink_volume:
-        print(f"👂 SINK change detected: { _last_sink_volume }% → { v }% (local)")
-        dev_state.set_music(st)
-        _last_sink_volume = v
-        emit_state(tag_for_api_log="sink/watch")
+    with d.lock:
+        st = d.music.get_state()
+        v = st.get("volume")
+        if v is None:
+            return
+        if d.last_sink_volume is None:
+            d.last_sink_volume = v
+            return
+        if v == d.last_sink_volume:
+            return
+        log.info("👂 SINK change detected: %s%% → %s%% (local)", d.last_sink_volume, v)
+        d.state.set_music(st)
+        d.last_sink_volume = v
+    emit_state(d, tag_for_api_log="sink/watch")
+
+def _task_music_poll(d: Device):
+    log.debug("🕑 POLL tick (every %ss)", MUSIC_POLL_SEC, every=60)
+    try:
+        _poll_music_from_db(d)
+    except Exception as e:
+        log.info("ℹ️ poll music fail: %s", e, every=30)
+
+def _task_sink_watch(d: Device):
+    try:
+        _watch_sink_volume(d)
+    except Exception as e:
+        log.info("ℹ️ sink watch fail: %s", e, every=30)
+
+def _sink_watch_down(d: Device, down: bool) -> None:
+    # pactl subscribe tombé (Pulse absent/redémarré): polling du sink jusqu'à sa relance
+    if down:
+        log.info("ℹ️ pactl subscribe indisponible: polling du sink toutes les %ss", SINK_WATCH_SEC, every=300)
+        _io.every(d.task("sink_poll"), SINK_WATCH_SEC, lambda: _task_sink_watch(d))
+    else:
+        _io.cancel(d.task("sink_poll"))
+
+def _schedule_periodic():
+    # la synchro de connexion fait heartbeat + poll: premières échéances une période plus tard
+    for d in DEVICES:
+        _io.every(d.task("heartbeat"), HEARTBEAT, lambda d=d: post_heartbeat(d), first=HEARTBEAT,
+                  when=lambda d=d: d.link.connected)
+        _io.every(d.task("music_poll"), MUSIC_POLL_SEC, lambda d=d: _task_music_poll(d), first=MUSIC_POLL_SEC,
+                  when=lambda d=d: d.link.connected)
+        if not music.watch(lambda d=d: _io.once(d.task("sink_watch"), SINK_EVENT_SEC, lambda: _task_sink_watch(d)),
+                           lambda down, d=d: _sink_watch_down(d, down)):
+            log.info("ℹ️ pactl introuvable: volume local non surveillé", every=300)
+        _sched.every(d.task("widgets"), WIDGETS_CHECK_SEC, lambda d=d: _refresh_widgets(d), first=WIDGETS_CHECK_SEC,
+                     when=lambda d=d: bool(d.widget_items))
+    _sched.every("clock", CLOCK_CHECK_SEC, _check_clock)
 
 def loop():
-    global _last_music_poll, _last_sink_check
-    last_hb = 0.0
-    while _running:
-        now = time.time()
-
-        if sio.connected and (now - last_hb) >= HEARTBEAT:
-            last_hb = now
-            post_heartbeat()
-
-        if (now - _last_music_poll) >= MUSIC_POLL_SEC:
-            _last_music_poll = now
-            try:
-                print(f"🕑 POLL tick (every {MUSIC_POLL_SEC}s)")
-                _poll_music_from_db()
-            except Exception as e:
-                print("ℹ️ poll music fail:", e)
-
-        if (now - _last_sink_check) >= SINK_WATCH_SEC:
-            _last_sink_check = now
-            try:
-                _watch_sink_volume()
-            except Exception as e:
-                print("ℹ️ sink watch fail:", e)
-
-        time.sleep(0.15)
+    """
+    Dort jusqu'à la prochaine échéance (plus de réveil fixe toutes les 150 ms). REST et pactl
+    ont leur scheduler sur le thread aura-io: une api lente ne retarde ni scène ni fondu.
+    """
+    if not _io.pending(DEVICES[0].task("music_poll")):
+        _schedule_periodic()
+    threading.Thread(target=_io.run, args=(lambda: _running,), name="aura-io", daemon=True).start()
+    _sched.run(lambda: _running)
+
+# Reconnexion pilotée par l'agent (client socketio sans reconnexion interne): backoff
+# exponentiel + full jitter par socket, pour qu'une flotte ne revienne pas en bloc après un
+# redémarrage de l'api. La tentative elle-même (bloquante jusqu'au timeout socketio si l'api
+# accepte le TCP sans répondre) tourne sur un thread à part: le scheduler continue de rendre
+# scènes et fondus ; un échec y replanifie la tentative suivante.
+def _schedule_connect(link: Link, delay: Optional[float] = None):
+    if delay is None:
+        delay = link.backoff.next()
+    _sched.once(link.task("connect"), delay, lambda: _task_connect(link))
+
+def _task_connect(link: Link):
+    if link.connecting or link.client().connected:
+        return
+    link.connecting = True
+    threading.Thread(target=_connect_attempt, args=(link,), name=link.task("aura-connect"), daemon=True).start()
+
+def _connect_attempt(link: Link):
+    c = link.client()
+    d = link.primary
+    err: Optional[Exception] = None
+    try:
+        c.connect(
+            API_URL,
+            headers={"Authorization": f"ApiKey {d.key}", "x-device-id": d.id},
+            socketio_path=WS_PATH,
+            namespaces=[NS],
+            transports=["websocket"],
+        )
+    except Exception as e:
+        err = e
+    link.connecting = False
+    if err is not None and _running:
+        # pas de blackout ici: le ruban garde son état (grâce gérée par disconnect())
+        delay = link.backoff.next()
+        log.warn("⚠️ Connexion échouée (tentative %s), retry %.1fs: %s", link.backoff.attempts, delay, err, every=10)
+        _schedule_connect(link, delay)
 
 def connect_forever():
-    while _running:
-        try:
-            sio.connect(
-                API_URL,
-                headers={"Authorization": f"ApiKey {API_KEY}", "x-device-id": DEVICE_ID},
-                socketio_path=WS_PATH,
-                namespaces=[NS],
-                transports=["websocket"],
-            )
-            loop()
-        except Exception as e:
-            print("⚠️ Connexion échouée, retry 5s:", e)
-            try: leds.blackout()
-            except: pass
-            time.sleep(5)
+    for link in LINKS:
+        _schedule_connect(link, 0.0)
+    loop()
 
 if __name__ == "__main__":
-    print(f"Agent Aura • device={DEVICE_ID} • url={API_URL}{WS_PATH} ns={NS} • HB={HEARTBEAT}s • DB<->SYS • RGB")
+    log.info("Agent Aura • device(s)=%s • url=%s%s ns=%s • HB=%ss • socket(s)=%s • DB<->SYS • RGB",
+             ",".join(d.id for d in DEVICES), API_URL, WS_PATH, NS, HEARTBEAT, len(LINKS))
+    _check_clock()
+    _widget_cache.load()
+    for d in DEVICES:
+        restore_local_state(d)
+        load_scenes(d)
+        _plan_scenes(d, "boot")
+    metrics.serve(METRICS_PORT, METRICS_HOST)
+    if LAN_PORT > 0:
+        _lan_server = lan.Server({d.id: d.key for d in DEVICES}, _lan_dispatch, window=LAN_WINDOW_SEC)
+        _lan_server.serve(LAN_HOST, LAN_PORT)
     connect_forever()
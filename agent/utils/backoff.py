@@ -0,0 +1,27 @@
+# utils/backoff.py
+from __future__ import annotations
+import random
+from typing import Optional
+
+class Backoff:
+    """
+    Backoff exponentiel plafonné avec « full jitter »: délai tiré dans [0, min(cap, base·2^n)].
+    Le tirage uniforme désynchronise une flotte qui perd le hub au même instant
+    (redémarrage de l'api) au lieu de la faire revenir en vagues.
+    """
+    __slots__ = ("base", "cap", "attempts", "_rng")
+
+    def __init__(self, base: float = 1.0, cap: float = 30.0, rng: Optional[random.Random] = None):
+        self.base = max(0.01, float(base))
+        self.cap = max(self.base, float(cap))
+        self.attempts = 0
+        self._rng = rng or random.Random()
+
+    def next(self) -> float:
+        """Délai avant la prochaine tentative (incrémente le compteur)."""
+        ceil = min(self.cap, self.base * (2 ** min(self.attempts, 30)))
+        self.attempts += 1
+        return self._rng.uniform(0.0, ceil)
+
+    def reset(self) -> None:
+        self.attempts = 0
@@ -0,0 +1,81 @@
+# utils/boot.py
+from __future__ import annotations
+import importlib
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils import log as _logmod, metrics
+
+log = _logmod.get("boot")
+
+# ---------- Âge du processus ----------
+def _proc_age() -> float:
+    """Secondes écoulées depuis le fork (interpréteur compris), via /proc si dispo."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except Exception:
+        return 0.0
+
+_age0 = _proc_age()
+_mono0 = time.monotonic()
+
+def since_start() -> float:
+    return _age0 + (time.monotonic() - _mono0)
+
+# ---------- Jalons de démarrage ----------
+# first_photon: premier état LED poussé au ruban ; connected: socket établie ;
+# first_ack: premier ack de commande émis vers le hub
+_marks: Dict[str, float] = {}
+
+def mark(name: str) -> Optional[float]:
+    """Enregistre un jalon (une seule fois par processus). Retourne l'âge en secondes."""
+    if name in _marks:
+        return None
+    t = _marks[name] = since_start()
+    metrics.gauge("aura_boot_seconds", "Jalons de démarrage (depuis le lancement du processus)", milestone=name).set(t)
+    log.info("⏱️ boot %s: %.0f ms", name, t * 1000)
+    return t
+
+def marks() -> Dict[str, float]:
+    return dict(_marks)
+
+# ---------- Imports lourds paresseux et parallèles ----------
+# preload() lance l'import en tâche de fond ; get() attend uniquement le module demandé.
+# L'exécution Python reste sérialisée par le GIL, mais les lectures disque (carte SD)
+# se recouvrent et surtout ces imports sortent du chemin critique du premier photon.
+_loading: Dict[str, threading.Thread] = {}
+_errors: Dict[str, BaseException] = {}
+_lock = threading.Lock()
+
+def _import(name: str) -> None:
+    t0 = time.perf_counter()
+    try:
+        importlib.import_module(name)
+    except BaseException as e:   # ImportError, mais aussi OSError d'une lib native (rpi_ws281x)
+        _errors[name] = e
+    finally:
+        metrics.gauge("aura_import_seconds", "Durée d'import des modules lourds", module=name).set(time.perf_counter() - t0)
+
+def preload(*names: str) -> None:
+    with _lock:
+        for name in names:
+            if name in _loading:
+                continue
+            th = _loading[name] = threading.Thread(target=_import, args=(name,), name=f"import:{name}", daemon=True)
+            th.start()
+
+def get(name: str) -> Any:
+    """Le module (attend son préchargement éventuel). Lève l'erreur d'import d'origine."""
+    th = _loading.get(name)
+    if th is not None:
+        th.join()
+        err = _errors.get(name)
+        if err is not None:
+            raise ImportError(f"{name}: {err}") from err
+    return importlib.import_module(name)
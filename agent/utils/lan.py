@@ -0,0 +1,140 @@
+# utils/lan.py
+from __future__ import annotations
+import hashlib
+import hmac
+import json
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils import log as _logmod, metrics
+
+log = _logmod.get("lan")
+
+# Contrôle direct sur le réseau local (UDP), sans aller-retour par le hub.
+# Datagramme = corps JSON + "\n" + HMAC-SHA256(api_key du device, corps) en hex.
+#   requête: {"deviceId", "event", "payload", "ts" (ms epoch), "id" (nonce)}
+#   réponse: {"id", "ok", "type" | "reason", "state"} signée avec la même clé
+# Fraîcheur: |now - ts| <= window ; un même id n'est accepté qu'une fois dans la fenêtre.
+
+MAX_DATAGRAM = 4096
+
+Dispatch = Callable[[str, str, Dict[str, Any]], Dict[str, Any]]
+
+def sign(key: str, body: bytes) -> bytes:
+    return hmac.new(key.encode("utf-8"), body, hashlib.sha256).hexdigest().encode("ascii")
+
+def pack(key: str, msg: Dict[str, Any]) -> bytes:
+    body = json.dumps(msg, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return body + b"\n" + sign(key, body)
+
+def unpack(data: bytes) -> Tuple[bytes, bytes]:
+    """(corps, signature) ; ValueError si le cadre est invalide."""
+    body, sep, sig = data.rpartition(b"\n")
+    if not sep or not body:
+        raise ValueError("bad frame")
+    return body, sig.strip()
+
+def verify(key: str, data: bytes) -> Dict[str, Any]:
+    """Corps décodé si la signature est valide (utilisé aussi par les clients du bench)."""
+    body, sig = unpack(data)
+    if not hmac.compare_digest(sign(key, body), sig):
+        raise PermissionError("bad signature")
+    msg = json.loads(body)
+    if not isinstance(msg, dict):
+        raise ValueError("bad body")
+    return msg
+
+class Server:
+    """Endpoint UDP: vérifie signature/fraîcheur puis appelle dispatch(deviceId, event, payload)."""
+
+    def __init__(self, keys: Dict[str, str], dispatch: Dispatch, *, window: float = 10.0):
+        self.keys = keys
+        self.dispatch = dispatch
+        self.window = max(1.0, float(window))
+        self._seen: Dict[str, float] = {}      # nonce → expiration
+        self._sock: Optional[socket.socket] = None
+        self._lat = metrics.histogram("aura_lan_seconds", "Traitement d'une commande LAN (réception → réponse)")
+
+    def _reject(self, reason: str) -> None:
+        metrics.counter("aura_lan_rejected_total", "Datagrammes LAN refusés", reason=reason).inc()
+        log.warn("⚠️ LAN refusé: %s", reason, every=30, key=f"lan:{reason}")
+
+    def _fresh(self, msg: Dict[str, Any]) -> bool:
+        now = time.time()
+        try:
+            ts = float(msg.get("ts")) / 1000.0
+        except (TypeError, ValueError):
+            return False
+        if abs(now - ts) > self.window:
+            return False
+        nonce = str(msg.get("id") or "")
+        if not nonce or nonce in self._seen:
+            return False
+        if len(self._seen) > 4096:
+            self._seen = {k: v for k, v in self._seen.items() if v > now}
+        self._seen[nonce] = now + 2 * self.window
+        return True
+
+    def handle(self, data: bytes) -> Optional[bytes]:
+        """Un datagramme → réponse signée (None si rejeté sans réponse possible)."""
+        t0 = time.perf_counter()
+        try:
+            body, _ = unpack(data)
+            did = json.loads(body).get("deviceId")
+        except Exception:
+            self._reject("frame")
+            return None
+        key = self.keys.get(did) if isinstance(did, str) else None
+        if key is None:
+            self._reject("device")
+            return None
+        try:
+            msg = verify(key, data)
+        except Exception:
+            self._reject("signature")
+            return None
+        if not self._fresh(msg):
+            self._reject("replay")
+            return pack(key, {"id": msg.get("id"), "ok": False, "reason": "stale or replayed"})
+        payload = msg.get("payload")
+        try:
+            out = self.dispatch(did, str(msg.get("event") or ""), payload if isinstance(payload, dict) else {})
+        except Exception as e:
+            out = {"ok": False, "reason": str(e)}
+        self._lat.observe(time.perf_counter() - t0)
+        return pack(key, {"id": msg.get("id"), **out})
+
+    def serve(self, host: str, port: int) -> bool:
+        """Thread daemon bloqué sur recvfrom (aucun réveil au repos)."""
+        try:
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.bind((host, int(port)))
+        except OSError as e:
+            log.warn("⚠️ LAN: bind %s:%s impossible: %s", host, port, e)
+            return False
+        self._sock = s
+        threading.Thread(target=self._loop, name="aura-lan", daemon=True).start()
+        log.info("📶 Contrôle LAN sur udp://%s:%s (%s device(s))", host, s.getsockname()[1], len(self.keys))
+        return True
+
+    def _loop(self) -> None:
+        s = self._sock
+        while s is not None:
+            try:
+                data, addr = s.recvfrom(MAX_DATAGRAM)
+            except OSError:
+                return   # socket fermée (close)
+            reply = self.handle(data)
+            if reply is not None:
+                try:
+                    s.sendto(reply, addr)
+                except OSError as e:
+                    log.info("ℹ️ LAN réponse %s: %s", addr, e, every=30)
+
+    def close(self) -> None:
+        s, self._sock = self._sock, None
+        if s is not None:
+            try: s.close()
+            except OSError: pass
@@ -1,13 +1,27 @@
 # utils/leds.py
 from __future__ import annotations
-import os, re
+import os, re, time
 from typing import Tuple, Optional
 
-try:
-    from rpi_ws281x import Adafruit_NeoPixel, Color
-    _HAVE_WS281X = True
-except Exception:
-    _HAVE_WS281X = False
+from utils import boot, metrics
+
+# rpi_ws281x chargé à la 1ère instanciation (préchargeable via boot.preload("rpi_ws281x"))
+_HAVE_WS281X = False
+Adafruit_NeoPixel = Color = None
+
+def _load_ws281x() -> bool:
+    global _HAVE_WS281X, Adafruit_NeoPixel, Color
+    if _HAVE_WS281X:
+        return True
+    if os.environ.get("AURA_LEDS_MOCK") == "1":   # bench / dev: force _MockStrip même sur Pi
+        return False
+    try:
+        mod = boot.get("rpi_ws281x")
+        Adafruit_NeoPixel, Color = mod.Adafruit_NeoPixel, mod.Color
+        _HAVE_WS281X = True
+    except Exception:
+        _HAVE_WS281X = False
+    return _HAVE_WS281X
 
 DEFAULT_LED_COUNT = int(os.environ.get("AURA_LED_COUNT", "300"))  # 5m @ 60/m
 DEFAULT_LED_PIN   = int(os.environ.get("AURA_LED_PIN", "18"))     # GPIO18 PWM
@@ -67,9 +81,11 @@ class AuraLEDs:
         self.color_hex = "#FFFFFF"
         # brightness logique 0..100 (ce qu'on remonte/stocke)
         self.brightness_0_100 = 20
+        self._show_h = metrics.histogram("aura_driver_seconds", "Durée des appels pilotes", driver="strip_show")
 
-        if _HAVE_WS281X:
-            self._strip = Adafruit_NeoPixel(count, pin, DEFAULT_FREQ_HZ, DEFAULT_DMA, DEFAULT_INVERT, 255, DEFAULT_CHANNEL)
+        if _load_ws281x():
+            # plusieurs rubans dans un process: un canal PWM (0/1) et un DMA distincts par instance
+            self._strip = Adafruit_NeoPixel(count, pin, freq_hz, dma, invert, 255, channel)
             self._strip.begin()
             hw_pct = _map_logical_to_hw(self.brightness_0_100)
             self._strip.setBrightness(_bmap(hw_pct))
@@ -105,12 +121,30 @@ class AuraLEDs:
         elif name == "aurora": self._preset_gradient((0, 210, 160), (160, 0, 160))
         else: raise ValueError(f"Unknown preset: {name}")
         self.on = True
-        self._strip.show()
+        self._show()
 
     # --- Blackout matériel (ne modifie PAS l'état interne) ---
     def blackout(self):
         self._fill_all((0, 0, 0))
-        self._strip.show()
+        self._show()
+
+    def apply_payload(self, payload: dict):
+        # état complet d'abord, puis un seul show() (et non un par champ)
+        p = payload.get("leds", payload)
+        if "color" in p:
+            _ = _hex_to_rgb(str(p["color"]))  # validation
+        if "on" in p:          self.on = bool(p["on"])
+        if "color" in p:       self.color_hex = f"#{str(p['color']).lstrip('#').upper()}"
+        if "brightness" in p:  self.set_brightness(int(p["brightness"]))
+        else:                  self.apply()
+        if "preset" in p and p["preset"]: self.set_preset(str(p["preset"]))
+
+    # --- Rendu d'une image (fondus): ne modifie PAS l'état logique ---
+    def render(self, rgb: Tuple[int, int, int], brightness_0_100: int):
+        if _HAVE_WS281X:
+            self._strip.setBrightness(_bmap(_map_logical_to_hw(brightness_0_100)))
+        self._fill_all(rgb)
+        self._show()
 
     # --- State ---
     def snapshot(self) -> dict:
@@ -120,12 +154,17 @@ class AuraLEDs:
     def apply(self):
         if not self.on:
             self._fill_all((0, 0, 0))
-            self._strip.show()
+            self._show()
             return
         r, g, b = _hex_to_rgb(self.color_hex)
         # mapping **RGB**
         self._fill_all((r, g, b))
+        self._show()
+
+    def _show(self):
+        t0 = time.perf_counter()
         self._strip.show()
+        self._show_h.observe(time.perf_counter() - t0)
 
     def _fill_all(self, rgb: Tuple[int, int, int]):
         if _HAVE_WS281X:
@@ -151,13 +190,7 @@ def _dev() -> AuraLEDs:
         _SINGLETON = AuraLEDs()
     return _SINGLETON
 
-def apply(payload: dict):
-    p = payload.get("leds", payload)
-    if "on" in p:          _dev().set_on(bool(p["on"]))
-    if "color" in p:       _dev().set_color(str(p["color"]))
-    if "brightness" in p:  _dev().set_brightness(int(p["brightness"]))
-    if "preset" in p and p["preset"]: _dev().set_preset(str(p["preset"]))
-
+def apply(payload: dict): _dev().apply_payload(payload)
 def set_on(v: bool): _dev().set_on(v)
 def set_color(h: str): _dev().set_color(h)
 def set_brightness(v: int): _dev().set_brightness(v)
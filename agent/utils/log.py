@@ -0,0 +1,243 @@
+# utils/log.py
+from __future__ import annotations
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, TextIO, Tuple
+
+DEBUG, INFO, WARN, ERROR = 10, 20, 30, 40
+_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARN: "WARN", ERROR: "ERROR"}
+_BY_NAME = {"debug": DEBUG, "info": INFO, "warn": WARN, "warning": WARN, "error": ERROR}
+
+def _parse_level(v: Any, default: int = INFO) -> int:
+    if isinstance(v, int):
+        return v
+    return _BY_NAME.get(str(v or "").strip().lower(), default)
+
+# AURA_DEBUG=1 (historique) ⇒ niveau debug par défaut
+_level = _parse_level(os.environ.get("AURA_LOG_LEVEL"), DEBUG if os.environ.get("AURA_DEBUG") == "1" else INFO)
+_json  = os.environ.get("AURA_LOG_FORMAT", "text").lower() == "json"
+
+RING_SIZE  = int(os.environ.get("AURA_LOG_RING", "2048"))   # historique pour dump()
+QUEUE_MAX  = 4096                                          # au-delà: on jette les plus anciens
+BATCH_MAX  = 256
+FLUSH_SEC  = 0.5
+
+# Record = (ts, level, logger, fmt, args, fields)
+Record = Tuple[float, int, str, str, tuple, Optional[Dict[str, Any]]]
+
+_ring: Deque[Record] = deque(maxlen=RING_SIZE)
+_queue: Deque[Record] = deque()
+_dropped = 0
+_out: TextIO = sys.stdout
+_wake = threading.Event()      # file passée de vide à non vide
+_urgent = threading.Event()    # WARN+ ou lot plein: pas d'attente de fenêtre
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+# Limitation de débit: clé → [dernier_ts_émis, nb_supprimés]
+_rate: Dict[str, List[float]] = {}
+
+def configure(level: Any = None, fmt: Optional[str] = None, out: Optional[TextIO] = None) -> None:
+    global _level, _json, _out
+    if level is not None:
+        _level = _parse_level(level, _level)
+    if fmt is not None:
+        _json = str(fmt).lower() == "json"
+    if out is not None:
+        _out = out
+
+def enabled(level: int) -> bool:
+    return level >= _level
+
+# ---------- Formatage (fait dans le thread d'écriture) ----------
+def _render_msg(fmt: str, args: tuple) -> str:
+    if not args:
+        return fmt
+    try:
+        return fmt % args
+    except Exception:
+        try:
+            return f"{fmt} {args!r}"
+        except Exception:
+            return f"{fmt} <args non affichables>"
+
+def _format(rec: Record) -> str:
+    ts, lvl, name, fmt, args, fields = rec
+    msg = _render_msg(fmt, args)
+    if _json:
+        import json
+        d: Dict[str, Any] = {"ts": round(ts, 3), "level": _NAMES.get(lvl, str(lvl)), "logger": name, "msg": msg}
+        if fields:
+            d.update(fields)
+        return json.dumps(d, ensure_ascii=False, default=str)
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts)) + f".{int(ts * 1000) % 1000:03d}"
+    line = f"{stamp} {_NAMES.get(lvl, lvl):<5} {name}: {msg}"
+    if fields:
+        line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+    return line
+
+# ---------- Écriture asynchrone par lots ----------
+def _drain(limit: int = BATCH_MAX) -> List[Record]:
+    batch: List[Record] = []
+    try:
+        while len(batch) < limit:
+            batch.append(_queue.popleft())
+    except IndexError:
+        pass
+    return batch
+
+def _write(batch: List[Record]) -> None:
+    global _dropped
+    if not batch:
+        return
+    lines = []
+    for r in batch:
+        try:
+            lines.append(_format(r))
+        except Exception as e:
+            # un record illisible ne doit pas emporter le lot (ni le thread)
+            lines.append(f"{'':23} ERROR log: record non formatable ({type(e).__name__}: {e}) fmt={r[3]!r}")
+    if _dropped:
+        n, _dropped = _dropped, 0
+        lines.insert(0, f"{'':23} WARN  log: {n} records perdus (file pleine)")
+    try:
+        _out.write("\n".join(lines) + "\n")
+        _out.flush()
+    except Exception:
+        try:
+            sys.__stderr__.write(f"aura log: écriture impossible, {len(lines)} lignes perdues\n")
+        except Exception:
+            pass
+
+def _writer_main() -> None:
+    # Au repos le thread dort sans timeout: aucun réveil tant que rien n'est loggé
+    while True:
+        _wake.wait()
+        _wake.clear()
+        _urgent.wait(FLUSH_SEC)   # fenêtre de regroupement
+        _urgent.clear()
+        while _queue:
+            try:
+                _write(_drain())
+            except Exception as e:
+                # le thread d'écriture ne doit jamais mourir (sinon plus aucun log, file pleine)
+                try:
+                    sys.__stderr__.write(f"aura log: lot perdu ({type(e).__name__}: {e})\n")
+                except Exception:
+                    pass
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_main, name="aura-log", daemon=True)
+            _writer.start()
+
+def flush() -> None:
+    """Vide la file de façon synchrone (sortie/arrêt)."""
+    while _queue:
+        _write(_drain())
+
+atexit.register(flush)
+
+def _emit(lvl: int, name: str, fmt: str, args: tuple, fields: Optional[Dict[str, Any]]) -> None:
+    global _dropped
+    rec: Record = (time.time(), lvl, name, fmt, args, fields)
+    _ring.append(rec)
+    if len(_queue) >= QUEUE_MAX:
+        try:
+            _queue.popleft()
+            _dropped += 1
+        except IndexError:
+            pass
+    _queue.append(rec)
+    _ensure_writer()
+    n = len(_queue)
+    if n == 1:
+        _wake.set()
+    if lvl >= WARN or n >= BATCH_MAX:
+        _wake.set()
+        _urgent.set()
+
+def _rate_ok(key: str, every: float) -> Optional[int]:
+    """None ⇒ supprimé ; sinon nombre de messages supprimés depuis la dernière émission."""
+    now = time.monotonic()
+    slot = _rate.get(key)
+    if slot is None:
+        _rate[key] = [now, 0]
+        return 0
+    if now - slot[0] < every:
+        slot[1] += 1
+        return None
+    n = int(slot[1])
+    slot[0], slot[1] = now, 0
+    return n
+
+class Logger:
+    """
+    Logger léger: le niveau est testé avant tout travail, le formatage `fmt % args`
+    est différé au thread d'écriture (ne pas passer d'objets modifiés ensuite).
+    `every=` limite le débit d'un message (clé = fmt, ou `key=`).
+    """
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _log(self, lvl: int, fmt: str, args: tuple, every: Optional[float], key: Optional[str], fields: Dict[str, Any]):
+        if every is not None:
+            n = _rate_ok(key or fmt, every)
+            if n is None:
+                return
+            if n:
+                fields["suppressed"] = n
+        _emit(lvl, self.name, fmt, args, fields or None)
+
+    def debug(self, fmt: str, *args, every: Optional[float] = None, key: Optional[str] = None, **fields):
+        if DEBUG >= _level: self._log(DEBUG, fmt, args, every, key, fields)
+
+    def info(self, fmt: str, *args, every: Optional[float] = None, key: Optional[str] = None, **fields):
+        if INFO >= _level: self._log(INFO, fmt, args, every, key, fields)
+
+    def warn(self, fmt: str, *args, every: Optional[float] = None, key: Optional[str] = None, **fields):
+        if WARN >= _level: self._log(WARN, fmt, args, every, key, fields)
+
+    def error(self, fmt: str, *args, every: Optional[float] = None, key: Optional[str] = None, **fields):
+        if ERROR >= _level: self._log(ERROR, fmt, args, every, key, fields)
+
+_loggers: Dict[str, Logger] = {}
+
+def get(name: str) -> Logger:
+    lg = _loggers.get(name)
+    if lg is None:
+        lg = _loggers[name] = Logger(name)
+    return lg
+
+# ---------- Dump à la demande ----------
+def dump(n: int = 200) -> List[str]:
+    """Les n derniers records (tous niveaux émis), formatés."""
+    n = int(n)
+    if n <= 0:
+        return []
+    out = []
+    for r in list(_ring)[-n:]:
+        try:
+            out.append(_format(r))
+        except Exception as e:
+            out.append(f"record non formatable ({type(e).__name__}) fmt={r[3]!r}")
+    return out
+
+def dump_to(stream: TextIO = sys.stderr, n: int = 200) -> None:
+    try:
+        stream.write(f"----- aura log dump ({n} derniers) -----\n")
+        stream.write("\n".join(dump(n)) + "\n")
+        stream.write("----- fin dump -----\n")
+        stream.flush()
+    except Exception:
+        pass
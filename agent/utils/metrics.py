@@ -0,0 +1,223 @@
+# utils/metrics.py
+from __future__ import annotations
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import log as _logmod
+
+log = _logmod.get("metrics")
+
+# Bornes (secondes) adaptées aux chemins de l'agent: de 100µs (emit) à 10s (REST en timeout)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Counter:
+    __slots__ = ("value", "_lock")
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value += n
+
+class Gauge:
+    __slots__ = ("value",)
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, v: float) -> None:
+        self.value = float(v)
+
+class Histogram:
+    """
+    Histogramme à bornes fixes: observe() = bisect + 3 incréments sous verrou
+    (~0.3–0.5 µs sur un Pi 4), donc actif en permanence en production.
+    """
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+    kind = "histogram"
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # dernier = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, v: float) -> None:
+        i = bisect_left(self.bounds, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimation par borne supérieure du bucket (suffisant pour un résumé)."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * total
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+        return self.bounds[-1]
+
+# ---------- Registre ----------
+_registry: Dict[Tuple[str, Labels], Any] = {}
+_help: Dict[str, str] = {}
+_reg_lock = threading.Lock()
+
+def _get(cls, name: str, labels: Dict[str, Any], help: Optional[str]):
+    if len(labels) == 1:
+        (k, v), = labels.items()
+        key = (name, ((k, str(v)),))
+    else:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    m = _registry.get(key)
+    if m is None:
+        with _reg_lock:
+            m = _registry.get(key)
+            if m is None:
+                m = _registry[key] = cls()
+                if help:
+                    _help.setdefault(name, help)
+    return m
+
+def counter(name: str, help: Optional[str] = None, **labels) -> Counter:
+    return _get(Counter, name, labels, help)
+
+def gauge(name: str, help: Optional[str] = None, **labels) -> Gauge:
+    return _get(Gauge, name, labels, help)
+
+def histogram(name: str, help: Optional[str] = None, **labels) -> Histogram:
+    return _get(Histogram, name, labels, help)
+
+def timed(name: str, help: Optional[str] = None, **labels) -> Callable:
+    """
+    Décorateur: histogramme de durée + compteur `<name>_errors_total` si exception.
+    Les métriques sont résolues une fois, à la décoration (pas de lookup par appel).
+    """
+    base = name[:-len("_seconds")] if name.endswith("_seconds") else name
+    def deco(fn: Callable) -> Callable:
+        h = histogram(name, help, **labels)
+        err = counter(f"{base}_errors_total", None, **labels)
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            except BaseException:
+                err.inc()
+                raise
+            finally:
+                h.observe(time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+# ---------- Export ----------
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in items) + "}"
+
+def _esc(v: str, quote: bool = True) -> str:
+    # format texte Prometheus: \ et saut de ligne échappés (et " dans les valeurs de labels)
+    v = str(v).replace("\\", "\\\\").replace("\n", "\\n")
+    return v.replace('"', '\\"') if quote else v
+
+def _fmt_num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+def render_prometheus() -> str:
+    """Format texte Prometheus 0.0.4."""
+    by_name: Dict[str, List[Tuple[Labels, Any]]] = {}
+    for (name, labels), m in list(_registry.items()):
+        by_name.setdefault(name, []).append((labels, m))
+    out: List[str] = []
+    for name in sorted(by_name):
+        series = by_name[name]
+        if name in _help:
+            out.append(f"# HELP {name} {_esc(_help[name], quote=False)}")
+        out.append(f"# TYPE {name} {series[0][1].kind}")
+        for labels, m in sorted(series, key=lambda s: s[0]):
+            if isinstance(m, Histogram):
+                with m._lock:
+                    counts, s, n = list(m.counts), m.sum, m.count
+                acc = 0
+                for i, b in enumerate(m.bounds):
+                    acc += counts[i]
+                    out.append(f"{name}_bucket{_fmt_labels(labels, ('le', repr(b)))} {acc}")
+                out.append(f"{name}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {n}")
+                out.append(f"{name}_sum{_fmt_labels(labels)} {s!r}")
+                out.append(f"{name}_count{_fmt_labels(labels)} {n}")
+            else:
+                out.append(f"{name}{_fmt_labels(labels)} {_fmt_num(m.value)}")
+    return "\n".join(out) + "\n"
+
+def summary() -> Dict[str, Any]:
+    """Résumé compact pour le heartbeat: compteurs/gauges bruts, histogrammes n/avg/p50/p95 (ms)."""
+    out: Dict[str, Any] = {}
+    for (name, labels), m in list(_registry.items()):
+        key = name + ("[" + ",".join(v for _, v in labels) + "]" if labels else "")
+        if isinstance(m, Histogram):
+            if not m.count:
+                continue
+            p50, p95 = m.quantile(0.5), m.quantile(0.95)
+            out[key] = {
+                "n": m.count,
+                "avgMs": round(m.sum / m.count * 1000, 2),
+                "p50Ms": round((p50 or 0) * 1000, 2),
+                "p95Ms": round((p95 or 0) * 1000, 2),
+            }
+        elif m.value:
+            out[key] = m.value
+    return out
+
+# ---------- Endpoint HTTP local ----------
+_server = None
+
+def serve(port: int, host: str = "127.0.0.1") -> bool:
+    """Expose /metrics (Prometheus) sur host:port dans un thread daemon. port<=0 ⇒ désactivé."""
+    global _server
+    if port <= 0 or _server is not None:
+        return False
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            pass
+
+    try:
+        _server = ThreadingHTTPServer((host, int(port)), _Handler)
+    except OSError as e:
+        log.warn("⚠️ metrics: bind %s:%s impossible: %s", host, port, e)
+        return False
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="aura-metrics", daemon=True).start()
+    log.info("📈 metrics sur http://%s:%s/metrics", host, port)
+    return True
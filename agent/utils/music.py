@@ -3,34 +3,44 @@ import os
 import re
 import shutil
 import subprocess
-from typing import Optional, Dict, Any, List
+import threading
+import time
+from typing import Callable, Optional, Dict, Any, List, Tuple
 
-# État logique local. NE PAS forcer 40% par défaut (évite l'effet "il force à 40 au boot")
-_state: Dict[str, Any] = {"status": "pause", "volume": None, "track": None}
+from utils import log as _logmod, metrics
+
+log = _logmod.get("music")
 
 _PCT = re.compile(r"(\d+)%")
 
 # overrides possibles
 _PULSE_SINK_ENV = os.environ.get("AURA_PULSE_SINK")   # ex: "alsa_output.usb-...iec958-stereo"
-_DEBUG          = os.environ.get("AURA_DEBUG") == "1"
+_AUDIO_USER     = os.environ.get("AURA_AUDIO_USER", "melvin")  # "" ⇒ pas de runuser (bench, session user)
 
 def _which(cmd: str) -> Optional[str]:
     return shutil.which(cmd)
 
-def _log(msg: str):
-    if _DEBUG:
-        print(msg)
+_driver_h: Dict[str, metrics.Histogram] = {}
 
 def _run(cmd: List[str], env: Optional[dict] = None) -> tuple[int, str, str]:
-    _log(f"🟪 RUN: {' '.join(cmd)}  ENV.XDG_RUNTIME_DIR={env.get('XDG_RUNTIME_DIR') if env else None}")
+    if _logmod.enabled(_logmod.DEBUG):
+        log.debug("🟪 RUN: %s  ENV.XDG_RUNTIME_DIR=%s", " ".join(cmd), env.get("XDG_RUNTIME_DIR") if env else None)
+    tool = os.path.basename(cmd[cmd.index("--") + 1] if "--" in cmd else cmd[0])
+    t0 = time.perf_counter()
     try:
         p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False, text=True, env=env)
+        h = _driver_h.get(tool)
+        if h is None:
+            h = _driver_h[tool] = metrics.histogram("aura_driver_seconds", "Durée des appels pilotes", driver=tool)
+        h.observe(time.perf_counter() - t0)
         out = (p.stdout or "").strip()
         err = (p.stderr or "").strip()
-        _log(f"🟪 OUT: {out}")
-        _log(f"🟪 ERR: {err}")
+        log.debug("🟪 OUT: %s", out)
+        if err:
+            log.debug("🟪 ERR: %s", err)
         return p.returncode, out, err
     except Exception as e:
+        metrics.counter("aura_driver_errors_total", "Échecs de lancement pilotes", driver=tool).inc()
         return 1, "", str(e)
 
 def _session_env_for_user() -> dict:
@@ -41,137 +51,240 @@ def _session_env_for_user() -> dict:
         return env
     return os.environ.copy()
 
-def _run_as_melvin(cmd: List[str]) -> tuple[int, str, str]:
-    if os.geteuid() == 0:
-        base = ["runuser", "-u", "melvin", "--"]
-        return _run(base + cmd, env=_session_env_for_user())
-    else:
-        return _run(cmd, env=_session_env_for_user())
-
-# --------- Résolution du sink ----------
-_sink_cache: Optional[str] = None
+def _as_melvin(cmd: List[str]) -> List[str]:
+    return ["runuser", "-u", _AUDIO_USER, "--"] + cmd if os.geteuid() == 0 and _AUDIO_USER else cmd
 
-def _resolve_sink() -> str:
-    global _sink_cache
-    if _sink_cache:
-        return _sink_cache
+def _run_as_melvin(cmd: List[str]) -> tuple[int, str, str]:
+    return _run(_as_melvin(cmd), env=_session_env_for_user())
 
-    if _PULSE_SINK_ENV:
-        _sink_cache = _PULSE_SINK_ENV
-        _log(f"🎯 SINK (env): {_sink_cache}")
-        return _sink_cache
+# --------- Surveillance des sinks (pactl subscribe) ----------
+# Un seul `pactl subscribe` pour tout le process: chaque "Event 'change' on sink #N" réveille les
+# abonnés (qui relisent leur sink) ; pas de polling au repos. Relancé s'il meurt (Pulse redémarré) ;
+# tant qu'il ne tourne pas, les abonnés en sont prévenus (à eux de poller en attendant).
+WATCH_RETRY_SEC = 5.0
+WATCH_UP_SEC = 0.5          # subscribe encore vivant après ce délai ⇒ considéré démarré
+_watchers: List[Tuple[Callable[[], None], Callable[[bool], None]]] = []
+_watch_down: Optional[bool] = None
+_watch_lock = threading.Lock()
+_watch_proc: Optional[subprocess.Popen] = None
+_watch_thread: Optional[threading.Thread] = None
+_watch_stop = threading.Event()
 
-    pc = _which("pactl")
-    if pc:
-        # Essaye d'abord get-default-sink (PipeWire/Pulse récents)
-        rc, out, _ = _run_as_melvin([pc, "get-default-sink"])
-        if rc == 0 and out:
-            _sink_cache = out.splitlines()[0].strip()
-            _log(f"🎯 SINK (get-default-sink): {_sink_cache}")
-            return _sink_cache
-    # Fallback
-    _sink_cache = "@DEFAULT_SINK@"
-    _log(f"🎯 SINK (fallback): {_sink_cache}")
-    return _sink_cache
-
-# --------- PULSE (pactl) ----------
-def _pactl_set_volume(pct: int) -> bool:
-    pct = max(0, min(100, int(pct)))
+def watch(on_change: Callable[[], None], on_down: Callable[[bool], None]) -> bool:
+    """
+    on_change() à chaque changement de sink ; on_down(True) quand `pactl subscribe` ne tourne pas,
+    on_down(False) quand il (re)démarre (thread de surveillance). False sans pactl: rien à surveiller.
+    """
+    global _watch_thread
     pc = _which("pactl")
     if not pc:
-        _log("❌ pactl introuvable")
         return False
-    sink = _resolve_sink()
-    rc, _, _ = _run_as_melvin([pc, "set-sink-volume", sink, f"{pct}%"])
-    return rc == 0
+    with _watch_lock:
+        _watchers.append((on_change, on_down))
+        down = _watch_down
+        if _watch_thread is None:
+            _watch_thread = threading.Thread(target=_watch_main, args=(pc,), name="aura-sink-watch", daemon=True)
+            _watch_thread.start()
+    if down is not None:
+        on_down(down)
+    return True
 
-def _pactl_get_volume() -> Optional[int]:
-    pc = _which("pactl")
-    if not pc:
-        _log("❌ pactl introuvable")
-        return None
-    sink = _resolve_sink()
-    # get-sink-volume marche aussi avec @DEFAULT_SINK@ ou un nom.
-    rc, out, _ = _run_as_melvin([pc, "get-sink-volume", sink])
-    if rc != 0 or not out:
-        return None
-    m = _PCT.search(out)
-    if not m:
-        return None
-    return max(0, min(100, int(m.group(1))))
-
-# --------- playerctl (MPRIS) ----------
-def _playerctl(args: List[str]) -> bool:
-    pc = _which("playerctl")
-    if not pc:
-        _log("ℹ️ playerctl introuvable")
-        return False
-    rc, _, _ = _run_as_melvin([pc] + args)
-    return rc == 0
+def unwatch() -> None:
+    _watch_stop.set()
+    p = _watch_proc
+    if p is not None and p.poll() is None:
+        p.terminate()
 
-# ----------------- API publique -----------------
-def get_state() -> Dict[str, Any]:
-    """
-    Lit *toujours* le volume réel. Ne remonte pas un 40% fantôme :
-    si la lecture OS échoue → on laisse volume tel quel (peut être None).
-    """
-    v = _pactl_get_volume()
-    if v is not None:
-        _state["volume"] = v
-    return dict(_state)
+def _notify_watchers(down: Optional[bool] = None) -> None:
+    global _watch_down
+    with _watch_lock:
+        if down is not None:
+            if down == _watch_down:
+                return
+            _watch_down = down
+        fns = list(_watchers)
+    for on_change, on_down in fns:
+        try:
+            if down is None:
+                on_change()
+            else:
+                on_down(down)
+        except Exception as e:
+            log.info("ℹ️ sink watch callback: %s", e, every=30)
 
-def set_volume(value: int) -> Dict[str, Any]:
+def _watch_main(pc: str) -> None:
+    global _watch_proc
+    events = metrics.counter("aura_sink_events_total", "Changements de sink signalés par pactl subscribe")
+    while not _watch_stop.is_set():
+        try:
+            _watch_proc = subprocess.Popen(_as_melvin([pc, "subscribe"]), stdout=subprocess.PIPE,
+                                           stderr=subprocess.DEVNULL, text=True, env=_session_env_for_user())
+            try:
+                _watch_proc.wait(WATCH_UP_SEC)   # sorti tout de suite (pas de serveur Pulse): toujours en panne
+            except subprocess.TimeoutExpired:
+                _notify_watchers(down=False)
+                _notify_watchers()   # (re)démarrage: changements faits pendant l'absence
+                for line in _watch_proc.stdout:
+                    if " on sink #" in line and "'change'" in line:
+                        events.inc()
+                        _notify_watchers()
+                _watch_proc.wait()
+        except Exception as e:
+            log.warn("⚠️ pactl subscribe: %s", e, every=300)
+        if _watch_stop.is_set():
+            break
+        _notify_watchers(down=True)
+        if _watch_stop.wait(WATCH_RETRY_SEC):
+            break
+        metrics.counter("aura_sink_watch_restarts_total", "Relances de pactl subscribe").inc()
+        log.info("ℹ️ pactl subscribe terminé, relance", every=300)
+
+class Sink:
     """
-    Applique et vérifie immédiatement. Journalise la divergence si le sink n’atteint pas la valeur.
+    Un sink Pulse/PipeWire (+ lecteur MPRIS optionnel) et son état logique.
+    Une instance par device ; `sink=None` ⇒ sink par défaut de la session.
     """
-    want = max(0, min(100, int(value)))
-    ok = _pactl_set_volume(want)
-    real = _pactl_get_volume()
 
-    if real is not None:
-        _state["volume"] = real
+    def __init__(self, sink: Optional[str] = None, player: Optional[str] = None):
+        self._sink_override = sink
+        self._player = player
+        self._sink_cache: Optional[str] = None
+        # État logique local. NE PAS forcer 40% par défaut (évite l'effet "il force à 40 au boot")
+        self._state: Dict[str, Any] = {"status": "pause", "volume": None, "track": None}
 
-    if not ok:
-        _log(f"⚠️ pactl set-sink-volume a retourné une erreur pour {want}%")
+    # --------- Résolution du sink ----------
+    def _resolve_sink(self) -> str:
+        if self._sink_cache:
+            return self._sink_cache
 
-    if real is None:
-        _log("⚠️ lecture volume après set a échoué (real=None)")
-    elif real != want:
-        _log(f"⚠️ divergence: demandé={want}% ; réel={real}%")
+        if self._sink_override:
+            self._sink_cache = self._sink_override
+            log.info("🎯 SINK (config/env): %s", self._sink_cache)
+            return self._sink_cache
 
-    return get_state()
+        pc = _which("pactl")
+        if pc:
+            # Essaye d'abord get-default-sink (PipeWire/Pulse récents)
+            rc, out, _ = _run_as_melvin([pc, "get-default-sink"])
+            if rc == 0 and out:
+                self._sink_cache = out.splitlines()[0].strip()
+                log.info("🎯 SINK (get-default-sink): %s", self._sink_cache)
+                return self._sink_cache
+        # Fallback
+        self._sink_cache = "@DEFAULT_SINK@"
+        log.info("🎯 SINK (fallback): %s", self._sink_cache)
+        return self._sink_cache
 
-def play() -> Dict[str, Any]:
-    if _playerctl(["play"]):
-        _state["status"] = "play"
-    return get_state()
+    # --------- PULSE (pactl) ----------
+    def _pactl_set_volume(self, pct: int) -> bool:
+        pct = max(0, min(100, int(pct)))
+        pc = _which("pactl")
+        if not pc:
+            log.warn("❌ pactl introuvable", every=300)
+            return False
+        sink = self._resolve_sink()
+        rc, _, _ = _run_as_melvin([pc, "set-sink-volume", sink, f"{pct}%"])
+        return rc == 0
 
-def pause() -> Dict[str, Any]:
-    if _playerctl(["pause"]):
-        _state["status"] = "pause"
-    return get_state()
+    def _pactl_get_volume(self) -> Optional[int]:
+        pc = _which("pactl")
+        if not pc:
+            log.warn("❌ pactl introuvable", every=300)
+            return None
+        sink = self._resolve_sink()
+        # get-sink-volume marche aussi avec @DEFAULT_SINK@ ou un nom.
+        rc, out, _ = _run_as_melvin([pc, "get-sink-volume", sink])
+        if rc != 0 or not out:
+            return None
+        m = _PCT.search(out)
+        if not m:
+            return None
+        return max(0, min(100, int(m.group(1))))
 
-def next_track() -> Dict[str, Any]:
-    _playerctl(["next"])
-    return get_state()
+    # --------- playerctl (MPRIS) ----------
+    def _playerctl(self, args: List[str]) -> bool:
+        pc = _which("playerctl")
+        if not pc:
+            log.info("ℹ️ playerctl introuvable", every=300)
+            return False
+        base = [pc, f"--player={self._player}"] if self._player else [pc]
+        rc, _, _ = _run_as_melvin(base + args)
+        return rc == 0
 
-def prev_track() -> Dict[str, Any]:
-    _playerctl(["previous"])
-    return get_state()
+    # ----------------- API publique -----------------
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Lit *toujours* le volume réel. Ne remonte pas un 40% fantôme :
+        si la lecture OS échoue → on laisse volume tel quel (peut être None).
+        """
+        v = self._pactl_get_volume()
+        if v is not None:
+            self._state["volume"] = v
+        return dict(self._state)
 
-def apply(payload: Dict[str, Any]) -> Dict[str, Any]:
-    if "volume" in payload:
-        try:
-            return set_volume(int(payload["volume"]))
-        except Exception:
-            # si c'est une string genre "42" ou "42.0"
-            v = str(payload["volume"]).strip()
-            v = int(float(v))
-            return set_volume(v)
-
-    action = (str(payload.get("action") or "")).lower()
-    if action == "play":  return play()
-    if action == "pause": return pause()
-    if action == "next":  return next_track()
-    if action == "prev":  return prev_track()
-    return get_state()
+    def set_volume(self, value: int) -> Dict[str, Any]:
+        """
+        Applique et vérifie immédiatement. Journalise la divergence si le sink n’atteint pas la valeur.
+        """
+        want = max(0, min(100, int(value)))
+        ok = self._pactl_set_volume(want)
+        real = self._pactl_get_volume()
+
+        if real is not None:
+            self._state["volume"] = real
+
+        if not ok:
+            log.warn("⚠️ pactl set-sink-volume a retourné une erreur pour %s%%", want, every=30)
+
+        if real is None:
+            log.warn("⚠️ lecture volume après set a échoué (real=None)", every=30)
+        elif real != want:
+            log.warn("⚠️ divergence: demandé=%s%% ; réel=%s%%", want, real)
+
+        return self.get_state()
+
+    def play(self) -> Dict[str, Any]:
+        if self._playerctl(["play"]):
+            self._state["status"] = "play"
+        return self.get_state()
+
+    def pause(self) -> Dict[str, Any]:
+        if self._playerctl(["pause"]):
+            self._state["status"] = "pause"
+        return self.get_state()
+
+    def next_track(self) -> Dict[str, Any]:
+        self._playerctl(["next"])
+        return self.get_state()
+
+    def prev_track(self) -> Dict[str, Any]:
+        self._playerctl(["previous"])
+        return self.get_state()
+
+    def apply(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if "volume" in payload:
+            try:
+                return self.set_volume(int(payload["volume"]))
+            except Exception:
+                # si c'est une string genre "42" ou "42.0"
+                v = str(payload["volume"]).strip()
+                v = int(float(v))
+                return self.set_volume(v)
+
+        action = (str(payload.get("action") or "")).lower()
+        if action == "play":  return self.play()
+        if action == "pause": return self.pause()
+        if action == "next":  return self.next_track()
+        if action == "prev":  return self.prev_track()
+        return self.get_state()
+
+# --- Instance par défaut (agent mono-device, AURA_PULSE_SINK) + helpers ---
+_DEFAULT = Sink(_PULSE_SINK_ENV)
+
+def get_state() -> Dict[str, Any]: return _DEFAULT.get_state()
+def set_volume(value: int) -> Dict[str, Any]: return _DEFAULT.set_volume(value)
+def play() -> Dict[str, Any]: return _DEFAULT.play()
+def pause() -> Dict[str, Any]: return _DEFAULT.pause()
+def next_track() -> Dict[str, Any]: return _DEFAULT.next_track()
+def prev_track() -> Dict[str, Any]: return _DEFAULT.prev_track()
+def apply(payload: Dict[str, Any]) -> Dict[str, Any]: return _DEFAULT.apply(payload)
@@ -0,0 +1,82 @@
+# utils/persist.py
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils import log as _logmod, metrics
+
+log = _logmod.get("persist")
+
+# Dernier état appliqué, sur disque, pour rallumer le ruban au boot sans attendre le réseau.
+# Écriture atomique: fichier temporaire + fsync + os.replace (+ fsync du dossier).
+# La coalescence (une écriture pour N changements) est faite par l'appelant (scheduler);
+# ici on évite en plus de réécrire un contenu identique au dernier écrit.
+
+_writes = metrics.counter("aura_persist_writes_total", "Écritures des fichiers d'état")
+_write_h = metrics.histogram("aura_persist_seconds", "Durée d'écriture d'un fichier d'état")
+
+class StateFile:
+    """Un fichier d'état (un par device)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = str(path) if path else None
+        self._last_written: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """L'état persisté, ou None (absent, illisible, tronqué)."""
+        if self.path is None:
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                text = f.read()
+            data = json.loads(text)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warn("⚠️ état persisté illisible (%s): %s", self.path, e)
+            return None
+        if not isinstance(data, dict):
+            return None
+        self._last_written = text
+        return data
+
+    def save(self, data: Dict[str, Any]) -> bool:
+        """Écrit `data` de façon atomique. False si rien à faire (identique) ou échec."""
+        if self.path is None:
+            return False
+        text = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        with self._lock:
+            if text == self._last_written:
+                return False
+            t0 = time.perf_counter()
+            try:
+                d = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(d, exist_ok=True)
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+                try:
+                    fd = os.open(d, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    pass
+            except Exception as e:
+                log.warn("⚠️ persistance état: %s", e, every=60)
+                return False
+            self._last_written = text
+            _writes.inc()
+            _write_h.observe(time.perf_counter() - t0)
+        return True
@@ -0,0 +1,168 @@
+# utils/profiler.py
+from __future__ import annotations
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from typing import Any, Dict, List, Optional
+
+from utils import log as _logmod
+
+log = _logmod.get("profiler")
+
+# Réglages (écrasés par configure()). Rien ne tourne tant qu'aucune session n'est lancée.
+_cfg: Dict[str, Any] = {
+    "dir": "profiles",
+    "duration": 30.0,      # s
+    "hz": 100,             # échantillons / s
+    "alloc": False,        # diff tracemalloc début/fin de session
+    "keep": 10,            # sessions conservées
+    "max_bytes": 20 * 1024 * 1024,
+}
+
+_lock = threading.Lock()
+_active: Optional[threading.Thread] = None
+
+def configure(**kw) -> None:
+    for k, v in kw.items():
+        if k in _cfg and v is not None:
+            _cfg[k] = type(_cfg[k])(v)
+
+def running() -> bool:
+    return _active is not None
+
+# ---------- Échantillonnage ----------
+def _frame_label(f) -> str:
+    co = f.f_code
+    return f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})"
+
+def _sample(stacks: _Counter, me: int, names: Dict[int, str]) -> None:
+    for tid, frame in sys._current_frames().items():
+        if tid == me:
+            continue
+        parts: List[str] = []
+        f = frame
+        while f is not None:
+            parts.append(_frame_label(f))
+            f = f.f_back
+        parts.append(names.get(tid) or f"thread-{tid}")
+        parts.reverse()
+        stacks[";".join(parts)] += 1
+
+def _run(duration: float, hz: int, alloc: bool) -> None:
+    global _active
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    base = os.path.join(_cfg["dir"], f"aura-{stamp}-{os.getpid()}")
+    snap0 = None
+    started_tm = False
+    try:
+        os.makedirs(_cfg["dir"], exist_ok=True)
+        if alloc:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(16)
+                started_tm = True
+            snap0 = tracemalloc.take_snapshot()
+
+        stacks: _Counter = _Counter()
+        me = threading.get_ident()
+        period = 1.0 / max(1, hz)
+        end = time.monotonic() + duration
+        n = 0
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                break
+            names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            _sample(stacks, me, names)
+            n += 1
+            time.sleep(max(0.0, min(period, end - time.monotonic())))
+
+        _write_atomic(base + ".collapsed", "".join(f"{k} {v}\n" for k, v in stacks.most_common()))
+        log.info("🔥 profil écrit: %s.collapsed (%s échantillons, %s piles)", base, n, len(stacks))
+
+        if snap0 is not None:
+            import tracemalloc
+            snap1 = tracemalloc.take_snapshot()
+            diff = snap1.compare_to(snap0, "lineno")
+            lines = [f"# tracemalloc diff {duration:.0f}s — top 50 (taille, delta)"]
+            lines += [str(d) for d in diff[:50]]
+            cur, peak = tracemalloc.get_traced_memory()
+            lines.append(f"# traced current={cur} peak={peak}")
+            _write_atomic(base + ".alloc.txt", "\n".join(lines) + "\n")
+            log.info("🧠 diff allocations écrit: %s.alloc.txt", base)
+    except Exception as e:
+        log.warn("⚠️ profiler: %s", e)
+    finally:
+        if started_tm:
+            import tracemalloc
+            tracemalloc.stop()
+        _rotate()
+        with _lock:
+            _active = None
+
+def _write_atomic(path: str, data: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _rotate() -> None:
+    """Garde les `keep` sessions les plus récentes et au plus `max_bytes` au total."""
+    d = _cfg["dir"]
+    try:
+        files = [os.path.join(d, n) for n in os.listdir(d) if n.startswith("aura-") and not n.endswith(".tmp")]
+    except FileNotFoundError:
+        return
+    files.sort(key=lambda p: os.path.getmtime(p), reverse=True)
+    sessions: List[str] = []
+    total = 0
+    for p in files:
+        sess = os.path.basename(p).split(".", 1)[0]
+        if sess not in sessions:
+            sessions.append(sess)
+        total += os.path.getsize(p)
+        if len(sessions) > _cfg["keep"] or total > _cfg["max_bytes"]:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+# ---------- API ----------
+def _bounded(v: Any, default: float, lo: float, hi: float, name: str) -> float:
+    x = default if v is None else v
+    try:
+        if isinstance(x, bool):
+            raise TypeError
+        x = float(x)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid {name}: {v!r}")
+    if x != x:   # NaN
+        raise ValueError(f"invalid {name}: {v!r}")
+    return max(lo, min(hi, x))
+
+def start(duration: Optional[float] = None, hz: Optional[int] = None, alloc: Optional[bool] = None) -> bool:
+    """
+    Lance une session bornée dans un thread daemon. False si une session tourne déjà.
+    Durée et fréquence sont ramenées dans [1, 600] s et [1, 1000] Hz ; ValueError si non numériques.
+    """
+    global _active
+    dur = _bounded(duration, _cfg["duration"], 1.0, 600.0, "durationSec")
+    rate = int(_bounded(hz, _cfg["hz"], 1, 1000, "hz"))
+    al = bool(_cfg["alloc"] if alloc is None else alloc)
+    with _lock:
+        if _active is not None:
+            return False
+        _active = threading.Thread(target=_run, args=(dur, rate, al), name="aura-profiler", daemon=True)
+        _active.start()
+    log.info("🔥 profiler démarré: %ss @ %sHz alloc=%s", dur, rate, al)
+    return True
+
+def install(signum: Optional[int] = None) -> None:
+    """Arme le déclenchement par signal (SIGUSR1 par défaut). Coût nul hors session."""
+    sig = signum if signum is not None else getattr(signal, "SIGUSR1", None)
+    if sig is None:
+        return
+    signal.signal(sig, lambda *_: start())
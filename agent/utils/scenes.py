@@ -0,0 +1,107 @@
+# utils/scenes.py
+from __future__ import annotations
+import datetime as _dt
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Scènes programmées, exécutées sur le device (sans le hub). Une scène:
+#   {"id": "sunrise", "at": "07:00", "days": ["mon", "tue"], "leds": {...}, "fadeSec": 1800,
+#    "music": {"action": "pause"} | {"volume": 20}, "missed": "catchup", "maxLateSec": 3600}
+# "at": "HH:MM[:SS]" (heure locale, tous les jours ou `days`) ou date ISO (une seule fois).
+# missed: "skip" (défaut) = occurrence manquée (agent arrêté, horloge avancée) ignorée ;
+#         "catchup" = rejouée au retour si le retard <= maxLateSec (un fondu reprend en cours).
+
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+POLICIES = ("skip", "catchup")
+_HHMM = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+
+class Scene:
+    __slots__ = ("id", "at", "daily", "days", "once", "leds", "fade", "music", "missed", "max_late", "raw")
+
+    def __init__(self, raw: Dict[str, Any]):
+        if not isinstance(raw, dict):
+            raise ValueError("scene must be an object")
+        self.raw = raw
+        self.id = str(raw.get("id") or "").strip()
+        if not self.id:
+            raise ValueError("scene without id")
+        at = str(raw.get("at") or "").strip()
+        self.at = at
+        m = _HHMM.match(at)
+        self.daily: Optional[Tuple[int, int, int]] = None
+        self.once: Optional[float] = None
+        if m:
+            h, mi, s = int(m.group(1)), int(m.group(2)), int(m.group(3) or 0)
+            if h > 23 or mi > 59 or s > 59:
+                raise ValueError(f"{self.id}: bad time {at!r}")
+            self.daily = (h, mi, s)
+        else:
+            try:
+                self.once = _dt.datetime.fromisoformat(at).timestamp()   # naïve ⇒ heure locale
+            except ValueError:
+                raise ValueError(f"{self.id}: bad 'at' {at!r} (HH:MM[:SS] or ISO date)")
+        days = raw.get("days") or DAYS
+        self.days = {DAYS.index(str(x).lower()[:3]) for x in days if str(x).lower()[:3] in DAYS}
+        if not self.days:
+            raise ValueError(f"{self.id}: no valid day")
+        self.leds = raw.get("leds") if isinstance(raw.get("leds"), dict) else None
+        self.music = raw.get("music") if isinstance(raw.get("music"), dict) else None
+        if self.leds is None and self.music is None:
+            raise ValueError(f"{self.id}: nothing to do (leds|music)")
+        self.fade = max(0.0, float(raw.get("fadeSec") or 0))
+        self.missed = str(raw.get("missed") or "skip").lower()
+        if self.missed not in POLICIES:
+            raise ValueError(f"{self.id}: missed must be one of {POLICIES}")
+        self.max_late = max(0.0, float(raw.get("maxLateSec", 3600)))
+
+    def _at_day(self, day: _dt.date) -> Optional[float]:
+        if day.weekday() not in self.days:
+            return None
+        h, mi, s = self.daily
+        # mktime: heure locale, changements d'heure compris
+        return time.mktime((day.year, day.month, day.day, h, mi, s, 0, 0, -1))
+
+    def next_after(self, t: float) -> Optional[float]:
+        """Première occurrence strictement après t (epoch)."""
+        if self.once is not None:
+            return self.once if self.once > t else None
+        day = _dt.date.fromtimestamp(t)
+        for k in range(0, 9):
+            at = self._at_day(day + _dt.timedelta(days=k))
+            if at is not None and at > t:
+                return at
+        return None
+
+    def last_before(self, t: float) -> Optional[float]:
+        """Dernière occurrence <= t (epoch)."""
+        if self.once is not None:
+            return self.once if self.once <= t else None
+        day = _dt.date.fromtimestamp(t)
+        for k in range(0, 9):
+            at = self._at_day(day - _dt.timedelta(days=k))
+            if at is not None and at <= t:
+                return at
+        return None
+
+def parse(items: Any) -> List[Scene]:
+    """Liste brute → scènes validées (ValueError au premier défaut, ids uniques)."""
+    if not isinstance(items, list):
+        raise ValueError("scenes must be a list")
+    out = [Scene(x) for x in items]
+    ids = [s.id for s in out]
+    if len(set(ids)) != len(ids):
+        raise ValueError("duplicate scene id")
+    return out
+
+# ---------- Fondus ----------
+def hex_to_rgb(h: str) -> Tuple[int, int, int]:
+    h = h.lstrip("#")
+    return int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
+
+def lerp(a: Tuple[int, ...], b: Tuple[int, ...], p: float) -> Tuple[int, ...]:
+    return tuple(int(round(x + (y - x) * p)) for x, y in zip(a, b))
+
+def fade_levels(a: Tuple[int, ...], b: Tuple[int, ...]) -> int:
+    """Nombre de niveaux distincts entre deux images: au-delà, une image de plus ne change rien."""
+    return max(1, max(abs(y - x) for x, y in zip(a, b)))
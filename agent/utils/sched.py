@@ -0,0 +1,143 @@
+# utils/sched.py
+from __future__ import annotations
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils import log as _logmod, metrics
+
+log = _logmod.get("sched")
+
+class Task:
+    __slots__ = ("name", "fn", "interval", "deadline", "when", "cancelled", "_late_h", "_run_h", "_skip_c")
+
+    def __init__(self, name: str, fn: Callable[[], None], interval: Optional[float],
+                 deadline: float, when: Optional[Callable[[], bool]]):
+        self.name = name
+        self.fn = fn
+        self.interval = interval          # None ⇒ one-shot
+        self.deadline = deadline
+        self.when = when                  # garde: si False à l'échéance, on saute ce tour
+        self.cancelled = False
+        self._late_h = metrics.histogram("aura_sched_lateness_seconds", "Retard au démarrage des tâches", task=name)
+        self._run_h = metrics.histogram("aura_sched_runtime_seconds", "Durée d'exécution des tâches", task=name)
+        self._skip_c = metrics.counter("aura_sched_skipped_total", "Échéances sautées (overrun)", task=name)
+
+class Scheduler:
+    """
+    Tas d'échéances (horloge monotone) exécuté par un seul thread: on dort jusqu'à la
+    prochaine échéance ; once()/every()/postpone() depuis un autre thread (handlers socket) le réveillent.
+    Pas de rattrapage: une tâche en retard d'une période ou plus saute les tours manqués.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Task]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._tasks: Dict[str, Task] = {}
+        self._wakeups = metrics.counter("aura_sched_wakeups_total", "Réveils du thread scheduler")
+
+    # ---------- enregistrement ----------
+    def _push(self, t: Task) -> None:
+        heapq.heappush(self._heap, (t.deadline, next(self._seq), t))
+
+    def every(self, name: str, interval: float, fn: Callable[[], None], *, first: float = 0.0,
+              when: Optional[Callable[[], bool]] = None) -> Task:
+        """Tâche périodique; `first` = délai avant la 1ère exécution."""
+        interval = max(0.01, float(interval))
+        metrics.gauge("aura_sched_interval_seconds", "Période des tâches du scheduler", task=name).set(interval)
+        with self._cond:
+            self._cancel_locked(name)
+            t = self._tasks[name] = Task(name, fn, interval, time.monotonic() + max(0.0, first), when)
+            self._push(t)
+            self._cond.notify()
+        return t
+
+    def once(self, name: str, delay: float, fn: Callable[[], None], *, replace: bool = False) -> Task:
+        """
+        Tâche unique. Si `name` est déjà planifiée: conservée telle quelle (coalescence),
+        sauf replace=True.
+        """
+        with self._cond:
+            cur = self._tasks.get(name)
+            if cur is not None and not cur.cancelled and not replace:
+                return cur
+            self._cancel_locked(name)
+            t = self._tasks[name] = Task(name, fn, None, time.monotonic() + max(0.0, delay), None)
+            self._push(t)
+            self._cond.notify()
+        return t
+
+    def _cancel_locked(self, name: str) -> None:
+        t = self._tasks.pop(name, None)
+        if t is not None:
+            t.cancelled = True     # retrait paresseux du tas
+
+    def cancel(self, name: str) -> None:
+        with self._cond:
+            self._cancel_locked(name)
+
+    def pending(self, name: str) -> bool:
+        t = self._tasks.get(name)
+        return t is not None and not t.cancelled
+
+    def postpone(self, name: str, delay: Optional[float] = None) -> None:
+        """Repousse l'échéance d'une tâche périodique à maintenant + delay (défaut: sa période)."""
+        with self._cond:
+            t = self._tasks.get(name)
+            if t is None or t.cancelled:
+                return
+            t.cancelled = True
+            at = time.monotonic() + (t.interval if delay is None else max(0.0, delay))
+            nt = self._tasks[name] = Task(t.name, t.fn, t.interval, at, t.when)
+            self._push(nt)
+            self._cond.notify()
+
+    # ---------- exécution ----------
+    def _next_due(self) -> Optional[Task]:
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        return self._heap[0][2] if self._heap else None
+
+    def run(self, running: Callable[[], bool], max_sleep: float = 60.0) -> None:
+        while running():
+            with self._cond:
+                t = self._next_due()
+                now = time.monotonic()
+                if t is None or t.deadline > now:
+                    timeout = max_sleep if t is None else min(max_sleep, t.deadline - now)
+                    self._cond.wait(timeout)
+                    self._wakeups.inc()
+                    continue
+                heapq.heappop(self._heap)
+                due = t.deadline
+                if t.interval is None:
+                    if self._tasks.get(t.name) is t:
+                        del self._tasks[t.name]
+                else:
+                    nxt = t.deadline + t.interval
+                    if nxt <= now:
+                        skipped = int((now - t.deadline) // t.interval)
+                        t._skip_c.inc(skipped)
+                        nxt = now + t.interval
+                    t.deadline = nxt
+                    self._push(t)
+            self._execute(t, now, due)
+
+    def _execute(self, t: Task, now: float, due: float) -> None:
+        if t.when is not None:
+            try:
+                if not t.when():
+                    return
+            except Exception:
+                return
+        t._late_h.observe(max(0.0, now - due))
+        t0 = time.perf_counter()
+        try:
+            t.fn()
+        except Exception as e:
+            log.info("ℹ️ tâche %s: %s", t.name, e, every=30, key=f"task:{t.name}")
+        finally:
+            t._run_h.observe(time.perf_counter() - t0)
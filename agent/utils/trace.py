@@ -0,0 +1,118 @@
+# utils/trace.py
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils import log as _logmod
+
+log = _logmod.get("trace")
+
+# Enregistrement optionnel des entrées de l'agent (événements socket + réponses REST),
+# une ligne JSON compacte par record: [ts, kind, name, payload]
+#   kind = "ev"   → événement socket entrant (name = nom de l'événement)
+#   kind = "rest" → réponse GET /state (name = "pull" | "poll"), payload None si échec
+# Fichier append-only, rotation par taille: trace.jsonl → trace.jsonl.1 → … → .<keep>
+
+_path: Optional[str] = None
+_max_bytes = 8 * 1024 * 1024
+_keep = 3
+FLUSH_SEC = 1.0
+
+_f = None
+_size = 0
+_last_flush = 0.0
+_lock = threading.Lock()
+
+def configure(path: Optional[str], max_bytes: Optional[int] = None, keep: Optional[int] = None) -> None:
+    global _path, _max_bytes, _keep
+    close()
+    _path = str(path) if path else None
+    if max_bytes is not None:
+        _max_bytes = max(64 * 1024, int(max_bytes))
+    if keep is not None:
+        _keep = max(1, int(keep))
+    if _path:
+        log.info("📼 trace des entrées → %s (max %s o × %s)", _path, _max_bytes, _keep)
+
+def enabled() -> bool:
+    return _path is not None
+
+def _open() -> None:
+    global _f, _size
+    d = os.path.dirname(_path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    _f = open(_path, "a", encoding="utf-8")
+    _size = _f.tell()
+
+def _rotate() -> None:
+    global _f
+    _f.close()
+    _f = None
+    for i in range(_keep - 1, 0, -1):
+        src = f"{_path}.{i}"
+        if os.path.exists(src):
+            os.replace(src, f"{_path}.{i + 1}")
+    os.replace(_path, f"{_path}.1")
+    _open()
+
+def record(kind: str, name: str, payload: Any = None) -> None:
+    """Ajoute un record (no-op si la trace est désactivée). Ne lève jamais."""
+    global _size, _last_flush
+    if _path is None:
+        return
+    try:
+        line = json.dumps([round(time.time(), 3), kind, name, payload], separators=(",", ":"),
+                          ensure_ascii=False, default=str) + "\n"
+        with _lock:
+            if _f is None:
+                _open()
+            if _size + len(line) > _max_bytes and _size > 0:
+                _rotate()
+            _f.write(line)
+            _size += len(line)
+            now = time.monotonic()
+            if now - _last_flush >= FLUSH_SEC:
+                _f.flush()
+                _last_flush = now
+    except Exception as e:
+        log.warn("⚠️ trace: %s", e, every=60)
+
+def close() -> None:
+    global _f
+    with _lock:
+        if _f is not None:
+            try:
+                _f.close()
+            except Exception:
+                pass
+            _f = None
+
+# ---------- lecture ----------
+def files(path: str) -> List[str]:
+    """Le fichier courant et ses rotations, du plus ancien au plus récent."""
+    out = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        out.append(f"{path}.{i}")
+        i += 1
+    out.reverse()
+    if os.path.exists(path):
+        out.append(path)
+    return out
+
+def read(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ts, kind, name, payload = json.loads(line)
+                except (ValueError, TypeError):
+                    continue   # ligne tronquée (coupure pendant l'écriture)
+                yield {"ts": ts, "kind": kind, "name": name, "payload": payload}
@@ -0,0 +1,159 @@
+# utils/widgets.py
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import log as _logmod, metrics, persist
+
+log = _logmod.get("widgets")
+
+# Données des widgets (météo…) en cache côté agent, partagé par les devices du process.
+# Clé = source + paramètres (deux devices sur la même ville ⇒ une seule entrée).
+# Stale-while-revalidate: get() ne bloque jamais ; une valeur périmée reste servie (jusqu'à
+# max_stale) pendant qu'un thread de fond la rafraîchit, un seul rafraîchissement en vol par clé.
+# Le cache est persisté: au boot, le rendu a des données avant le premier appel réseau.
+
+DEFAULT_TTL_SEC = 300.0
+MIN_TTL_SEC = 30.0          # l'api annonce son TTL restant (0 juste avant expiration)
+
+# source → (données, TTL annoncé ou None) ; lève en cas d'échec
+Fetch = Callable[[Dict[str, Any]], Tuple[Dict[str, Any], Optional[float]]]
+
+class Source:
+    """Une source de données: paramètres tirés de la config du widget, fetch, politique de cache."""
+
+    def __init__(self, name: str, fetch: Fetch, params: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]], *,
+                 ttl: Optional[float] = None, max_stale: float = 6 * 3600.0, retry: float = 60.0):
+        self.name = name
+        self.fetch = fetch
+        self.params = params              # config du widget → paramètres (None = rien à chercher)
+        # None ⇒ TTL annoncé par la source ; plancher MIN_TTL_SEC dans les deux cas (0 ⇒ boucle de refresh)
+        self.ttl = None if ttl is None else max(MIN_TTL_SEC, float(ttl))
+        self.max_stale = max_stale        # au-delà, la valeur n'est plus servie
+        self.retry = retry                # après un échec, pas de nouvel essai avant ce délai
+        self._refresh_h = metrics.histogram("aura_widget_refresh_seconds", "Durée des rafraîchissements widgets", source=name)
+
+class Cache:
+    def __init__(self, path: Optional[str]):
+        self.sources: Dict[str, Source] = {}
+        self.store = persist.StateFile(path)
+        self._entries: Dict[str, Dict[str, Any]] = {}     # clé → {source, params, data, at (epoch), ttl}
+        self._inflight: set = set()
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+
+    def register(self, source: Source) -> None:
+        self.sources[source.name] = source
+
+    def subscribe(self, fn: Callable[[str], None]) -> None:
+        """fn(clé) après chaque rafraîchissement réussi (appelé depuis le thread de fond)."""
+        self._listeners.append(fn)
+
+    @staticmethod
+    def key(source: str, params: Dict[str, Any]) -> str:
+        return source + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+    def load(self) -> int:
+        data = self.store.load() or {}
+        entries = data.get("entries")
+        if isinstance(entries, dict):
+            with self._lock:
+                self._entries.update({k: e for k, e in entries.items() if isinstance(e, dict) and "at" in e})
+        return len(self._entries)
+
+    def get(self, source: str, params: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """(données, fraîches) ou None ; déclenche un rafraîchissement de fond si périmé/absent."""
+        src = self.sources[source]
+        key = self.key(source, params)
+        now = time.time()
+        e = self._entries.get(key)
+        age = None if e is None else now - float(e["at"])
+        if age is not None and age > src.max_stale:
+            e = None
+        fresh = e is not None and age < float(e["ttl"])
+        result = "hit" if fresh else ("stale" if e is not None else "miss")
+        metrics.counter("aura_widget_cache_total", "Lectures du cache widgets", source=source, result=result).inc()
+        if not fresh:
+            self._revalidate(key, src, params)
+        return None if e is None else (dict(e["data"]), fresh)
+
+    def _revalidate(self, key: str, src: Source, params: Dict[str, Any]) -> None:
+        with self._lock:
+            if key in self._inflight:
+                metrics.counter("aura_widget_coalesced_total", "Rafraîchissements fusionnés (déjà en vol)", source=src.name).inc()
+                return
+            if self._retry_at.get(key, 0.0) > time.time():
+                return
+            self._inflight.add(key)
+        threading.Thread(target=self._refresh, args=(key, src, dict(params)), name=f"aura-widget-{src.name}", daemon=True).start()
+
+    def _refresh(self, key: str, src: Source, params: Dict[str, Any]) -> None:
+        t0 = time.perf_counter()
+        try:
+            data, announced = src.fetch(params)
+            ttl = src.ttl if src.ttl is not None else max(MIN_TTL_SEC, announced if announced is not None else DEFAULT_TTL_SEC)
+            entry = {"source": src.name, "params": params, "data": data, "at": time.time(), "ttl": float(ttl)}
+            with self._lock:
+                self._entries[key] = entry
+                self._retry_at.pop(key, None)
+            result = "ok"
+        except Exception as e:
+            with self._lock:
+                self._retry_at[key] = time.time() + src.retry
+            log.info("ℹ️ widget %s: %s (valeur en cache conservée)", key, e, every=60, key=f"widget:{key}")
+            result = "error"
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+            src._refresh_h.observe(time.perf_counter() - t0)
+        metrics.counter("aura_widget_refresh_total", "Rafraîchissements widgets", source=src.name, result=result).inc()
+        if result != "ok":
+            return
+        with self._lock:
+            snapshot = dict(self._entries)
+        self.store.save({"entries": snapshot})
+        for fn in self._listeners:
+            try:
+                fn(key)
+            except Exception:
+                pass
+
+# ---------- Sources ----------
+def weather_params(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    city = str(config.get("city") or "").strip()
+    if not city:
+        return None
+    units = str(config.get("units") or "metric").lower()
+    return {"city": city, "units": units if units in ("metric", "imperial") else "metric"}
+
+# ---------- Rendu ambiant (preset LEDs piloté par un widget) ----------
+# Température → teinte: froid bleu, tempéré blanc chaud, chaud orange/rouge (°C, interpolé)
+_TEMP_STOPS: List[Tuple[float, Tuple[int, int, int]]] = [
+    (-5.0, (60, 110, 255)), (5.0, (150, 200, 255)), (15.0, (255, 235, 200)),
+    (25.0, (255, 160, 50)), (35.0, (255, 60, 10)),
+]
+
+def temp_color(temp_c: float) -> Tuple[int, int, int]:
+    if temp_c <= _TEMP_STOPS[0][0]:
+        return _TEMP_STOPS[0][1]
+    for (t0, c0), (t1, c1) in zip(_TEMP_STOPS, _TEMP_STOPS[1:]):
+        if temp_c <= t1:
+            p = (temp_c - t0) / (t1 - t0)
+            return tuple(int(round(a + (b - a) * p)) for a, b in zip(c0, c1))
+    return _TEMP_STOPS[-1][1]
+
+def _weather_color(data: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+    try:
+        t = float(data["temp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if str(data.get("units") or "metric") == "imperial":
+        t = (t - 32) * 5 / 9
+    return temp_color(t)
+
+# preset → (widget source des données, couleur)
+AMBIENT: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Optional[Tuple[int, int, int]]]]] = {
+    "weather": ("weather", _weather_color),
+}
@@ -0,0 +1,99 @@
+# utils/wire.py
+from __future__ import annotations
+import re
+import uuid
+from typing import Any, Dict, List
+
+from utils import log as _logmod
+
+log = _logmod.get("wire")
+
+# Encodage compact (opt-in) des événements socket agent ↔ hub: msgpack + codes de champs courts,
+# envoyé en pièce jointe binaire socket.io. Négocié à agent:register (liste "wire" des codecs
+# de l'agent, le hub répond par welcome.wire) ; sans réponse ⇒ JSON, comme avant.
+# Seuls le 1er niveau et les sections connues (leds/music/data/stateVersion) sont raccourcis:
+# widgets et clés inconnues passent tels quels.
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+_KEYS: Dict[str, str] = {
+    "deviceId": "d", "leds": "l", "music": "m", "widgets": "w", "stateVersion": "sv",
+    "on": "o", "color": "c", "brightness": "b", "preset": "p",
+    "status": "s", "volume": "v", "track": "t", "value": "x", "action": "n",
+    "type": "y", "data": "a", "reason": "r", "applied": "ap", "started": "st",
+}
+_NAMES = {v: k for k, v in _KEYS.items()}
+_SECTIONS = ("leds", "music", "data", "stateVersion")
+_HEX = re.compile(r"^#[0-9A-Fa-f]{6}$")
+
+_msgpack: Any = None
+
+def available() -> List[str]:
+    """Codecs utilisables ici, par préférence (msgpack est une dépendance facultative)."""
+    global _msgpack
+    if _msgpack is None:
+        try:
+            import msgpack
+            _msgpack = msgpack
+        except ImportError:
+            _msgpack = False
+            log.info("ℹ️ msgpack absent → encodage JSON seulement")
+    return [MSGPACK, JSON] if _msgpack else [JSON]
+
+def _pack_id(v: Any) -> Any:
+    # UUID canonique (ids de l'api) → 16 octets
+    if isinstance(v, str) and len(v) == 36:
+        try:
+            u = uuid.UUID(v)
+            if str(u) == v:
+                return u.bytes
+        except ValueError:
+            pass
+    return v
+
+def _short(d: Dict[str, Any], nested: bool) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k, v in d.items():
+        if k == "deviceId":
+            v = _pack_id(v)
+        elif k == "color" and isinstance(v, str) and _HEX.match(v) and v == v.upper():
+            v = int(v[1:], 16)
+        elif nested and k in _SECTIONS and isinstance(v, dict):
+            v = _short(v, False)
+        out[_KEYS.get(k, k)] = v
+    return out
+
+def _long(d: Dict[str, Any], nested: bool) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k, v in d.items():
+        k = _NAMES.get(k, k)
+        if k == "deviceId" and isinstance(v, bytes) and len(v) == 16:
+            v = str(uuid.UUID(bytes=v))
+        elif k == "color" and isinstance(v, int) and not isinstance(v, bool):
+            v = "#%06X" % v
+        elif nested and k in _SECTIONS and isinstance(v, dict):
+            v = _long(v, False)
+        out[k] = v
+    return out
+
+def encode(payload: Any) -> bytes:
+    """Payload d'événement → msgpack à champs courts."""
+    available()
+    if isinstance(payload, dict):
+        payload = _short(payload, True)
+    return _msgpack.packb(payload, use_bin_type=True)
+
+def decode(data: bytes) -> Any:
+    """msgpack à champs courts → payload ; octets rendus tels quels si msgpack est absent ou invalide."""
+    if MSGPACK not in available():
+        log.warn("⚠️ payload binaire reçu sans msgpack installé: non décodé", every=60)
+        return data
+    try:
+        payload = _msgpack.unpackb(data, raw=False)
+    except Exception as e:
+        log.warn("⚠️ payload msgpack invalide: %s", e, every=60)
+        return data
+    if isinstance(payload, dict):
+        payload = _long(payload, True)
+    return payload